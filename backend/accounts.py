@@ -0,0 +1,207 @@
+"""
+Account registration and credential lookup for citizens (`users`) and
+police (`police`).
+
+Uniqueness is enforced by Mongo, not by find_one checks before the insert
+(which cost a round trip each and let two concurrent signups through):
+
+    usernames  {_id: username, role, created_at}   one per account, either collection
+    users      unique aadhar, phone                 see indexes.py
+    police     unique username, police_id
+
+register() claims the username in `usernames`, then inserts the account; a
+DuplicateKeyError from either write becomes AccountExists with the field
+that clashed (the claim is released if the account insert fails).
+
+find_credentials() reads both collections in one aggregation ($unionWith),
+so a login is a single read plus the password hash check.
+
+Existing accounts are claimed by every process at startup (see db.py), and
+register() waits for that to finish. Before the indexes are built, startup
+also stores legacy non-string aadhar / phone / police_id values as strings,
+which is what register() writes and what the partial unique indexes cover.
+Both steps are idempotent, so they can also be run on demand:
+    python accounts.py backfill
+
+If a unique index is missing anyway (its creation failed, e.g. on legacy
+duplicates), register() checks that field with a find_one before inserting.
+"""
+import threading
+from datetime import datetime
+
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure
+
+COLLECTIONS = {'citizen': 'users', 'police': 'police'}
+LOGIN_ORDER = ('users', 'police') # a username found in both (legacy data) logs in as the citizen
+
+# Error messages for a clash on each unique field
+DUPLICATE_MESSAGES = {
+    'username': 'User already exists',
+    'aadhar': 'Aadhar already registered',
+    'phone': 'Phone number already registered',
+    'police_id': 'Police ID already registered',
+}
+
+
+# Unique index behind each field register() relies on (see indexes.py)
+UNIQUE_INDEXES = {
+    'users': {'aadhar': 'aadhar_unique', 'phone': 'phone_unique'},
+    'police': {'police_id': 'police_id_unique'},
+}
+
+# Set once this process has claimed the usernames of pre-existing accounts
+_usernames_ready = False
+_backfill_lock = threading.Lock()
+# Collections whose unique indexes were all found; the others are checked on every registration
+_indexed = set()
+
+
+class AccountExists(ValueError):
+    """Another account already has this username / aadhar / phone / police ID."""
+
+    def __init__(self, field):
+        self.field = field
+        super().__init__(DUPLICATE_MESSAGES.get(field, 'User already exists'))
+
+
+def duplicate_field(error):
+    """The field behind a DuplicateKeyError, from its keyPattern or else the index name in the message."""
+    key_pattern = (error.details or {}).get('keyPattern') or {}
+    for field in key_pattern:
+        if field in DUPLICATE_MESSAGES:
+            return field
+    message = str(error)
+    for field in DUPLICATE_MESSAGES:
+        if f"index: {field}_" in message:
+            return field
+    return 'username'
+
+
+def register(db, role, account):
+    """Insert `account` (with username and password_hash) for `role`; returns its _id or raises AccountExists."""
+    username = account['username']
+    ensure_usernames(db)
+    for field in unindexed_fields(db, COLLECTIONS[role]):
+        if account.get(field) is not None and \
+                db[COLLECTIONS[role]].find_one({field: {'$in': _stored_forms(account[field])}}, {'_id': 1}):
+            raise AccountExists(field)
+    try:
+        db.usernames.insert_one({'_id': username, 'role': role, 'created_at': datetime.utcnow()})
+    except DuplicateKeyError:
+        raise AccountExists('username')
+    try:
+        return db[COLLECTIONS[role]].insert_one(account).inserted_id
+    except DuplicateKeyError as e:
+        db.usernames.delete_one({'_id': username, 'role': role})
+        raise AccountExists(duplicate_field(e))
+    except Exception:
+        db.usernames.delete_one({'_id': username, 'role': role})
+        raise
+
+
+def find_credentials(db, username, role=None):
+    """The account (with password_hash) for `username`, looking in both collections unless `role` is given."""
+    if role:
+        return db[COLLECTIONS[role]].find_one({'username': username})
+    # Each branch is tagged with its place in LOGIN_ORDER: $unionWith doesn't guarantee the output order
+    branches = [[{'$match': {'username': username}}, {'$limit': 1}, {'$addFields': {'_login_order': i}}]
+                for i in range(len(LOGIN_ORDER))]
+    pipeline = list(branches[0])
+    for name, branch in zip(LOGIN_ORDER[1:], branches[1:]):
+        pipeline.append({'$unionWith': {'coll': name, 'pipeline': branch}})
+    pipeline += [{'$sort': {'_login_order': 1}}, {'$limit': 1}, {'$project': {'_login_order': 0}}]
+    try:
+        return next(db[LOGIN_ORDER[0]].aggregate(pipeline), None)
+    except (OperationFailure, NotImplementedError) as e:
+        # $unionWith needs MongoDB 4.4+; older servers get one find_one per collection
+        print(f"$unionWith unavailable ({e}), looking up credentials per collection")
+        for name in LOGIN_ORDER:
+            user = db[name].find_one({'username': username})
+            if user:
+                return user
+        return None
+
+
+def backfill_usernames(db):
+    """Claim the usernames of accounts created before `usernames` existed; returns how many were added."""
+    added = 0
+    for role, name in COLLECTIONS.items():
+        claims = [{'_id': user['username'], 'role': role, 'created_at': user.get('created_at') or datetime.utcnow()}
+                  for user in db[name].find({'username': {'$type': 'string'}}, {'username': 1, 'created_at': 1})]
+        if not claims:
+            continue
+        try:
+            added += len(db.usernames.insert_many(claims, ordered=False).inserted_ids)
+        except BulkWriteError as e:
+            if any(err.get('code') != 11000 for err in e.details.get('writeErrors', [])):
+                raise
+            added += e.details.get('nInserted', 0)
+    return added
+
+
+def unindexed_fields(db, name):
+    """Fields of collection `name` whose unique index is missing, so Mongo won't reject duplicates."""
+    if name in _indexed:
+        return []
+    existing = db[name].index_information()
+    missing = [field for field, index in UNIQUE_INDEXES.get(name, {}).items() if index not in existing]
+    if missing:
+        print(f"\033[93mWARNING: unique index missing on {name} ({', '.join(missing)}); "
+              f"checking before each registration\033[0m")
+    else:
+        _indexed.add(name)
+    return missing
+
+
+def _stored_forms(value):
+    # Legacy documents may hold the number itself rather than its string
+    forms = [str(value)]
+    if forms[0].isdigit():
+        forms.append(int(forms[0]))
+    return forms
+
+
+def _as_string(value):
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    return str(value)
+
+
+def normalize_unique_fields(db):
+    """Store legacy non-string aadhar / phone / police_id values as strings; returns how many were changed."""
+    changed = 0
+    for name, fields in UNIQUE_INDEXES.items():
+        for field in fields:
+            legacy = {field: {'$exists': True, '$ne': None, '$not': {'$type': 'string'}}}
+            for doc in db[name].find(legacy, {field: 1}):
+                result = db[name].update_one({'_id': doc['_id'], field: doc[field]},
+                                             {'$set': {field: _as_string(doc[field])}})
+                changed += result.modified_count
+    return changed
+
+
+def ensure_usernames(db):
+    """
+    backfill_usernames() once per process, before the first registration is
+    accepted: register() waits here if the startup backfill is still running.
+    """
+    global _usernames_ready
+    with _backfill_lock:
+        if not _usernames_ready:
+            added = backfill_usernames(db)
+            if added:
+                print(f"Claimed {added} existing username(s)")
+            _usernames_ready = True
+
+
+if __name__ == '__main__':
+    import sys
+    from pymongo import MongoClient
+    from config import Config
+
+    if len(sys.argv) < 2 or sys.argv[1] != 'backfill':
+        print('usage: python accounts.py backfill')
+        sys.exit(1)
+    db = MongoClient(Config.MONGO_URI).get_default_database()
+    print(f"Stored {normalize_unique_fields(db)} legacy aadhar / phone / police ID value(s) as strings")
+    print(f"Claimed {backfill_usernames(db)} username(s)")
@@ -6,13 +6,20 @@ from dotenv import load_dotenv
 import os
 
 from config import config
-from ml_service import MLService
+import translation
+from ml_service import ml_service
 
 load_dotenv()
 
 app = Flask(__name__)
-# Enable CORS
-CORS(app)
+# orjson-backed jsonify() that also encodes ObjectId and datetime (serialization.py)
+import serialization
+app.json = serialization.JSONProvider(app)
+# gzip / brotli for large JSON and HTML responses (http_cache.py)
+import http_cache
+app.after_request(http_cache.compress)
+# Enable CORS (list endpoints return their next-page cursor in a header)
+CORS(app, expose_headers=['X-Next-Cursor'])
 
 # Check for .env file
 if not os.path.exists('.env'):
@@ -25,12 +32,17 @@ env = os.environ.get('FLASK_ENV', 'development')
 app.config.from_object(config[env])
 app.config['JWT_ACCESS_TOKEN_EXPIRES'] = timedelta(days=1)
 
-# Initialize Services
-ml_service = MLService()
-
-from db import init_db
+from db import init_db, get_db
 init_db(app)
 
+# Background jobs (FIR translation + AI suggestions)
+from jobs import start_workers
+start_workers(get_db())
+
+# Live notification delivery (SSE); uses a Mongo change stream when available
+import notifications
+notifications.hub.start(get_db())
+
 from flask_jwt_extended import JWTManager
 app.config['JWT_SECRET_KEY'] = config[env].JWT_SECRET_KEY
 jwt = JWTManager(app)
@@ -57,12 +69,24 @@ def index():
 
 @app.route('/api/health', methods=['GET'])
 def health_check():
+    # Liveness: the process is up and serving; ML readiness is reported, not required
+    ml_status = ml_service.status()
     return jsonify({
         'status': 'healthy', 
-        'models_loaded': ml_service.initialized,
+        'models_loaded': ml_status['state'] == 'ready',
+        'ml': ml_status,
+        'bns_cache': ml_service.cache_stats(),
+        'translation': translation.stats(),
         'db_connected': True # Basic assumption if init_db passed
     }), 200
 
+@app.route('/api/ready', methods=['GET'])
+def readiness_check():
+    # Readiness: 200 once the ML models are usable (fully or degraded), else 503
+    ml_status = ml_service.status()
+    ready = ml_service.is_ready()
+    return jsonify({'ready': ready, 'ml': ml_status}), 200 if ready else 503
+
 # Global Error Handler
 @app.errorhandler(404)
 def not_found(e):
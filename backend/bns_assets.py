@@ -0,0 +1,401 @@
+"""
+On-disk layout for the BNS search assets.
+
+The legacy `bns_assets.pkl` holds a pickled pandas DataFrame plus the
+embedding matrix, so every worker has to unpickle it and rebuild a FAISS
+index on start. This module writes (and reads) a directory instead:
+
+    manifest.json        format/version info, columns, row count, dims, index type
+    embeddings.npy       raw float32 embedding matrix (n_rows x dim)
+    index.faiss          serialized, prebuilt FAISS index (see build_index)
+    sections.bin         UTF-8 cell values of the section table, column by column
+    sections.offsets.npy int64 byte offsets into sections.bin (n_cols x n_rows+1)
+    sections.nulls.npy   bool null mask (n_cols x n_rows)
+    lexical.*            BM25 inverted index over the section texts (see lexical.py)
+
+Everything is opened with mmap, so N gunicorn workers share a single
+page-cache copy and loading does no unpickling or index rebuild.
+
+Usage:
+    # migrate an existing deployment from the legacy pickle
+    python bns_assets.py convert [legacy.pkl] [output_dir]
+    # rebuild only the index (e.g. after changing BNS_INDEX_TYPE)
+    python bns_assets.py build-index [asset_dir]
+"""
+import hashlib
+import json
+import math
+import os
+import sys
+import time
+from types import MappingProxyType
+
+import numpy as np
+
+from lexical import LexicalIndex
+
+FORMAT_VERSION = 1
+MANIFEST_FILE = 'manifest.json'
+EMBEDDINGS_FILE = 'embeddings.npy'
+INDEX_FILE = 'index.faiss'
+SECTIONS_DATA_FILE = 'sections.bin'
+SECTIONS_OFFSETS_FILE = 'sections.offsets.npy'
+SECTIONS_NULLS_FILE = 'sections.nulls.npy'
+
+INDEX_TYPES = ('flat', 'ivf', 'hnsw')
+INDEX_METRICS = ('l2', 'ip')
+
+
+def _is_null(value):
+    return value is None or (isinstance(value, float) and math.isnan(value))
+
+
+class SectionTable:
+    """
+    Read-only columnar table of BNS sections backed by (optionally mmapped)
+    NumPy buffers. Cells are decoded from UTF-8 only when a row is requested.
+    """
+
+    def __init__(self, columns, data, offsets, nulls):
+        self.columns = list(columns)
+        self._data = data
+        self._offsets = offsets
+        self._nulls = nulls
+
+    @classmethod
+    def from_columns(cls, columns, values_by_column):
+        """Build an in-memory table from {column: [values]} (e.g. a legacy DataFrame)."""
+        columns = list(columns)
+        n_rows = len(values_by_column[columns[0]]) if columns else 0
+        chunks = []
+        offsets = np.zeros((len(columns), n_rows + 1), dtype=np.int64)
+        nulls = np.zeros((len(columns), n_rows), dtype=bool)
+        position = 0
+        for c, column in enumerate(columns):
+            offsets[c, 0] = position
+            for r, value in enumerate(values_by_column[column]):
+                if _is_null(value):
+                    nulls[c, r] = True
+                else:
+                    encoded = str(value).encode('utf-8')
+                    chunks.append(encoded)
+                    position += len(encoded)
+                offsets[c, r + 1] = position
+        data = np.frombuffer(b''.join(chunks), dtype=np.uint8)
+        return cls(columns, data, offsets, nulls)
+
+    @classmethod
+    def from_dataframe(cls, df):
+        return cls.from_columns(df.columns, {col: df[col].tolist() for col in df.columns})
+
+    def __len__(self):
+        return self._nulls.shape[1] if self.columns else 0
+
+    def cell(self, column_idx, row):
+        if self._nulls[column_idx, row]:
+            return None
+        start, end = self._offsets[column_idx, row], self._offsets[column_idx, row + 1]
+        return self._data[start:end].tobytes().decode('utf-8')
+
+    def row(self, row):
+        """Return row `row` as a plain dict, with None for missing values."""
+        return {column: self.cell(c, row) for c, column in enumerate(self.columns)}
+
+    def column(self, name):
+        c = self.columns.index(name)
+        return [self.cell(c, r) for r in range(len(self))]
+
+    def save(self, directory):
+        _atomic_write(os.path.join(directory, SECTIONS_DATA_FILE),
+                      lambda path: np.asarray(self._data, dtype=np.uint8).tofile(path))
+        _atomic_write(os.path.join(directory, SECTIONS_OFFSETS_FILE),
+                      lambda path: _save_npy(path, self._offsets))
+        _atomic_write(os.path.join(directory, SECTIONS_NULLS_FILE),
+                      lambda path: _save_npy(path, self._nulls))
+
+    @classmethod
+    def open(cls, directory, columns, mmap=True):
+        mode = 'r' if mmap else None
+        data_path = os.path.join(directory, SECTIONS_DATA_FILE)
+        if os.path.getsize(data_path) and mmap:
+            data = np.memmap(data_path, dtype=np.uint8, mode='r')
+        else:
+            data = np.fromfile(data_path, dtype=np.uint8)
+        offsets = np.load(os.path.join(directory, SECTIONS_OFFSETS_FILE), mmap_mode=mode)
+        nulls = np.load(os.path.join(directory, SECTIONS_NULLS_FILE), mmap_mode=mode)
+        return cls(columns, data, offsets, nulls)
+
+
+class BnsAssets:
+    """Section table, embedding matrix and FAISS index opened from an asset directory."""
+
+    def __init__(self, sections, embeddings, index, manifest, lexical=None):
+        self.sections = sections
+        self.embeddings = embeddings
+        self.index = index
+        self.manifest = manifest
+        self.lexical = lexical
+
+    @property
+    def version(self):
+        return self.manifest.get('version')
+
+
+def _save_npy(path, array):
+    with open(path, 'wb') as f:
+        np.save(f, array)
+
+
+def _save_json(path, obj):
+    with open(path, 'w', encoding='utf-8') as f:
+        json.dump(obj, f, indent=2)
+
+
+def _atomic_write(path, writer):
+    """
+    Write via a temp file + rename so running workers keep their (old) mmaps
+    valid and never observe a half-written file.
+    """
+    tmp_path = f"{path}.tmp-{os.getpid()}"
+    writer(tmp_path)
+    os.replace(tmp_path, path)
+
+
+def manifest_path(directory):
+    return os.path.join(directory, MANIFEST_FILE)
+
+
+def has_assets(directory):
+    return os.path.exists(manifest_path(directory))
+
+
+def read_manifest(directory):
+    with open(manifest_path(directory), 'r', encoding='utf-8') as f:
+        return json.load(f)
+
+
+def _index_settings(index_type, metric):
+    index_type = (index_type or 'flat').lower()
+    metric = (metric or 'l2').lower()
+    if index_type == 'ip':
+        # Shorthand for exact inner-product (cosine) search
+        index_type, metric = 'flat', 'ip'
+    if index_type not in INDEX_TYPES:
+        raise ValueError(f"Unknown BNS index type '{index_type}', expected one of {INDEX_TYPES + ('ip',)}")
+    if metric not in INDEX_METRICS:
+        raise ValueError(f"Unknown BNS index metric '{metric}', expected one of {INDEX_METRICS}")
+    return index_type, metric
+
+
+def build_index(embeddings, index_type='flat', metric='l2', nlist=None, hnsw_m=32, ef_construction=80):
+    """
+    Build a FAISS index over `embeddings`.
+
+    index_type: 'flat' (exact), 'ivf' (inverted lists, tune nprobe at query
+    time), 'hnsw' (graph, tune efSearch), or 'ip' as shorthand for flat +
+    inner product. metric 'ip' searches L2-normalized vectors by inner product
+    (cosine similarity); callers must normalize queries the same way.
+    """
+    import faiss
+
+    index_type, metric = _index_settings(index_type, metric)
+    vectors = np.array(embeddings, dtype=np.float32, order='C')
+    if metric == 'ip':
+        faiss.normalize_L2(vectors)
+    n_rows, dimension = vectors.shape
+    faiss_metric = faiss.METRIC_INNER_PRODUCT if metric == 'ip' else faiss.METRIC_L2
+
+    if index_type == 'flat':
+        index = faiss.IndexFlatIP(dimension) if metric == 'ip' else faiss.IndexFlatL2(dimension)
+    elif index_type == 'ivf':
+        if not nlist:
+            # ~4*sqrt(n) lists, keeping >= 39 training points per centroid
+            nlist = max(1, min(int(4 * np.sqrt(n_rows)), n_rows // 39))
+        quantizer = faiss.IndexFlatIP(dimension) if metric == 'ip' else faiss.IndexFlatL2(dimension)
+        index = faiss.IndexIVFFlat(quantizer, dimension, int(nlist), faiss_metric)
+        index.train(vectors)
+    else:
+        index = faiss.IndexHNSWFlat(dimension, int(hnsw_m), faiss_metric)
+        index.hnsw.efConstruction = int(ef_construction)
+    index.add(vectors)
+    return index
+
+
+def apply_search_params(index, nprobe=None, ef_search=None):
+    """Set query-time tuning knobs on IVF (nprobe) / HNSW (efSearch) indexes."""
+    import faiss
+
+    if nprobe and isinstance(index, faiss.IndexIVF):
+        index.nprobe = min(int(nprobe), index.nlist)
+    if ef_search and isinstance(index, faiss.IndexHNSW):
+        index.hnsw.efSearch = int(ef_search)
+    return index
+
+
+def _write_index(directory, index):
+    import faiss
+
+    _atomic_write(os.path.join(directory, INDEX_FILE), lambda path: faiss.write_index(index, path))
+
+
+def section_records(sections):
+    """
+    Ready-to-serialize, immutable record per section row (indexed by FAISS
+    id), with the lowercase 'section'/'description' keys the frontend reads.
+    Result assembly is then a lookup plus distance/rank.
+    """
+    records = []
+    for r in range(len(sections)):
+        record = sections.row(r)
+        if 'section' not in record and 'Section' in record:
+            record['section'] = record['Section']
+        if 'description' not in record and 'Description' in record:
+            record['description'] = record['Description']
+        records.append(MappingProxyType(record))
+    return tuple(records)
+
+
+def section_texts(sections):
+    """Text indexed lexically for each section row: its id/title plus description."""
+    columns = [c for c in ('Section', 'Offence', 'Description') if c in sections.columns]
+    indices = [sections.columns.index(c) for c in columns]
+    return [' '.join(filter(None, (sections.cell(c, r) for c in indices))) for r in range(len(sections))]
+
+
+def build_lexical_index(sections):
+    return LexicalIndex.build(section_texts(sections))
+
+
+def write_bns_assets(directory, df, embeddings, index_type='flat', metric='l2', **index_params):
+    """
+    Write the section DataFrame, embeddings and a prebuilt FAISS index (see
+    build_index) in the mmap layout. The manifest is written last, so
+    readers only ever see complete sets.
+    """
+    os.makedirs(directory, exist_ok=True)
+    embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+    index_type, metric = _index_settings(index_type, metric)
+    index = build_index(embeddings, index_type, metric, **index_params)
+
+    sections = SectionTable.from_dataframe(df)
+
+    _atomic_write(os.path.join(directory, EMBEDDINGS_FILE), lambda path: _save_npy(path, embeddings))
+    _write_index(directory, index)
+    sections.save(directory)
+    build_lexical_index(sections).save(directory, _atomic_write)
+
+    digest = hashlib.sha1()
+    digest.update(embeddings.tobytes())
+    digest.update(np.asarray(sections._data).tobytes())
+    manifest = {
+        'format_version': FORMAT_VERSION,
+        'version': digest.hexdigest()[:16],
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'rows': int(embeddings.shape[0]),
+        'dimension': int(embeddings.shape[1]),
+        'columns': sections.columns,
+        'index_type': index_type,
+        'metric': metric,
+        'normalize': metric == 'ip',
+        'lexical': True,
+    }
+    _atomic_write(manifest_path(directory), lambda path: _save_json(path, manifest))
+    return manifest
+
+
+def rebuild_index(directory, index_type='flat', metric='l2', **index_params):
+    """Rebuild index.faiss for an existing asset directory from its stored embeddings."""
+    manifest = read_manifest(directory)
+    index_type, metric = _index_settings(index_type, metric)
+    embeddings = np.load(os.path.join(directory, EMBEDDINGS_FILE))
+    _write_index(directory, build_index(embeddings, index_type, metric, **index_params))
+    manifest.update({
+        'index_type': index_type,
+        'metric': metric,
+        'normalize': metric == 'ip',
+        'version': f"{manifest['version'].split('-')[0]}-{index_type}-{metric}",
+    })
+    _atomic_write(manifest_path(directory), lambda path: _save_json(path, manifest))
+    return manifest
+
+
+def _read_index(path, index_type):
+    import faiss
+
+    if index_type == 'flat':
+        # Zero-copy mmap of the flat code storage where this FAISS build supports it
+        for flag_name in ('IO_FLAG_MMAP_IFC', 'IO_FLAG_MMAP'):
+            flag = getattr(faiss, flag_name, None)
+            if flag is None:
+                continue
+            try:
+                return faiss.read_index(path, flag | faiss.IO_FLAG_READ_ONLY)
+            except RuntimeError:
+                continue
+    return faiss.read_index(path)
+
+
+def load_bns_assets(directory, mmap=True):
+    """Open an asset directory written by write_bns_assets()."""
+    manifest = read_manifest(directory)
+    if manifest.get('format_version') != FORMAT_VERSION:
+        raise ValueError(f"Unsupported BNS asset format: {manifest.get('format_version')}")
+    manifest.setdefault('index_type', 'flat')
+    manifest.setdefault('metric', 'l2')
+    manifest.setdefault('normalize', manifest['metric'] == 'ip')
+
+    embeddings = np.load(os.path.join(directory, EMBEDDINGS_FILE), mmap_mode='r' if mmap else None)
+    sections = SectionTable.open(directory, manifest['columns'], mmap=mmap)
+    index_path = os.path.join(directory, INDEX_FILE)
+    if os.path.exists(index_path):
+        index = _read_index(index_path, manifest['index_type'])
+    else:
+        index = build_index(embeddings, manifest['index_type'], manifest['metric'])
+    lexical = LexicalIndex.open(directory, mmap=mmap) if LexicalIndex.exists(directory) else None
+    return BnsAssets(sections, embeddings, index, manifest, lexical=lexical)
+
+
+def load_legacy_pickle(path):
+    """Read the legacy {'df': DataFrame, 'embeddings': ndarray} pickle."""
+    import pickle
+
+    with open(path, 'rb') as f:
+        assets = pickle.load(f)
+    return assets['df'], assets['embeddings']
+
+
+def convert_legacy_pickle(pickle_path, directory, **index_options):
+    df, embeddings = load_legacy_pickle(pickle_path)
+    return write_bns_assets(directory, df, embeddings, **index_options)
+
+
+def index_options_from_config(config):
+    """Offline index build settings (type, metric and build-time knobs) from Config."""
+    return {
+        'index_type': config.BNS_INDEX_TYPE,
+        'metric': config.BNS_INDEX_METRIC,
+        'nlist': config.BNS_IVF_NLIST,
+        'hnsw_m': config.BNS_HNSW_M,
+        'ef_construction': config.BNS_HNSW_EF_CONSTRUCTION,
+    }
+
+
+if __name__ == '__main__':
+    from config import Config
+
+    command = sys.argv[1] if len(sys.argv) > 1 else None
+    options = index_options_from_config(Config)
+    if command == 'convert':
+        source = sys.argv[2] if len(sys.argv) > 2 else Config.BNS_ASSETS_PATH
+        target = sys.argv[3] if len(sys.argv) > 3 else Config.BNS_ASSETS_DIR
+        print(f"Converting {source} -> {target}")
+        info = convert_legacy_pickle(source, target, **options)
+    elif command == 'build-index':
+        target = sys.argv[2] if len(sys.argv) > 2 else Config.BNS_ASSETS_DIR
+        print(f"Rebuilding {options['index_type']}/{options['metric']} index in {target}")
+        info = rebuild_index(target, **options)
+    else:
+        print("Usage: python bns_assets.py convert [legacy.pkl] [output_dir]")
+        print("       python bns_assets.py build-index [asset_dir]")
+        sys.exit(1)
+    print(f"Wrote {info['rows']} sections (dim={info['dimension']}, index={info['index_type']}/{info['metric']}, version={info['version']})")
@@ -8,9 +8,113 @@ class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY','dev_secret_key_change_in_production')
     MONGO_URI = os.environ.get('MONGO_URI','mongodb://localhost:27017/fir_automation')
     JWT_SECRET_KEY = os.environ.get('JWT_SECRET_KEY','jwt_secret_key_change_in_production')
+    # Create the indexes in indexes.py at startup; in debug, also explain()
+    # the registered query shapes and warn on collection scans
+    MONGO_ENSURE_INDEXES = os.environ.get('MONGO_ENSURE_INDEXES', 'true').lower() in ('1', 'true', 'yes')
+    MONGO_QUERY_AUDIT = os.environ.get('MONGO_QUERY_AUDIT', '').lower() in ('1', 'true', 'yes') or None # None: follow DEBUG
     ASSETS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'assets')
     CRIME_MODEL_PATH = os.path.join(ASSETS_DIR, 'crime_model.pkl')
-    BNS_ASSETS_PATH = os.path.join(ASSETS_DIR, 'bns_assets.pkl')
+    # Background jobs (jobs.py): worker threads per web process (0 = run
+    # `python jobs.py` separately), retries with exponential backoff, and the
+    # lease after which a job held by a dead worker is re-claimed
+    JOB_WORKERS = int(os.environ.get('JOB_WORKERS', 2))
+    JOB_MAX_ATTEMPTS = int(os.environ.get('JOB_MAX_ATTEMPTS', 5))
+    JOB_LEASE_SECONDS = float(os.environ.get('JOB_LEASE_SECONDS', 120))
+    JOB_RETRY_BASE_SECONDS = float(os.environ.get('JOB_RETRY_BASE_SECONDS', 5))
+    JOB_RETRY_MAX_SECONDS = float(os.environ.get('JOB_RETRY_MAX_SECONDS', 300))
+    JOB_POLL_INTERVAL = float(os.environ.get('JOB_POLL_INTERVAL', 2))
+    # station_stats counters are kept with $inc and rebuilt from scratch this often
+    STATION_STATS_REBUILD_HOURS = float(os.environ.get('STATION_STATS_REBUILD_HOURS', 24))
+    # Live notification streams (SSE, notifications.py). Each open stream holds
+    # a worker thread, so they are capped per process and closed after
+    # STREAM_MAX_SECONDS (browsers reconnect after RETRY_MS)
+    NOTIFICATIONS_MAX_STREAMS = int(os.environ.get('NOTIFICATIONS_MAX_STREAMS', 8))
+    NOTIFICATIONS_HEARTBEAT_SECONDS = float(os.environ.get('NOTIFICATIONS_HEARTBEAT_SECONDS', 20))
+    NOTIFICATIONS_STREAM_MAX_SECONDS = float(os.environ.get('NOTIFICATIONS_STREAM_MAX_SECONDS', 300))
+    NOTIFICATIONS_RETRY_MS = int(os.environ.get('NOTIFICATIONS_RETRY_MS', 3000))
+    # Logged-in user profiles (principal.py), cached per process; profile edits
+    # reach other workers within TTL seconds
+    PRINCIPAL_CACHE_SIZE = int(os.environ.get('PRINCIPAL_CACHE_SIZE', 1024))
+    PRINCIPAL_CACHE_TTL = float(os.environ.get('PRINCIPAL_CACHE_TTL', 60))
+    # Most FIR updates accepted by one POST /api/fir/bulk_update
+    FIR_BULK_MAX_UPDATES = int(os.environ.get('FIR_BULK_MAX_UPDATES', 500))
+    # Documents per Mongo batch while streaming GET /api/fir/archives/export
+    EXPORT_BATCH_SIZE = int(os.environ.get('EXPORT_BATCH_SIZE', 500))
+
+    # Response compression (http_cache.py): bodies smaller than this go out as is.
+    # Brotli is used when the package is installed and the client prefers it
+    COMPRESS_MIN_BYTES = int(os.environ.get('COMPRESS_MIN_BYTES', 1024))
+    COMPRESS_LEVEL = int(os.environ.get('COMPRESS_LEVEL', 6))
+    COMPRESS_BROTLI_QUALITY = int(os.environ.get('COMPRESS_BROTLI_QUALITY', 4))
+
+    # FIR translation (translation.py): provider ('google' or the offline
+    # 'identity' stand-in), LRU in front of the Mongo `translations` cache,
+    # batching window for concurrent misses, and the circuit breaker that
+    # falls back to the original text after THRESHOLD consecutive failures
+    TRANSLATION_PROVIDER = os.environ.get('TRANSLATION_PROVIDER', 'google')
+    TRANSLATION_CACHE_SIZE = int(os.environ.get('TRANSLATION_CACHE_SIZE', 2048))
+    TRANSLATION_BATCH_WINDOW_MS = float(os.environ.get('TRANSLATION_BATCH_WINDOW_MS', 50))
+    TRANSLATION_BREAKER_THRESHOLD = int(os.environ.get('TRANSLATION_BREAKER_THRESHOLD', 3))
+    TRANSLATION_BREAKER_RESET = float(os.environ.get('TRANSLATION_BREAKER_RESET', 60))
+
+    # Optional inference sidecar (inference_server.py): when set, web workers
+    # send ML requests over this UNIX socket instead of loading the models
+    INFERENCE_SOCKET = os.environ.get('INFERENCE_SOCKET', '')
+    INFERENCE_TIMEOUT = float(os.environ.get('INFERENCE_TIMEOUT', 30))
+    # Precomputed forecasts for every ward x (training years + HORIZON years) x 12 months,
+    # written by generate_models.py; see crime_cube.py
+    CRIME_CUBE_PATH = os.path.join(ASSETS_DIR, 'crime_cube.npy')
+    CRIME_CUBE_HORIZON_YEARS = int(os.environ.get('CRIME_CUBE_HORIZON_YEARS', 5))
+    # Upper bound on rows per /predict_crime/batch request (141 wards x 12 months x ~30 years)
+    CRIME_BATCH_MAX_ROWS = int(os.environ.get('CRIME_BATCH_MAX_ROWS', 50000))
+    BNS_ASSETS_PATH = os.path.join(ASSETS_DIR, 'bns_assets.pkl') # legacy pickle
+    BNS_ASSETS_DIR = os.path.join(ASSETS_DIR, 'bns') # mmap layout, see bns_assets.py
+
+    # BNS ANN index, built offline by generate_models.py / bns_assets.py:
+    # type 'flat' | 'ivf' | 'hnsw' (or 'ip' = flat inner product), metric 'l2' | 'ip'
+    BNS_INDEX_TYPE = os.environ.get('BNS_INDEX_TYPE', 'flat')
+    BNS_INDEX_METRIC = os.environ.get('BNS_INDEX_METRIC', 'l2')
+    BNS_IVF_NLIST = int(os.environ.get('BNS_IVF_NLIST', 0)) # 0 = derive from corpus size
+    BNS_HNSW_M = int(os.environ.get('BNS_HNSW_M', 32))
+    BNS_HNSW_EF_CONSTRUCTION = int(os.environ.get('BNS_HNSW_EF_CONSTRUCTION', 80))
+    # Query-time knobs applied when the index is loaded
+    BNS_IVF_NPROBE = int(os.environ.get('BNS_IVF_NPROBE', 8))
+    BNS_HNSW_EF_SEARCH = int(os.environ.get('BNS_HNSW_EF_SEARCH', 64))
+
+    # Load models in a background thread (with a warm-up inference) so workers
+    # accept traffic immediately; ML endpoints return 503 until ready
+    ML_BACKGROUND_LOAD = os.environ.get('ML_BACKGROUND_LOAD', 'true').lower() == 'true'
+    ML_WARMUP = os.environ.get('ML_WARMUP', 'true').lower() == 'true'
+
+    # BNS query encoder: 'torch' | 'torch-int8' | 'onnx' | 'onnx-int8'.
+    # ONNX backends need `python encoders.py export` and don't import torch.
+    BNS_ENCODER_BACKEND = os.environ.get('BNS_ENCODER_BACKEND', 'torch')
+    BNS_ENCODER_MODEL = os.environ.get('BNS_ENCODER_MODEL', 'all-MiniLM-L6-v2')
+    BNS_ONNX_DIR = os.environ.get('BNS_ONNX_DIR', os.path.join(ASSETS_DIR, 'encoder_onnx'))
+    BNS_ENCODER_THREADS = int(os.environ.get('BNS_ENCODER_THREADS', 0)) # 0 = runtime default
+
+    # BNS retrieval: 'dense' (FAISS), 'lexical' (BM25) or 'hybrid' (fused).
+    # ALPHA is the dense weight in the fusion; a lexical top hit scoring at
+    # least FASTPATH_SCORE and FASTPATH_MARGIN x the runner-up skips the
+    # encoder entirely (0 disables the fast path).
+    BNS_RETRIEVAL_MODE = os.environ.get('BNS_RETRIEVAL_MODE', 'dense')
+    BNS_HYBRID_ALPHA = float(os.environ.get('BNS_HYBRID_ALPHA', 0.5))
+    BNS_HYBRID_CANDIDATES = int(os.environ.get('BNS_HYBRID_CANDIDATES', 4)) # x k from each retriever
+    BNS_LEXICAL_FASTPATH_SCORE = float(os.environ.get('BNS_LEXICAL_FASTPATH_SCORE', 0))
+    BNS_LEXICAL_FASTPATH_MARGIN = float(os.environ.get('BNS_LEXICAL_FASTPATH_MARGIN', 2.0))
+
+    # BNS query micro-batching: concurrent predict_bns calls arriving within
+    # the window are encoded and searched together (0 disables batching)
+    BNS_BATCH_WINDOW_MS = float(os.environ.get('BNS_BATCH_WINDOW_MS', 5))
+    BNS_BATCH_MAX_SIZE = int(os.environ.get('BNS_BATCH_MAX_SIZE', 16))
+
+    # BNS caches: query embeddings and final result lists (LRU, optional TTL
+    # in seconds). Assets are re-checked on disk every CHECK_INTERVAL seconds
+    # and cached results are dropped when they change.
+    BNS_EMBEDDING_CACHE_SIZE = int(os.environ.get('BNS_EMBEDDING_CACHE_SIZE', 4096))
+    BNS_RESULT_CACHE_SIZE = int(os.environ.get('BNS_RESULT_CACHE_SIZE', 1024))
+    BNS_CACHE_TTL = float(os.environ.get('BNS_CACHE_TTL', 0))
+    BNS_ASSETS_CHECK_INTERVAL = float(os.environ.get('BNS_ASSETS_CHECK_INTERVAL', 30))
     
 class DevelopmentConfig(Config):
     DEBUG = True
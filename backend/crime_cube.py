@@ -0,0 +1,167 @@
+"""
+Precomputed crime forecast cube.
+
+The crime model's inputs are discrete (ward, year, month), so
+generate_models.py evaluates it once over every ward x year horizon x 12
+months and stores the rounded forecasts as a dense int32 array:
+
+    crime_cube.npy    int32 (n_wards, n_years, 12)
+    crime_cube.json   wards, first year, n_years, created_at
+
+MLService answers predict_crime by direct indexing and only unpickles the
+RandomForest (and imports scikit-learn) for inputs outside the cube.
+To refresh the cube from the current crime_model.pkl, optionally extending
+the year horizon:
+    python crime_cube.py refresh [extra_years]
+"""
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+MONTHS = 12
+CRIME_FEATURES = ['Ward', 'Year', 'Month']
+
+
+# Ward, year and month travel as C ints (the cube lookup, the sidecar protocol)
+INPUT_MIN, INPUT_MAX = -2 ** 31, 2 ** 31 - 1
+
+
+def check_batch_rows(rows, max_rows):
+    if max_rows is not None and rows > max_rows:
+        raise ValueError(f"Batch of {rows} rows exceeds the limit of {max_rows}")
+
+
+def check_input_range(values, name, low=INPUT_MIN, high=INPUT_MAX):
+    if values and (min(values) < low or max(values) > high):
+        raise ValueError(f'{name} must be between {low} and {high}')
+
+
+def _int_matrix(values):
+    try:
+        return np.asarray(values, dtype=np.int64)
+    except OverflowError:
+        raise ValueError(f'ward, year and month must be between {INPUT_MIN} and {INPUT_MAX}')
+
+
+def crime_grid(wards, years, months, max_rows=None):
+    """
+    Cartesian (ward, year, month) grid as an int matrix, ward-major then year
+    then month. ValueError, before anything is allocated, if it would have
+    more than `max_rows` rows.
+    """
+    check_batch_rows(len(wards) * len(years) * len(months), max_rows)
+    mesh = np.meshgrid(_int_matrix(wards), _int_matrix(years), _int_matrix(months), indexing='ij')
+    return np.stack(mesh, axis=-1).reshape(-1, 3)
+
+
+def crime_points(points, max_rows=None):
+    """Explicit (ward, year, month) `points` as an (n, 3) int matrix; ValueError if too many."""
+    check_batch_rows(len(points), max_rows)
+    return _int_matrix(points).reshape(-1, 3)
+
+
+def meta_path(cube_path):
+    return os.path.splitext(cube_path)[0] + '.json'
+
+
+class CrimeCube:
+    def __init__(self, values, wards, year_start, created_at=None):
+        self.values = values
+        self.wards = [int(w) for w in wards]
+        self.year_start = int(year_start)
+        self.n_years = values.shape[1]
+        self.created_at = created_at
+        # ward number -> row, -1 for wards outside the cube
+        self._ward_rows = np.full(max(self.wards) + 1 if self.wards else 1, -1, dtype=np.int64)
+        self._ward_rows[self.wards] = np.arange(len(self.wards))
+
+    @property
+    def year_end(self):
+        return self.year_start + self.n_years - 1
+
+    @classmethod
+    def build(cls, model, wards, years):
+        """Evaluate `model` over the full wards x years x 12 months grid in one predict call."""
+        import pandas as pd
+
+        wards = sorted(int(w) for w in wards)
+        years = list(range(min(years), max(years) + 1))
+        grid = crime_grid(wards, years, range(1, MONTHS + 1))
+        predictions = model.predict(pd.DataFrame(grid, columns=CRIME_FEATURES))
+        values = np.rint(predictions).astype(np.int32).reshape(len(wards), len(years), MONTHS)
+        return cls(values, wards, years[0], created_at=time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()))
+
+    def _rows(self, ward, year, month):
+        ward, year, month = (np.asarray(a, dtype=np.int64) for a in (ward, year, month))
+        rows = np.where((ward >= 0) & (ward < len(self._ward_rows)),
+                        self._ward_rows[np.clip(ward, 0, len(self._ward_rows) - 1)], -1)
+        years = year - self.year_start
+        hit = (rows >= 0) & (years >= 0) & (years < self.n_years) & (month >= 1) & (month <= MONTHS)
+        return rows, years, month - 1, hit
+
+    def lookup(self, ward, year, month):
+        """Forecast for one input, or None if it falls outside the cube."""
+        rows, years, months, hit = self._rows(ward, year, month)
+        if not hit:
+            return None
+        return int(self.values[rows, years, months])
+
+    def lookup_many(self, inputs):
+        """Forecasts for an (n, 3) input matrix plus a mask of which rows were inside the cube."""
+        inputs = np.asarray(inputs, dtype=np.int64).reshape(-1, 3)
+        rows, years, months, hit = self._rows(inputs[:, 0], inputs[:, 1], inputs[:, 2])
+        predictions = np.zeros(len(inputs), dtype=np.int64)
+        predictions[hit] = self.values[rows[hit], years[hit], months[hit]]
+        return predictions, hit
+
+    def save(self, path):
+        directory = os.path.dirname(path) or '.'
+        os.makedirs(directory, exist_ok=True)
+        meta = {'wards': self.wards, 'year_start': self.year_start, 'n_years': self.n_years,
+                'months': MONTHS, 'created_at': self.created_at}
+        # Array first, metadata last: a reader never sees new metadata with an old array
+        tmp = path + '.tmp'
+        with open(tmp, 'wb') as f:
+            np.save(f, np.ascontiguousarray(self.values, dtype=np.int32))
+        os.replace(tmp, path)
+        tmp = meta_path(path) + '.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(meta, f, indent=2)
+        os.replace(tmp, meta_path(path))
+        return meta
+
+    @classmethod
+    def exists(cls, path):
+        return os.path.exists(path) and os.path.exists(meta_path(path))
+
+    @classmethod
+    def open(cls, path, mmap=True):
+        with open(meta_path(path), 'r', encoding='utf-8') as f:
+            meta = json.load(f)
+        values = np.load(path, mmap_mode='r' if mmap else None)
+        if values.shape != (len(meta['wards']), meta['n_years'], MONTHS):
+            raise ValueError(f"Crime cube shape {values.shape} does not match {meta_path(path)}")
+        return cls(values, meta['wards'], meta['year_start'], created_at=meta.get('created_at'))
+
+
+if __name__ == '__main__':
+    import pickle
+
+    from config import Config
+
+    if len(sys.argv) < 2 or sys.argv[1] != 'refresh':
+        print("Usage: python crime_cube.py refresh [extra_years]")
+        sys.exit(1)
+    if not CrimeCube.exists(Config.CRIME_CUBE_PATH):
+        print(f"No crime cube at {Config.CRIME_CUBE_PATH}; run research/model_generation_scripts/generate_models.py")
+        sys.exit(1)
+    extra_years = int(sys.argv[2]) if len(sys.argv) > 2 else 0
+    current = CrimeCube.open(Config.CRIME_CUBE_PATH)
+    with open(Config.CRIME_MODEL_PATH, 'rb') as f:
+        crime_model = pickle.load(f)
+    cube = CrimeCube.build(crime_model, current.wards, [current.year_start, current.year_end + extra_years])
+    cube.save(Config.CRIME_CUBE_PATH)
+    print(f"Refreshed crime cube: {len(cube.wards)} wards x {cube.year_start}-{cube.year_end} x {MONTHS} months")
@@ -1,3 +1,4 @@
+import threading
 from flask_pymongo import PyMongo
 
 mongo = PyMongo()
@@ -13,5 +14,28 @@ def init_db(app):
     except Exception as e:
         print(f"Error configuring MongoDB: {e}")
 
+    if app.config.get('MONGO_ENSURE_INDEXES', True):
+        # In the background so an unreachable Mongo doesn't hold up startup
+        audit = app.config.get('MONGO_QUERY_AUDIT')
+        if audit is None:
+            audit = app.config.get('DEBUG', False)
+        threading.Thread(target=bootstrap_indexes, args=(mongo.db, audit), name='mongo-indexes', daemon=True).start()
+
+def bootstrap_indexes(db, audit=False):
+    from indexes import ensure_indexes, audit_query_shapes
+    from accounts import ensure_usernames, normalize_unique_fields
+    try:
+        # Partial unique indexes only cover string values: convert legacy numbers first
+        normalized = normalize_unique_fields(db)
+        if normalized:
+            print(f"Stored {normalized} legacy account field(s) as strings")
+        created = ensure_indexes(db)
+        print(f"MongoDB indexes ensured ({len(created)})")
+        ensure_usernames(db)
+        if audit:
+            audit_query_shapes(db)
+    except Exception as e:
+        print(f"Error ensuring MongoDB indexes: {e}")
+
 def get_db():
     return mongo.db
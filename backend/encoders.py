@@ -0,0 +1,211 @@
+"""
+Query encoder backends for BNS search.
+
+All backends expose `encode(texts) -> float32 ndarray (n, dim)` and produce
+embeddings compatible with the stored index (same model, pooling and
+normalization):
+
+    torch       full-precision SentenceTransformer (reference)
+    torch-int8  SentenceTransformer with dynamically int8-quantized Linear layers
+    onnx        exported ONNX graph run by ONNX Runtime, no torch import at all
+    onnx-int8   the same graph with dynamically int8-quantized weights
+
+The ONNX backends need a one-off export (torch is only needed for that):
+    python encoders.py export [model_name] [output_dir]
+"""
+import json
+import os
+import sys
+
+import numpy as np
+
+BACKENDS = ('torch', 'torch-int8', 'onnx', 'onnx-int8')
+
+ONNX_MODEL_FILE = 'model.onnx'
+ONNX_INT8_MODEL_FILE = 'model.int8.onnx'
+TOKENIZER_FILE = 'tokenizer.json'
+ENCODER_CONFIG_FILE = 'encoder.json'
+
+
+class SentenceTransformerEncoder:
+    """PyTorch SentenceTransformer, optionally with dynamic int8 quantization."""
+
+    def __init__(self, model_name, quantize=False):
+        import torch
+        from sentence_transformers import SentenceTransformer
+
+        self.model = SentenceTransformer(model_name, device='cpu')
+        if quantize:
+            self.model = torch.quantization.quantize_dynamic(self.model, {torch.nn.Linear}, dtype=torch.qint8)
+        self.dimension = _embedding_dimension(self.model)
+        self.backend = 'torch-int8' if quantize else 'torch'
+
+    def encode(self, texts, batch_size=32):
+        return np.asarray(self.model.encode(list(texts), batch_size=batch_size), dtype=np.float32)
+
+
+class OnnxEncoder:
+    """
+    Torch-free encoder: HF `tokenizers` + ONNX Runtime, followed by the same
+    pooling / normalization the SentenceTransformer pipeline applies.
+    """
+
+    def __init__(self, model_dir, quantized=False, num_threads=0):
+        import onnxruntime
+        from tokenizers import Tokenizer
+
+        with open(os.path.join(model_dir, ENCODER_CONFIG_FILE), 'r', encoding='utf-8') as f:
+            self.config = json.load(f)
+        self.dimension = self.config['dimension']
+        self.pooling = self.config.get('pooling', 'mean')
+        self.normalize = self.config.get('normalize', True)
+
+        self.tokenizer = Tokenizer.from_file(os.path.join(model_dir, TOKENIZER_FILE))
+        self.tokenizer.enable_truncation(max_length=self.config['max_seq_length'])
+        self.tokenizer.enable_padding(pad_id=self.config.get('pad_token_id', 0),
+                                      pad_token=self.config.get('pad_token', '[PAD]'))
+
+        options = onnxruntime.SessionOptions()
+        if num_threads:
+            options.intra_op_num_threads = int(num_threads)
+        model_file = ONNX_INT8_MODEL_FILE if quantized else ONNX_MODEL_FILE
+        self.session = onnxruntime.InferenceSession(
+            os.path.join(model_dir, model_file), options, providers=['CPUExecutionProvider'])
+        self.input_names = {i.name for i in self.session.get_inputs()}
+        self.backend = 'onnx-int8' if quantized else 'onnx'
+
+    def _pool(self, hidden, mask):
+        if self.pooling == 'cls':
+            return hidden[:, 0]
+        if self.pooling == 'max':
+            return np.where(mask[..., None] > 0, hidden, -1e9).max(axis=1)
+        weights = mask[..., None].astype(np.float32)
+        return (hidden * weights).sum(axis=1) / np.clip(weights.sum(axis=1), 1e-9, None)
+
+    def encode(self, texts, batch_size=32):
+        texts = list(texts)
+        out = np.empty((len(texts), self.dimension), dtype=np.float32)
+        for start in range(0, len(texts), batch_size):
+            encodings = self.tokenizer.encode_batch(texts[start:start + batch_size])
+            feed = {
+                'input_ids': np.asarray([e.ids for e in encodings], dtype=np.int64),
+                'attention_mask': np.asarray([e.attention_mask for e in encodings], dtype=np.int64),
+            }
+            if 'token_type_ids' in self.input_names:
+                feed['token_type_ids'] = np.asarray([e.type_ids for e in encodings], dtype=np.int64)
+            hidden = self.session.run(None, feed)[0]
+            pooled = self._pool(hidden, feed['attention_mask'])
+            if self.normalize:
+                pooled = pooled / np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+            out[start:start + len(encodings)] = pooled
+        return out
+
+
+def load_encoder(backend='torch', model_name='all-MiniLM-L6-v2', onnx_dir=None, num_threads=0):
+    backend = (backend or 'torch').lower()
+    if backend not in BACKENDS:
+        raise ValueError(f"Unknown encoder backend '{backend}', expected one of {BACKENDS}")
+    if backend.startswith('onnx'):
+        if not onnx_dir or not os.path.exists(os.path.join(onnx_dir, ENCODER_CONFIG_FILE)):
+            raise FileNotFoundError(f"ONNX encoder not found in {onnx_dir}; run `python encoders.py export` first")
+        return OnnxEncoder(onnx_dir, quantized=backend == 'onnx-int8', num_threads=num_threads)
+    return SentenceTransformerEncoder(model_name, quantize=backend == 'torch-int8')
+
+
+def _embedding_dimension(st_model):
+    # Renamed to get_embedding_dimension() in newer sentence-transformers releases
+    getter = getattr(st_model, 'get_embedding_dimension', None) or st_model.get_sentence_embedding_dimension
+    return getter()
+
+
+def _pooling_mode(config):
+    mode = config.get('pooling_mode')
+    if isinstance(mode, str):
+        return mode
+    # Older sentence-transformers releases store one boolean flag per mode
+    for name, key in (('cls', 'pooling_mode_cls_token'), ('max', 'pooling_mode_max_tokens'),
+                      ('mean', 'pooling_mode_mean_tokens')):
+        if config.get(key):
+            return name
+    return 'mean'
+
+
+def export_onnx(model_name, output_dir, quantize=True, opset=17):
+    """
+    Export a SentenceTransformer's transformer to ONNX (plus its fast
+    tokenizer and pooling settings), and optionally a dynamic int8 copy.
+    """
+    import torch
+    from sentence_transformers import SentenceTransformer
+    try:
+        from sentence_transformers.sentence_transformer.modules import Normalize, Pooling
+    except ImportError:
+        from sentence_transformers.models import Normalize, Pooling
+
+    os.makedirs(output_dir, exist_ok=True)
+    st_model = SentenceTransformer(model_name, device='cpu')
+    transformer = st_model[0]
+    auto_model = transformer.auto_model.eval()
+    tokenizer = transformer.tokenizer
+
+    pooling = 'mean'
+    for module in st_model:
+        if isinstance(module, Pooling):
+            pooling = _pooling_mode(module.get_config_dict())
+    if pooling not in ('mean', 'cls', 'max'):
+        raise ValueError(f"Unsupported pooling mode for ONNX export: {pooling}")
+    normalize = any(isinstance(module, Normalize) for module in st_model)
+
+    input_names = ['input_ids', 'attention_mask']
+    if 'token_type_ids' in tokenizer.model_input_names:
+        input_names.append('token_type_ids')
+
+    class _HiddenStates(torch.nn.Module):
+        def __init__(self, model):
+            super().__init__()
+            self.model = model
+
+        def forward(self, *inputs):
+            return self.model(**dict(zip(input_names, inputs))).last_hidden_state
+
+    sample = tokenizer(['export sample sentence'], return_tensors='pt')
+    dynamic_axes = {name: {0: 'batch', 1: 'sequence'} for name in input_names}
+    dynamic_axes['last_hidden_state'] = {0: 'batch', 1: 'sequence'}
+    model_path = os.path.join(output_dir, ONNX_MODEL_FILE)
+    with torch.no_grad():
+        torch.onnx.export(
+            _HiddenStates(auto_model), tuple(sample[name] for name in input_names), model_path,
+            input_names=input_names, output_names=['last_hidden_state'],
+            dynamic_axes=dynamic_axes, opset_version=opset, dynamo=False)
+
+    tokenizer.backend_tokenizer.save(os.path.join(output_dir, TOKENIZER_FILE))
+    config = {
+        'model_name': model_name,
+        'dimension': _embedding_dimension(st_model),
+        'max_seq_length': st_model.max_seq_length,
+        'pooling': pooling,
+        'normalize': normalize,
+        'pad_token': tokenizer.pad_token,
+        'pad_token_id': tokenizer.pad_token_id,
+        'inputs': input_names,
+    }
+    with open(os.path.join(output_dir, ENCODER_CONFIG_FILE), 'w', encoding='utf-8') as f:
+        json.dump(config, f, indent=2)
+
+    if quantize:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        quantize_dynamic(model_path, os.path.join(output_dir, ONNX_INT8_MODEL_FILE), weight_type=QuantType.QInt8)
+    return config
+
+
+if __name__ == '__main__':
+    from config import Config
+
+    if len(sys.argv) < 2 or sys.argv[1] != 'export':
+        print("Usage: python encoders.py export [model_name] [output_dir]")
+        sys.exit(1)
+    model = sys.argv[2] if len(sys.argv) > 2 else Config.BNS_ENCODER_MODEL
+    target = sys.argv[3] if len(sys.argv) > 3 else Config.BNS_ONNX_DIR
+    print(f"Exporting {model} -> {target}")
+    info = export_onnx(model, target)
+    print(f"Exported {info['dimension']}-d encoder ({info['pooling']} pooling, normalize={info['normalize']})")
@@ -0,0 +1,213 @@
+"""
+FIR status updates, one or many per request.
+
+apply_updates() serves both PUT /api/fir/<id>/update and
+POST /api/fir/bulk_update with a fixed number of round trips per batch:
+
+    find        every FIR in the batch
+    bulk_write  conditional $set for FIRs that stay active
+    archive     resolved FIRs: insert_many into archives + delete_many from
+                firs, in one transaction when the deployment supports them;
+                the delete matches on the status and last_updated read above
+    insert_many status-change notifications (pushed to open streams, see notifications.py)
+    $inc        station_stats / monthly_rollups, one update per station
+    $inc        list versions of the affected users and stations (http_cache.py)
+
+Each item gets a result {fir_id, ok, code, ...}; a failed item doesn't stop
+the others.
+"""
+import uuid
+from datetime import datetime
+
+from pymongo import UpdateOne
+from pymongo.errors import BulkWriteError, ConfigurationError, OperationFailure
+
+import http_cache
+import monthly_rollups
+import notifications
+import station_stats
+
+ARCHIVED_STATUSES = ('resolved',)
+
+# None until the first archive attempt tells us whether the server supports transactions
+_transactions_supported = None
+
+
+def _result(fir_id, code, **extra):
+    return dict({'fir_id': fir_id, 'ok': code < 400, 'code': code}, **extra)
+
+
+def parse_item(item):
+    """(fir_id, status, sections, notes) from one update; ValueError if invalid."""
+    if not isinstance(item, dict):
+        raise ValueError('Each update must be an object')
+    fir_id = item.get('fir_id')
+    if not fir_id or not isinstance(fir_id, str):
+        raise ValueError('fir_id is required')
+    status = item.get('status')
+    if not status or not isinstance(status, str):
+        raise ValueError('Status is required')
+    sections = item.get('applicable_sections') or []
+    if not isinstance(sections, list) or not all(isinstance(s, str) for s in sections):
+        raise ValueError('applicable_sections must be a list of strings')
+    notes = item.get('police_notes', '')
+    if not isinstance(notes, str):
+        raise ValueError('police_notes must be a string')
+    return fir_id, status, sections, notes
+
+
+def _notification(fir, message, now):
+    return {
+        '_id': str(uuid.uuid4()),
+        'user_id': fir['user_id'],
+        'message': message,
+        'is_read': False,
+        'created_at': now
+    }
+
+
+def _status_message(fir_id, status):
+    if status == 'resolved':
+        return f"Your FIR ({fir_id[:8]}) has been marked as RESOLVED."
+    return f"Your FIR ({fir_id[:8]}) status has been updated to '{status.replace('_', ' ').title()}'."
+
+
+def _archive(db, moves):
+    """
+    Move FIRs from firs to archives; `moves` are (old_fir, updated doc) pairs.
+    A FIR is only moved while it still has the status and last_updated it was
+    read with; returns the ids that were archived.
+    """
+    global _transactions_supported
+    docs = {doc['_id']: doc for _, doc in moves}
+    unchanged = {'$or': [{'_id': old_fir['_id'], 'status': old_fir.get('status'),
+                          'last_updated': old_fir.get('last_updated')} for old_fir, _ in moves]}
+
+    def move(session=None):
+        ids = [fir['_id'] for fir in db.firs.find(unchanged, {'_id': 1}, session=session)]
+        if ids:
+            db.archives.insert_many([docs[fir_id] for fir_id in ids], ordered=False, session=session)
+            db.firs.delete_many(dict(unchanged, _id={'$in': ids}), session=session)
+        return ids
+
+    if _transactions_supported is not False:
+        try:
+            with db.client.start_session() as session:
+                ids = session.with_transaction(lambda s: move(s))
+            _transactions_supported = True
+            return ids
+        except (OperationFailure, ConfigurationError, NotImplementedError) as e:
+            # Standalone servers reject transactions (IllegalOperation, code 20)
+            if isinstance(e, OperationFailure) and e.code not in (20, None):
+                raise
+            print(f"MongoDB transactions unavailable ({e}); archiving without one")
+            _transactions_supported = False
+
+    # No transaction: insert first so a FIR is never missing from both collections.
+    # "Already archived" is fine (a retried batch) as long as our own delete then
+    # removes the FIR; if it doesn't, someone else moved or changed it.
+    ordered = list(docs.values())
+    inserted = set(docs)
+    try:
+        db.archives.insert_many(ordered, ordered=False)
+    except BulkWriteError as e:
+        if any(err.get('code') != 11000 for err in e.details.get('writeErrors', [])):
+            raise
+        inserted -= {ordered[err['index']]['_id'] for err in e.details['writeErrors']}
+    moved = []
+    for (old_fir, _), condition in zip(moves, unchanged['$or']):
+        if db.firs.delete_one(condition).deleted_count:
+            moved.append(old_fir['_id'])
+        elif old_fir['_id'] in inserted:
+            db.archives.delete_one({'_id': old_fir['_id']}) # our copy of a FIR we didn't move
+    return moved
+
+
+def apply_updates(db, items, station_id=None):
+    """
+    Apply status updates; `items` are dicts (fir_id, status, applicable_sections,
+    police_notes). With `station_id`, FIRs of other stations are refused.
+    Returns one result per item, in order.
+    """
+    now = datetime.utcnow()
+    now = now.replace(microsecond=now.microsecond // 1000 * 1000) # what Mongo stores, see below
+    results = [None] * len(items)
+    parsed = {}
+    for i, item in enumerate(items):
+        try:
+            fir_id, status, sections, notes = parse_item(item)
+        except ValueError as e:
+            results[i] = _result(item.get('fir_id') if isinstance(item, dict) else None, 400, error=str(e))
+            continue
+        if fir_id in parsed:
+            results[i] = _result(fir_id, 400, error='Duplicate fir_id in request')
+            continue
+        parsed[fir_id] = (i, status, sections, notes)
+
+    old_firs = {fir['_id']: fir for fir in db.firs.find({'_id': {'$in': list(parsed)}})} if parsed else {}
+
+    updates, archived, messages = [], [], []
+    for fir_id, (i, status, sections, notes) in parsed.items():
+        old_fir = old_firs.get(fir_id)
+        if old_fir is None:
+            results[i] = _result(fir_id, 404, error='FIR not found')
+            continue
+        if station_id and old_fir.get('station_id') != station_id:
+            results[i] = _result(fir_id, 403, error='FIR belongs to another station')
+            continue
+        update_data = {'status': status, 'police_notes': notes, 'last_updated': now}
+        if sections:
+            update_data['applicable_sections'] = sections
+        if status in ARCHIVED_STATUSES:
+            archived.append((i, old_fir, dict(old_fir, **update_data)))
+        else:
+            # Matching on the status we read keeps the station counters exact
+            updates.append((i, old_fir, status, UpdateOne({'_id': fir_id, 'status': old_fir.get('status')},
+                                                          {'$set': update_data})))
+
+    transitions = []
+    if updates:
+        result = db.firs.bulk_write([op for _, _, _, op in updates], ordered=False)
+        applied = None
+        if result.matched_count < len(updates):
+            # Find out which ones lost a race: ours carry this batch's last_updated
+            ids = [fir['_id'] for _, fir, _, _ in updates]
+            applied = {fir['_id'] for fir in db.firs.find({'_id': {'$in': ids}, 'last_updated': now}, {'_id': 1})}
+        for i, old_fir, status, _ in updates:
+            fir_id = old_fir['_id']
+            if applied is not None and fir_id not in applied:
+                results[i] = _result(fir_id, 409, error='FIR was updated concurrently, please retry')
+                continue
+            results[i] = _result(fir_id, 200, status=status, archived=False)
+            transitions.append((old_fir.get('station_id'), old_fir.get('status'), status, False))
+            if old_fir.get('status') != status:
+                messages.append(_notification(old_fir, _status_message(fir_id, status), now))
+
+    if archived:
+        try:
+            moved = set(_archive(db, [(old_fir, doc) for _, old_fir, doc in archived]))
+        except Exception as e:
+            print(f"Archiving {len(archived)} FIR(s) failed: {e}")
+            for i, old_fir, _ in archived:
+                results[i] = _result(old_fir['_id'], 500, error='Could not archive FIR')
+        else:
+            done = []
+            for i, old_fir, doc in archived:
+                if old_fir['_id'] not in moved:
+                    results[i] = _result(old_fir['_id'], 409, error='FIR was updated concurrently, please retry')
+                    continue
+                results[i] = _result(old_fir['_id'], 200, status=doc['status'], archived=True)
+                transitions.append((old_fir.get('station_id'), old_fir.get('status'), doc['status'], True))
+                messages.append(_notification(old_fir, _status_message(old_fir['_id'], doc['status']), now))
+                done.append((old_fir, doc['status']))
+            if done:
+                monthly_rollups.record_archived_many(db, done, now)
+
+    if messages:
+        try:
+            notifications.create(db, messages)
+        except Exception as e:
+            print(f"Could not create {len(messages)} notification(s): {e}")
+    station_stats.record_transitions(db, transitions)
+    http_cache.touch(db, [old_firs[result['fir_id']] for result in results if result['ok']])
+    return results
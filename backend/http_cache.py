@@ -0,0 +1,169 @@
+"""
+Conditional GETs and response compression for the FIR API.
+
+List responses (GET /api/fir/, /archives, /pending) are validated by
+version counters in `collection_versions`, one per scope a list can cover:
+
+    {_id: 'user:<user_id>' | 'station:<station_id>' | 'station:*', v: n, at: datetime}
+
+Every write to an FIR calls touch() for its scopes (one update_many), after
+the write. A list's ETag is derived from its scope's version and the query
+string, so If-None-Match is answered with a 304 after one _id read and
+before any FIR is loaded:
+
+    etag, last_modified = http_cache.list_validators(db, scope)
+    if http_cache.is_fresh(etag, last_modified):
+        return http_cache.not_modified(etag, last_modified)
+    ...
+    return http_cache.with_validators(resp, etag, last_modified)
+
+The version is read before the data, so an ETag is never newer than the
+body it was sent with. A single FIR (GET /api/fir/<id>) is validated by its
+own last_updated / ai_updated_at (see fir_etag()).
+
+If-None-Match is preferred whenever the client sends it. Last-Modified has
+one-second resolution, so it is only sent (and If-Modified-Since only
+honoured) once the second of the last change is over: until then another
+change in the same second would look unmodified.
+
+compress() runs after every request and gzips (or brotli-compresses, when
+the Brotli package is installed and the client prefers it) JSON/HTML bodies
+over COMPRESS_MIN_BYTES. Streamed responses (SSE, exports) are left alone.
+"""
+import gzip
+import hashlib
+from datetime import datetime, timezone
+
+from flask import request
+from pymongo import ReturnDocument
+
+from config import Config
+
+try:
+    import brotli
+except ImportError: # gzip only
+    brotli = None
+
+ALL_STATIONS = 'station:*'
+CACHE_CONTROL = 'private, no-cache' # the browser keeps the body but revalidates every time
+COMPRESSIBLE_MIMETYPES = ('application/json', 'text/html', 'text/css', 'text/plain',
+                          'application/javascript', 'text/javascript')
+
+
+def scopes(fir):
+    """The version counters an FIR's lists depend on."""
+    found = {f"user:{fir['user_id']}", ALL_STATIONS} if fir.get('user_id') else {ALL_STATIONS}
+    if fir.get('station_id'):
+        found.add(f"station:{fir['station_id']}")
+    return found
+
+
+def station_scope(station_id):
+    return f"station:{station_id}" if station_id else ALL_STATIONS
+
+
+def touch(db, firs):
+    """Bump the versions of every list containing one of `firs`; call after the write."""
+    names = set()
+    for fir in firs:
+        names |= scopes(fir)
+    if not names:
+        return
+    try:
+        # Counters only exist once a list has been served (see version()): nothing to invalidate otherwise
+        db.collection_versions.update_many({'_id': {'$in': sorted(names)}},
+                                           {'$inc': {'v': 1}, '$set': {'at': datetime.utcnow()}})
+    except Exception as e:
+        print(f"Could not bump list versions {sorted(names)}: {e}")
+
+
+def version(db, scope):
+    """{v, at} for a scope, created at 0 the first time it is asked for."""
+    counter = db.collection_versions.find_one({'_id': scope})
+    if counter is None:
+        counter = db.collection_versions.find_one_and_update(
+            {'_id': scope}, {'$setOnInsert': {'v': 0, 'at': datetime.utcnow()}},
+            upsert=True, return_document=ReturnDocument.AFTER)
+    return counter
+
+
+def make_etag(*parts):
+    return hashlib.sha1('|'.join(str(part) for part in parts).encode('utf-8')).hexdigest()
+
+
+def list_validators(db, scope):
+    """(etag, last_modified) for a list request covering `scope`; the query string is part of the ETag."""
+    counter = version(db, scope)
+    etag = make_etag(request.path, scope, counter.get('v', 0), request.query_string.decode('latin-1'))
+    return etag, counter.get('at')
+
+
+def fir_etag(fir):
+    """(etag, last_modified) for one FIR; needs only _id, last_updated and ai_updated_at."""
+    last_modified = max(filter(None, (fir.get('last_updated'), fir.get('ai_updated_at'))), default=None)
+    return make_etag(fir['_id'], fir.get('last_updated'), fir.get('ai_updated_at')), last_modified
+
+
+def is_conditional():
+    return bool(request.if_none_match or request.if_modified_since)
+
+
+def _aware(value):
+    # Mongo datetimes are naive UTC; HTTP dates have one-second resolution
+    return value.replace(tzinfo=timezone.utc, microsecond=0)
+
+
+def _settled(value):
+    """Whether `value` is in an earlier second than now, so Last-Modified can't miss a later change."""
+    return isinstance(value, datetime) and _aware(value) < datetime.now(timezone.utc).replace(microsecond=0)
+
+
+def is_fresh(etag, last_modified=None):
+    """Whether the client's copy (If-None-Match, else If-Modified-Since) is still current."""
+    if request.if_none_match:
+        return request.if_none_match.contains_weak(etag)
+    if request.if_modified_since and _settled(last_modified):
+        return _aware(last_modified) <= request.if_modified_since
+    return False
+
+
+def with_validators(resp, etag, last_modified=None):
+    resp.set_etag(etag, weak=True) # weak: the same JSON gzipped or not
+    if _settled(last_modified):
+        resp.last_modified = _aware(last_modified)
+    resp.headers['Cache-Control'] = CACHE_CONTROL
+    return resp
+
+
+def not_modified(etag, last_modified=None):
+    from flask import current_app
+
+    return with_validators(current_app.response_class(status=304), etag, last_modified)
+
+
+def _encoding():
+    offered = ['br', 'gzip'] if brotli is not None else ['gzip']
+    return request.accept_encodings.best_match(offered)
+
+
+def compress(resp):
+    """after_request hook: compress a large enough JSON/HTML body for clients that accept it."""
+    if (resp.direct_passthrough or resp.is_streamed or resp.status_code < 200 or resp.status_code in (204, 304)
+            or 'Content-Encoding' in resp.headers or resp.mimetype not in COMPRESSIBLE_MIMETYPES):
+        return resp
+    resp.vary.add('Accept-Encoding')
+    if resp.content_length is not None and resp.content_length < Config.COMPRESS_MIN_BYTES:
+        return resp
+    encoding = _encoding()
+    if encoding is None:
+        return resp
+    data = resp.get_data()
+    if len(data) < Config.COMPRESS_MIN_BYTES:
+        return resp
+    if encoding == 'br':
+        data = brotli.compress(data, quality=Config.COMPRESS_BROTLI_QUALITY)
+    else:
+        data = gzip.compress(data, compresslevel=Config.COMPRESS_LEVEL, mtime=0)
+    resp.set_data(data)
+    resp.headers['Content-Encoding'] = encoding
+    return resp
@@ -0,0 +1,165 @@
+"""
+MongoDB index bootstrap and query-shape audit.
+
+INDEX_SPECS declares the compound indexes behind the hot queries in
+fir_routes.py, police_routes.py and jobs.py, and the unique indexes that
+accounts.py relies on for registration; ensure_indexes() creates them
+idempotently at startup (create_index is a no-op for an existing index).
+
+QUERY_SHAPES registers those queries with representative values. In
+development, audit_query_shapes() runs explain() on each and warns when the
+winning plan still does a collection scan or an in-memory sort.
+"""
+from datetime import datetime
+
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import ConnectionFailure
+
+INDEX_SPECS = {
+    'firs': [
+        # station inbox / dashboard recent list, and per-status counts + pending queue.
+        # List indexes end in _id: pages are sorted on (submission_date, _id), see pagination.py
+        ([('station_id', ASCENDING), ('submission_date', DESCENDING), ('_id', DESCENDING)],
+         {'name': 'station_submitted_id'}),
+        ([('station_id', ASCENDING), ('status', ASCENDING), ('submission_date', DESCENDING), ('_id', DESCENDING)],
+         {'name': 'station_status_submitted_id'}),
+        # pending queue for officers without a station
+        ([('status', ASCENDING), ('submission_date', DESCENDING), ('_id', DESCENDING)],
+         {'name': 'status_submitted_id'}),
+        # citizen history
+        ([('user_id', ASCENDING), ('submission_date', DESCENDING), ('_id', DESCENDING)],
+         {'name': 'user_submitted_id'}),
+    ],
+    'archives': [
+        ([('station_id', ASCENDING), ('submission_date', DESCENDING), ('_id', DESCENDING)],
+         {'name': 'station_submitted_id'}),
+        ([('station_id', ASCENDING), ('status', ASCENDING)], {'name': 'station_status'}),
+        ([('user_id', ASCENDING), ('submission_date', DESCENDING), ('_id', DESCENDING)],
+         {'name': 'user_submitted_id'}),
+        ([('submission_date', DESCENDING), ('_id', DESCENDING)], {'name': 'submitted_id'}),
+    ],
+    'notifications': [
+        ([('user_id', ASCENDING), ('created_at', DESCENDING), ('_id', DESCENDING)], {'name': 'user_created_id'}),
+        ([('user_id', ASCENDING), ('is_read', ASCENDING)], {'name': 'user_unread'}),
+    ],
+    'monthly_rollups': [
+        ([('station_id', ASCENDING), ('period', ASCENDING)], {'name': 'station_period'}),
+    ],
+    # Account uniqueness, see accounts.py. Names start with the field: accounts.duplicate_field()
+    # reads it from the error. Partial, so legacy accounts without an aadhar etc. don't collide on null
+    'users': [
+        ([('username', ASCENDING)], {'name': 'username_unique', 'unique': True}),
+        ([('aadhar', ASCENDING)], {'name': 'aadhar_unique', 'unique': True,
+                                   'partialFilterExpression': {'aadhar': {'$type': 'string'}}}),
+        ([('phone', ASCENDING)], {'name': 'phone_unique', 'unique': True,
+                                  'partialFilterExpression': {'phone': {'$type': 'string'}}}),
+    ],
+    'police': [
+        ([('username', ASCENDING)], {'name': 'username_unique', 'unique': True}),
+        ([('police_id', ASCENDING)], {'name': 'police_id_unique', 'unique': True,
+                                      'partialFilterExpression': {'police_id': {'$type': 'string'}}}),
+    ],
+    'jobs': [
+        ([('status', ASCENDING), ('run_at', ASCENDING)], {'name': 'status_run_at'}),
+        ([('status', ASCENDING), ('lease_until', ASCENDING)], {'name': 'status_lease'}),
+    ],
+}
+
+# Indexes replaced by a wider one above; dropped by ensure_indexes() if present
+SUPERSEDED_INDEXES = {
+    'firs': ['station_submitted', 'station_status_submitted', 'status_submitted', 'user_submitted'],
+    'archives': ['station_submitted', 'user_submitted', 'submitted'],
+    'notifications': ['user_created'],
+}
+
+_SOME_DATE = datetime(2024, 1, 1)
+_PAGE = [('submission_date', DESCENDING), ('_id', DESCENDING)]
+
+# (name, collection, filter, sort) with representative values, mirroring the route queries
+QUERY_SHAPES = [
+    # login, see accounts.find_credentials()
+    ('auth.login_citizen', 'users', {'username': 'u'}, None),
+    ('auth.login_police', 'police', {'username': 'u'}, None),
+    ('fir.user_history', 'firs', {'user_id': 'u'}, _PAGE),
+    ('fir.user_archives', 'archives', {'user_id': 'u'}, _PAGE),
+    ('fir.all_archives', 'archives', {}, _PAGE),
+    ('fir.station_archives', 'archives', {'station_id': 's'}, _PAGE),
+    ('fir.pending', 'firs', {'station_id': 's', 'status': {'$in': ['pending', 'in_progress']}}, _PAGE),
+    ('fir.pending_all_stations', 'firs', {'status': {'$in': ['pending', 'in_progress']}}, _PAGE),
+    ('fir.notifications', 'notifications', {'user_id': 'u'}, [('created_at', DESCENDING), ('_id', DESCENDING)]),
+    ('police.dashboard_recent', 'firs', {'station_id': 's'}, [('submission_date', DESCENDING)]),
+    ('police.inbox', 'firs', {'station_id': 's'}, [('submission_date', DESCENDING)]),
+    ('police.archives', 'archives', {'station_id': 's'}, [('submission_date', DESCENDING)]),
+    # station_stats.rebuild() for one station
+    ('stats.station_firs', 'firs', {'station_id': 's'}, None),
+    ('stats.station_archives', 'archives', {'station_id': 's'}, None),
+    ('rollups.range', 'monthly_rollups', {'station_id': 's', 'period': {'$gte': '2024-01', '$lte': '2024-06'}}, None),
+    ('jobs.claim_due', 'jobs', {'status': 'queued', 'run_at': {'$lte': _SOME_DATE}}, [('run_at', ASCENDING)]),
+    ('jobs.claim_expired', 'jobs', {'status': 'running', 'lease_until': {'$lt': _SOME_DATE}}, None),
+]
+
+
+def ensure_indexes(db, specs=None, superseded=None):
+    """Create any missing indexes (and drop superseded ones); returns the names of the indexes declared."""
+    created = []
+    for collection, names in (SUPERSEDED_INDEXES if superseded is None else superseded).items():
+        try:
+            existing = db[collection].index_information()
+        except ConnectionFailure:
+            raise
+        except Exception:
+            continue
+        for name in names:
+            if name in existing:
+                try:
+                    db[collection].drop_index(name)
+                    print(f"Dropped superseded index {name} on {collection}")
+                except Exception as e:
+                    print(f"Could not drop index {name} on {collection}: {e}")
+    for collection, indexes in (specs or INDEX_SPECS).items():
+        for keys, options in indexes:
+            try:
+                created.append(f"{collection}.{db[collection].create_index(keys, **options)}")
+            except ConnectionFailure:
+                raise # no point trying the rest
+            except Exception as e:
+                print(f"Could not create index {options.get('name')} on {collection}: {e}")
+    return created
+
+
+def plan_stages(plan):
+    """All stage names in an explain() plan tree."""
+    stages = []
+    stack = [plan] if plan else []
+    while stack:
+        node = stack.pop()
+        if 'stage' in node:
+            stages.append(node['stage'])
+        if 'inputStage' in node:
+            stack.append(node['inputStage'])
+        stack.extend(node.get('inputStages', []))
+        if 'queryPlan' in node: # slot-based engine wraps the classic tree
+            stack.append(node['queryPlan'])
+    return stages
+
+
+def audit_query_shapes(db, shapes=None):
+    """explain() every registered query shape; returns {name: problem} for the ones that need attention."""
+    problems = {}
+    for name, collection, query, sort in shapes or QUERY_SHAPES:
+        try:
+            cursor = db[collection].find(query)
+            if sort:
+                cursor = cursor.sort(sort)
+            explain = cursor.explain()
+        except Exception as e:
+            problems[name] = f'explain failed: {e}'
+            continue
+        stages = plan_stages(explain.get('queryPlanner', {}).get('winningPlan', {}))
+        if 'COLLSCAN' in stages:
+            problems[name] = 'COLLSCAN'
+        elif 'SORT' in stages:
+            problems[name] = 'in-memory SORT'
+    for name, problem in problems.items():
+        print(f"\033[93mWARNING: query shape '{name}' uses {problem}; add an index to INDEX_SPECS\033[0m")
+    return problems
@@ -0,0 +1,104 @@
+"""
+Wire protocol between web workers and the inference sidecar
+(inference_server.py) over a UNIX domain socket.
+
+Every message is a frame: a 5-byte header (1-byte op or status, 4-byte
+big-endian payload length) followed by the payload. Payloads:
+
+    STATUS, CACHE_STATS       request empty; response JSON
+    PREDICT_BNS               request '!HB' (k, mode code) + UTF-8 query; response JSON results
+    PREDICT_CRIME             request '!iii' (ward, year, month); response '!?i' (found, prediction)
+    PREDICT_CRIME_BATCH       request C int (ward, year, month) triples; response C int predictions
+
+(batch arrays use native byte order: both ends always run on the same host)
+
+Error responses carry a UTF-8 message. Only the standard library is used
+here so web workers stay free of ML imports.
+"""
+import json
+import struct
+
+RETRIEVAL_MODES = ('dense', 'hybrid', 'lexical')
+
+HEADER = struct.Struct('!BI')
+MAX_PAYLOAD = 64 * 1024 * 1024
+
+OP_STATUS = 1
+OP_CACHE_STATS = 2
+OP_PREDICT_BNS = 3
+OP_PREDICT_CRIME = 4
+OP_PREDICT_CRIME_BATCH = 5
+
+STATUS_OK = 0
+STATUS_BAD_REQUEST = 1 # raised as ValueError on the client
+STATUS_ERROR = 2
+
+BNS_REQUEST = struct.Struct('!HB')
+CRIME_REQUEST = struct.Struct('!iii')
+CRIME_RESPONSE = struct.Struct('!?i')
+
+# Ranges of the packed fields: requests outside them are refused with ValueError (a 400), not struct.error
+MAX_K = 0xFFFF
+INT32_MIN, INT32_MAX = -2 ** 31, 2 ** 31 - 1
+
+
+def recv_exact(sock, n):
+    buf = bytearray(n)
+    view = memoryview(buf)
+    received = 0
+    while received < n:
+        chunk = sock.recv_into(view[received:], n - received)
+        if not chunk:
+            raise ConnectionError('Inference socket closed')
+        received += chunk
+    return bytes(buf)
+
+
+def send_frame(sock, code, payload=b''):
+    sock.sendall(HEADER.pack(code, len(payload)) + payload)
+
+
+def recv_frame(sock):
+    """(op or status code, payload); None if the peer closed the connection between frames."""
+    first = sock.recv(1)
+    if not first:
+        return None
+    code, length = HEADER.unpack(first + recv_exact(sock, HEADER.size - 1))
+    if length > MAX_PAYLOAD:
+        raise ValueError(f'Frame of {length} bytes exceeds the {MAX_PAYLOAD} byte limit')
+    return code, recv_exact(sock, length) if length else b''
+
+
+def encode_json(obj):
+    return json.dumps(obj, separators=(',', ':')).encode('utf-8')
+
+
+def decode_json(payload):
+    return json.loads(payload.decode('utf-8'))
+
+
+def check_int32(name, value):
+    if not INT32_MIN <= value <= INT32_MAX:
+        raise ValueError(f'{name} must be between {INT32_MIN} and {INT32_MAX}')
+
+
+def pack_bns_request(query, k, mode):
+    if not isinstance(k, int) or not 1 <= k <= MAX_K:
+        raise ValueError(f'k must be an integer between 1 and {MAX_K}')
+    # Mode code 0 means "server default" (BNS_RETRIEVAL_MODE)
+    code = RETRIEVAL_MODES.index(mode) + 1 if mode else 0
+    return BNS_REQUEST.pack(k, code) + str(query).encode('utf-8')
+
+
+def pack_crime_request(ward, year, month):
+    for name, value in (('ward', ward), ('year', year), ('month', month)):
+        check_int32(name, value)
+    return CRIME_REQUEST.pack(ward, year, month)
+
+
+def unpack_bns_request(payload):
+    k, code = BNS_REQUEST.unpack_from(payload)
+    if code > len(RETRIEVAL_MODES):
+        raise ValueError(f'Unknown retrieval mode code {code}')
+    mode = RETRIEVAL_MODES[code - 1] if code else None
+    return payload[BNS_REQUEST.size:].decode('utf-8'), k, mode
@@ -0,0 +1,91 @@
+"""
+Inference sidecar: one process owns the ML models and serves every web
+worker on the box over a UNIX domain socket (see inference_protocol.py).
+
+    python inference_server.py [socket_path]
+    INFERENCE_SOCKET=/tmp/fir-inference.sock gunicorn -w 4 app:app
+
+Each worker connection gets its own handler thread; concurrent BNS queries
+from different workers are coalesced by the engine's BnsQueryBatcher.
+"""
+import os
+import socketserver
+import sys
+
+import numpy as np
+
+import inference_protocol as protocol
+
+
+class InferenceHandler(socketserver.BaseRequestHandler):
+    def handle(self):
+        # Workers keep their connection open, so serve frames until they hang up
+        while True:
+            try:
+                frame = protocol.recv_frame(self.request)
+            except (ConnectionError, ValueError) as e:
+                print(f"Inference connection dropped: {e}")
+                return
+            if frame is None:
+                return
+            op, payload = frame
+            try:
+                response = self.server.dispatch(op, payload)
+                status = protocol.STATUS_OK
+            except ValueError as e:
+                status, response = protocol.STATUS_BAD_REQUEST, str(e).encode('utf-8')
+            except Exception as e:
+                print(f"Inference error (op {op}): {e}")
+                status, response = protocol.STATUS_ERROR, str(e).encode('utf-8')
+            try:
+                protocol.send_frame(self.request, status, response)
+            except OSError:
+                return
+
+
+class InferenceServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path, engine):
+        self.engine = engine
+        if os.path.exists(socket_path):
+            os.unlink(socket_path) # stale socket from a previous run
+        super().__init__(socket_path, InferenceHandler)
+        os.chmod(socket_path, 0o660)
+
+    def dispatch(self, op, payload):
+        engine = self.engine
+        if op == protocol.OP_STATUS:
+            return protocol.encode_json(engine.status())
+        if op == protocol.OP_CACHE_STATS:
+            return protocol.encode_json(engine.cache_stats())
+        if op == protocol.OP_PREDICT_BNS:
+            query, k, mode = protocol.unpack_bns_request(payload)
+            return protocol.encode_json(engine.predict_bns(query, k=k, mode=mode))
+        if op == protocol.OP_PREDICT_CRIME:
+            prediction = engine.predict_crime(*protocol.CRIME_REQUEST.unpack(payload))
+            return protocol.CRIME_RESPONSE.pack(prediction is not None, prediction or 0)
+        if op == protocol.OP_PREDICT_CRIME_BATCH:
+            points = np.frombuffer(payload, dtype=np.intc)
+            if len(points) % 3:
+                raise ValueError('Crime batch payload must hold (ward, year, month) triples')
+            _, predictions = engine.predict_crime_batch(points=points.reshape(-1, 3))
+            if predictions is None:
+                raise RuntimeError('Crime model not available')
+            return predictions.astype(np.intc).tobytes()
+        raise ValueError(f'Unknown op {op}')
+
+
+if __name__ == '__main__':
+    from config import Config
+    from ml_engine import MLService
+
+    socket_path = sys.argv[1] if len(sys.argv) > 1 else Config.INFERENCE_SOCKET or '/tmp/fir-inference.sock'
+    server = InferenceServer(socket_path, MLService())
+    print(f"Inference server listening on {socket_path}")
+    try:
+        server.serve_forever()
+    finally:
+        server.server_close()
+        if os.path.exists(socket_path):
+            os.unlink(socket_path)
@@ -0,0 +1,307 @@
+"""
+Background jobs backed by the Mongo `jobs` collection.
+
+A job document:
+
+    {_id, type, payload, status: queued | running | done | failed,
+     attempts, max_attempts, run_at, lease_until, worker, last_error,
+     created_at, updated_at}
+
+Worker threads claim the oldest due job with an atomic find_one_and_update
+and hold it under a lease; a job whose worker died is re-claimed once the
+lease expires. Failures are retried with exponential backoff up to
+`max_attempts`; a handler raising RetryLater is polled again every
+JOB_RETRY_BASE_SECONDS without using up an attempt. Workers run inside the
+web process (JOB_WORKERS threads) or as a dedicated process:
+    python jobs.py
+"""
+import os
+import socket
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from pymongo import ReturnDocument
+from pymongo.errors import DuplicateKeyError
+
+import http_cache
+import monthly_rollups
+import notifications
+import station_stats
+import translation
+from config import Config
+
+JOB_QUEUED = 'queued'
+JOB_RUNNING = 'running'
+JOB_DONE = 'done'
+JOB_FAILED = 'failed'
+
+# FIR `ai_status` values the dashboard polls
+AI_PENDING = 'pending'
+AI_DONE = 'done'
+AI_FAILED = 'failed'
+
+HANDLERS = {}
+
+_wakeup = threading.Event()
+
+
+class RetryLater(Exception):
+    """Raised by a handler when a dependency isn't available yet; always retried."""
+
+
+def handler(job_type):
+    def register(func):
+        HANDLERS[job_type] = func
+        return func
+    return register
+
+
+def enqueue(db, job_type, payload, max_attempts=None, delay=0, job_id=None):
+    """Queue a job; with a `job_id`, queueing the same id twice is a no-op (returns None)."""
+    now = datetime.utcnow()
+    job = {
+        '_id': job_id or str(uuid.uuid4()),
+        'type': job_type,
+        'payload': payload,
+        'status': JOB_QUEUED,
+        'attempts': 0,
+        'max_attempts': max_attempts or Config.JOB_MAX_ATTEMPTS,
+        'run_at': now + timedelta(seconds=delay),
+        'lease_until': None,
+        'last_error': None,
+        'created_at': now,
+        'updated_at': now
+    }
+    try:
+        db.jobs.insert_one(job)
+    except DuplicateKeyError:
+        if job_id is None:
+            raise
+        return None
+    _wakeup.set() # in-process workers pick it up without waiting for the next poll
+    return job['_id']
+
+
+def claim_job(db, worker_id, lease_seconds=None):
+    """Atomically take the oldest due job (or one whose lease expired); None if there is none."""
+    now = datetime.utcnow()
+    lease = timedelta(seconds=lease_seconds or Config.JOB_LEASE_SECONDS)
+    return db.jobs.find_one_and_update(
+        {'$or': [
+            {'status': JOB_QUEUED, 'run_at': {'$lte': now}},
+            {'status': JOB_RUNNING, 'lease_until': {'$lt': now}}
+        ]},
+        {
+            '$set': {'status': JOB_RUNNING, 'lease_until': now + lease, 'worker': worker_id, 'updated_at': now},
+            '$inc': {'attempts': 1}
+        },
+        sort=[('run_at', 1)],
+        return_document=ReturnDocument.AFTER
+    )
+
+
+def run_job(db, job):
+    """Run a claimed job and record the outcome. Returns the job's new status."""
+    func = HANDLERS.get(job['type'])
+    try:
+        if func is None:
+            raise ValueError(f"No handler for job type '{job['type']}'")
+        func(db, job)
+    except Exception as e:
+        now = datetime.utcnow() # after the handler: backoff counts from the failure
+        retry_later = isinstance(e, RetryLater)
+        if func is not None and (retry_later or job['attempts'] < job['max_attempts']):
+            update = {'$set': {'status': JOB_QUEUED, 'lease_until': None, 'last_error': str(e), 'updated_at': now}}
+            if retry_later:
+                # Not an attempt: give the claim back and poll at a flat interval
+                delay = Config.JOB_RETRY_BASE_SECONDS
+                update['$inc'] = {'attempts': -1}
+            else:
+                delay = min(Config.JOB_RETRY_BASE_SECONDS * 2 ** (job['attempts'] - 1), Config.JOB_RETRY_MAX_SECONDS)
+            update['$set']['run_at'] = now + timedelta(seconds=delay)
+            db.jobs.update_one({'_id': job['_id'], 'worker': job.get('worker')}, update)
+            print(f"Job {job['_id']} ({job['type']}) attempt {job['attempts']} failed, retrying in {delay}s: {e}")
+            return JOB_QUEUED
+        db.jobs.update_one({'_id': job['_id'], 'worker': job.get('worker')}, {'$set': {
+            'status': JOB_FAILED, 'lease_until': None, 'last_error': str(e), 'updated_at': now
+        }})
+        print(f"Job {job['_id']} ({job['type']}) failed permanently: {e}")
+        on_failure = getattr(func, 'on_failure', None)
+        if on_failure:
+            on_failure(db, job, e)
+        return JOB_FAILED
+
+    db.jobs.update_one({'_id': job['_id'], 'worker': job.get('worker')}, {'$set': {
+        'status': JOB_DONE, 'lease_until': None, 'last_error': None, 'updated_at': datetime.utcnow()
+    }})
+    return JOB_DONE
+
+
+def run_pending(db, worker_id='inline', limit=None):
+    """Drain due jobs on the calling thread (tests and one-off maintenance)."""
+    count = 0
+    while limit is None or count < limit:
+        job = claim_job(db, worker_id)
+        if job is None:
+            break
+        run_job(db, job)
+        count += 1
+    return count
+
+
+class JobWorker(threading.Thread):
+    def __init__(self, db, name):
+        super().__init__(name=name, daemon=True)
+        self.db = db
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{name}"
+        self.stopping = threading.Event()
+
+    def run(self):
+        while not self.stopping.is_set():
+            try:
+                job = claim_job(self.db, self.worker_id)
+            except Exception as e:
+                print(f"Job worker {self.name} could not poll jobs: {e}")
+                job = None
+            if job is None:
+                _wakeup.wait(Config.JOB_POLL_INTERVAL)
+                _wakeup.clear()
+                continue
+            run_job(self.db, job)
+
+
+def start_workers(db, count=None):
+    count = Config.JOB_WORKERS if count is None else count
+    workers = [JobWorker(db, f'job-worker-{i}') for i in range(count)]
+    for worker in workers:
+        worker.start()
+    if workers:
+        print(f"Started {len(workers)} background job worker(s)")
+        # Off the startup path: an unreachable Mongo shouldn't hold up the web process
+        threading.Thread(target=_schedule_maintenance, args=(db,), name='job-schedule', daemon=True).start()
+    return workers
+
+
+def _schedule_maintenance(db):
+    try:
+        schedule_station_stats_rebuild(db)
+    except Exception as e:
+        print(f"Could not schedule maintenance jobs: {e}")
+
+
+# --- FIR AI suggestions ---
+
+FIR_AI_JOB = 'fir_ai'
+
+
+def translate_to_english(db, text, language):
+    """(English text, whether it was fully translated); see translation.to_english."""
+    return translation.to_english(text, language, db)
+
+
+def _find_fir(db, fir_id):
+    # The FIR may already have been resolved (moved to archives) by the time the job runs
+    for collection in (db.firs, db.archives):
+        fir = collection.find_one({'_id': fir_id}, {'original_text': 1, 'language': 1, 'user_id': 1, 'station_id': 1})
+        if fir:
+            return collection, fir
+    return None, None
+
+
+@handler(FIR_AI_JOB)
+def process_fir_ai(db, job):
+    """Translate an FIR and attach BNS section suggestions."""
+    from ml_service import ml_service
+
+    fir_id = job['payload']['fir_id']
+    collection, fir = _find_fir(db, fir_id)
+    if fir is None:
+        raise ValueError(f'FIR {fir_id} not found')
+
+    # Check the model first so a retry doesn't repeat the translation call
+    if not ml_service.is_ready('bns'):
+        state = ml_service.status()['state']
+        if state in ('loading', 'unavailable'):
+            raise RetryLater(f'BNS model not ready ({state})')
+        raise RuntimeError('BNS model not available')
+
+    original_text = fir.get('original_text') or ''
+    translated_text, translated = translate_to_english(db, original_text, fir.get('language', 'en'))
+    if not translated:
+        if job['attempts'] < job['max_attempts']:
+            raise RuntimeError('Translation unavailable')
+        # Out of retries: suggest from the original text rather than nothing
+        print(f"Translation failed for FIR {fir_id}, using original text")
+        translated_text = original_text
+
+    ai_suggestions = ml_service.predict_bns(translated_text, k=5) if translated_text else []
+
+    update = {'$set': {
+        'translated_text': translated_text,
+        'ai_suggestions': ai_suggestions,
+        'ai_status': AI_DONE,
+        'ai_error': None,
+        'ai_updated_at': datetime.utcnow()
+    }}
+    if collection.update_one({'_id': fir_id}, update).matched_count == 0 and collection.name == 'firs':
+        # Resolved while we were translating / predicting
+        if db.archives.update_one({'_id': fir_id}, update).matched_count == 0:
+            raise ValueError(f'FIR {fir_id} not found')
+    http_cache.touch(db, [fir])
+
+
+def _fir_ai_failed(db, job, error):
+    collection, fir = _find_fir(db, job['payload']['fir_id'])
+    if collection is not None:
+        collection.update_one({'_id': fir['_id']}, {'$set': {
+            'ai_status': AI_FAILED, 'ai_error': str(error), 'ai_updated_at': datetime.utcnow()
+        }})
+        http_cache.touch(db, [fir])
+
+
+process_fir_ai.on_failure = _fir_ai_failed
+
+
+# --- Station statistics ---
+
+STATION_STATS_JOB = 'station_stats_rebuild'
+
+
+def station_stats_job_id(when, hours=None):
+    """The id shared by every rebuild scheduled in the same STATION_STATS_REBUILD_HOURS slot as `when`."""
+    interval = (hours or Config.STATION_STATS_REBUILD_HOURS) * 3600
+    slot_start = datetime(1970, 1, 1) + timedelta(seconds=(when - datetime(1970, 1, 1)).total_seconds() // interval * interval)
+    return f"{STATION_STATS_JOB}:{slot_start.strftime('%Y-%m-%dT%H:%M')}"
+
+
+def schedule_station_stats_rebuild(db, when=None):
+    """Queue the rebuild for `when` (default: now); one job per rebuild interval however many processes ask."""
+    when = when or datetime.utcnow()
+    delay = max((when - datetime.utcnow()).total_seconds(), 0)
+    return enqueue(db, STATION_STATS_JOB, {}, delay=delay, job_id=station_stats_job_id(when))
+
+
+@handler(STATION_STATS_JOB)
+def rebuild_station_stats(db, job):
+    """Recompute station_stats, monthly_rollups and unread counters from scratch, then queue the next run."""
+    count = station_stats.rebuild(db)
+    rows = monthly_rollups.rebuild(db)
+    counters = notifications.reconcile(db)
+    print(f"Rebuilt station stats for {count} station(s), {rows} monthly rollup(s), {counters} unread counter(s)")
+    next_run = datetime.utcnow() + timedelta(hours=Config.STATION_STATS_REBUILD_HOURS)
+    schedule_station_stats_rebuild(db, next_run)
+
+
+if __name__ == '__main__':
+    from pymongo import MongoClient
+
+    db = MongoClient(Config.MONGO_URI).get_default_database()
+    workers = start_workers(db, max(Config.JOB_WORKERS, 1))
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        for worker in workers:
+            worker.stopping.set()
@@ -0,0 +1,196 @@
+"""
+BM25 inverted index over the BNS section texts.
+
+Complaint text often names exact legal terms ("dowry", "cheque",
+"stalking") that dense MiniLM embeddings of the long section descriptions
+rank poorly. This index is built at asset-generation time and stored next to
+the embeddings as compact CSR postings arrays:
+
+    lexical.vocab.json    terms, position = term id
+    lexical.offsets.npy   int64 (n_terms + 1) start of each term's postings
+    lexical.doc_ids.npy   int32 postings: section row ids, grouped by term
+    lexical.tfs.npy       uint16 postings: term frequency in that section
+    lexical.doc_len.npy   int32 token count of each section
+"""
+import json
+import os
+import re
+
+import numpy as np
+
+VOCAB_FILE = 'lexical.vocab.json'
+OFFSETS_FILE = 'lexical.offsets.npy'
+DOC_IDS_FILE = 'lexical.doc_ids.npy'
+TFS_FILE = 'lexical.tfs.npy'
+DOC_LEN_FILE = 'lexical.doc_len.npy'
+
+_TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+STOPWORDS = frozenset("""
+a about above after again against all also am an and any are as at be because been before being below
+between both but by can could did do does doing down during each few for from further had has have having
+he her here hers herself him himself his how i if in into is it its itself just me more most my myself no
+nor not now of off on once only or other our ours ourselves out over own same she should so some such than
+that the their theirs them themselves then there these they this those through to too under until up very
+was we were what when where which while who whom why will with would you your yours yourself yourselves
+shall may any such said section sections bns sanhita
+""".split())
+
+
+def _stem(token):
+    # Deliberately light: fold plurals so "cheques"/"cheque" and "injuries"/"injury" match
+    if len(token) > 4 and token.endswith('ies'):
+        return token[:-3] + 'y'
+    if len(token) > 3 and token.endswith('s') and not token.endswith('ss'):
+        return token[:-1]
+    return token
+
+
+def tokenize(text):
+    return [_stem(t) for t in _TOKEN_RE.findall(str(text or '').lower()) if t not in STOPWORDS]
+
+
+class LexicalIndex:
+    """Okapi BM25 over CSR postings arrays (which may be mmapped)."""
+
+    def __init__(self, vocab, offsets, doc_ids, tfs, doc_len, k1=1.2, b=0.75):
+        self.vocab = vocab if isinstance(vocab, dict) else {term: i for i, term in enumerate(vocab)}
+        self.offsets = offsets
+        self.doc_ids = doc_ids
+        self.tfs = tfs
+        self.doc_len = doc_len
+        self.k1 = k1
+        self.b = b
+        n_docs = len(doc_len)
+        df = np.diff(np.asarray(offsets)).astype(np.float32)
+        # Lucene-style idf, always positive
+        self.idf = np.log1p((n_docs - df + 0.5) / (df + 0.5)).astype(np.float32)
+        avgdl = float(np.mean(doc_len)) if n_docs else 1.0
+        self._norm = (k1 * (1 - b + b * np.asarray(doc_len, dtype=np.float32) / max(avgdl, 1e-9))).astype(np.float32)
+
+    @classmethod
+    def build(cls, texts, **params):
+        postings = {}
+        doc_len = np.zeros(len(texts), dtype=np.int32)
+        for doc_id, text in enumerate(texts):
+            tokens = tokenize(text)
+            doc_len[doc_id] = len(tokens)
+            counts = {}
+            for token in tokens:
+                counts[token] = counts.get(token, 0) + 1
+            for token, tf in counts.items():
+                postings.setdefault(token, []).append((doc_id, tf))
+
+        terms = sorted(postings)
+        offsets = np.zeros(len(terms) + 1, dtype=np.int64)
+        doc_ids, tfs = [], []
+        for term_id, term in enumerate(terms):
+            entries = postings[term]
+            doc_ids.extend(d for d, _ in entries)
+            tfs.extend(min(tf, 65535) for _, tf in entries)
+            offsets[term_id + 1] = offsets[term_id] + len(entries)
+        return cls(terms, offsets, np.asarray(doc_ids, dtype=np.int32),
+                   np.asarray(tfs, dtype=np.uint16), doc_len, **params)
+
+    def __len__(self):
+        return len(self.doc_len)
+
+    def scores(self, query):
+        """BM25 score of every section for `query` (float32 array, one entry per row)."""
+        scores = np.zeros(len(self.doc_len), dtype=np.float32)
+        for token in set(tokenize(query)):
+            term_id = self.vocab.get(token)
+            if term_id is None:
+                continue
+            start, end = self.offsets[term_id], self.offsets[term_id + 1]
+            docs = self.doc_ids[start:end]
+            tf = self.tfs[start:end].astype(np.float32)
+            scores[docs] += self.idf[term_id] * tf * (self.k1 + 1) / (tf + self._norm[docs])
+        return scores
+
+    def search(self, query, k):
+        """Top-k (scores, row ids) with a positive score, best first."""
+        scores = self.scores(query)
+        k = min(k, len(scores))
+        if k <= 0:
+            return np.zeros(0, dtype=np.float32), np.zeros(0, dtype=np.int64)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind='stable')]
+        top = top[scores[top] > 0]
+        return scores[top], top.astype(np.int64)
+
+    def save(self, directory, atomic_write):
+        terms = sorted(self.vocab, key=self.vocab.get)
+
+        def write_vocab(path):
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(terms, f)
+
+        def write_npy(array):
+            def writer(path):
+                with open(path, 'wb') as f:
+                    np.save(f, array)
+            return writer
+
+        atomic_write(os.path.join(directory, VOCAB_FILE), write_vocab)
+        atomic_write(os.path.join(directory, OFFSETS_FILE), write_npy(np.asarray(self.offsets)))
+        atomic_write(os.path.join(directory, DOC_IDS_FILE), write_npy(np.asarray(self.doc_ids)))
+        atomic_write(os.path.join(directory, TFS_FILE), write_npy(np.asarray(self.tfs)))
+        atomic_write(os.path.join(directory, DOC_LEN_FILE), write_npy(np.asarray(self.doc_len)))
+
+    @classmethod
+    def exists(cls, directory):
+        return os.path.exists(os.path.join(directory, VOCAB_FILE))
+
+    @classmethod
+    def open(cls, directory, mmap=True):
+        mode = 'r' if mmap else None
+        with open(os.path.join(directory, VOCAB_FILE), 'r', encoding='utf-8') as f:
+            terms = json.load(f)
+        return cls(
+            terms,
+            np.load(os.path.join(directory, OFFSETS_FILE), mmap_mode=mode),
+            np.load(os.path.join(directory, DOC_IDS_FILE), mmap_mode=mode),
+            np.load(os.path.join(directory, TFS_FILE), mmap_mode=mode),
+            np.load(os.path.join(directory, DOC_LEN_FILE), mmap_mode=mode),
+        )
+
+
+def is_strong_hit(scores, min_score, min_margin):
+    """
+    True when the best lexical match is both confident in absolute terms and
+    clearly ahead of the runner-up, so the dense pass can be skipped.
+    """
+    if not min_score or len(scores) == 0 or scores[0] < min_score:
+        return False
+    if len(scores) == 1:
+        return True
+    return scores[0] >= min_margin * max(float(scores[1]), 1e-9)
+
+
+def fuse(dense_ids, dense_distances, lexical_ids, lexical_scores, alpha=0.5):
+    """
+    Convex combination of min-max normalized dense similarity (weight
+    `alpha`) and BM25 score (weight 1 - alpha) over the union of both
+    candidate lists. Returns (row ids, fused scores), best first.
+    """
+    def normalized(values):
+        values = np.asarray(values, dtype=np.float32)
+        if len(values) == 0:
+            return values
+        span = float(values.max() - values.min())
+        return (values - values.min()) / span if span > 0 else np.ones_like(values)
+
+    dense_ids = [int(i) for i in dense_ids if i >= 0]
+    # Both metrics arrive as distances (lower is better); flip into similarities
+    dense_sim = normalized(-np.asarray(dense_distances[:len(dense_ids)], dtype=np.float32))
+    lexical_norm = normalized(lexical_scores)
+
+    fused = {}
+    for row, sim in zip(dense_ids, dense_sim):
+        fused[row] = alpha * float(sim)
+    for row, score in zip(lexical_ids, lexical_norm):
+        fused[int(row)] = fused.get(int(row), 0.0) + (1 - alpha) * float(score)
+
+    ranked = sorted(fused.items(), key=lambda item: item[1], reverse=True)
+    return [row for row, _ in ranked], [score for _, score in ranked]
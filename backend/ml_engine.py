@@ -0,0 +1,510 @@
+"""
+In-process ML engine: loads the crime model/cube and the BNS search assets
+and serves predictions. Routes reach it through `ml_service` (see
+ml_service.py), either directly or via the inference sidecar.
+"""
+
+import os
+import pickle
+import queue
+import threading
+import time
+import numpy as np
+import pandas as pd
+import faiss
+
+import bns_assets
+import encoders
+import lexical
+from cache import LRUCache
+from crime_cube import CRIME_FEATURES, CrimeCube, crime_grid, crime_points
+from config import Config
+from inference_protocol import RETRIEVAL_MODES
+
+
+def normalize_query(text):
+    """Canonical cache key for a query: MiniLM is uncased, so case and spacing don't matter."""
+    return ' '.join(str(text).split()).casefold()
+
+
+class _PendingQuery:
+    """A single predict_bns call waiting for its batch to be processed."""
+    __slots__ = ('query', 'k', 'done', 'results', 'error')
+
+    def __init__(self, query, k):
+        self.query = query
+        self.k = k
+        self.done = threading.Event()
+        self.results = None
+        self.error = None
+
+
+class BnsQueryBatcher:
+    """
+    Coalesces concurrent BNS queries into a single encode + FAISS search.
+
+    Callers block in submit() while a background thread collects queries for
+    up to `window_ms` (or until `max_batch` queries are waiting), hands them
+    to `run_batch` in one go and routes each caller's results back to it.
+    """
+
+    def __init__(self, run_batch, window_ms=5, max_batch=16):
+        self._run_batch = run_batch
+        self._window = max(window_ms, 0) / 1000.0
+        self._max_batch = max(int(max_batch), 1)
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._worker, name='bns-batcher', daemon=True)
+        self._thread.start()
+
+    def submit(self, query, k):
+        pending = _PendingQuery(query, k)
+        self._queue.put(pending)
+        pending.done.wait()
+        if pending.error is not None:
+            raise pending.error
+        return pending.results
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self._window
+        while len(batch) < self._max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                if remaining <= 0:
+                    # Window closed: still take whatever is already queued
+                    batch.append(self._queue.get_nowait())
+                else:
+                    batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _worker(self):
+        while True:
+            batch = self._collect()
+            try:
+                results = self._run_batch([p.query for p in batch], [p.k for p in batch])
+                for pending, result in zip(batch, results):
+                    pending.results = result
+            except Exception as e:
+                for pending in batch:
+                    pending.error = e
+            finally:
+                for pending in batch:
+                    pending.done.set()
+
+
+# Readiness states reported by MLService.status()
+STATE_LOADING = 'loading'   # models are still being loaded / warmed up
+STATE_READY = 'ready'       # crime model and BNS search both available
+STATE_DEGRADED = 'degraded' # only one of them loaded (or warm-up failed)
+STATE_FAILED = 'failed'     # nothing usable loaded
+
+
+class MLService:
+    _instance = None
+    
+    def __new__(cls):
+        if cls._instance is None:
+            cls._instance = super(MLService, cls).__new__(cls)
+            cls._instance.initialized = False
+        return cls._instance
+    
+    def __init__(self):
+        if self.initialized:
+            return
+        self.initialized = True
+        self.crime_model = None
+        self.crime_cube = None # crime_cube.CrimeCube; the model is then only loaded on a cube miss
+        self._crime_model_loaded = False
+        self._crime_model_lock = threading.Lock()
+        self.bns_sections = None # bns_assets.SectionTable, row i <-> FAISS id i
+        self.bns_records = () # precomputed JSON-ready section records, same ids
+        self.bns_index = None
+        self.bns_embeddings = None # float32 matrix (mmapped when using the asset directory)
+        self.bns_lexical = None # lexical.LexicalIndex (BM25) over the same rows
+        self.bns_model = None # query encoder, see encoders.py (torch / int8 / ONNX)
+        self.use_mock = False
+        self._bns_batcher = None
+        self.bns_metric = 'l2' # 'ip' indexes hold L2-normalized vectors
+        self.bns_assets_version = None
+        self._bns_assets_signature_seen = None
+        self._bns_assets_checked_at = 0.0
+        self._bns_reload_lock = threading.Lock()
+        # Two-level cache: normalized query -> embedding, and
+        # (normalized query, k, assets version) -> final result list
+        ttl = Config.BNS_CACHE_TTL or None
+        self._embedding_cache = LRUCache(Config.BNS_EMBEDDING_CACHE_SIZE, ttl=ttl)
+        self._result_cache = LRUCache(Config.BNS_RESULT_CACHE_SIZE, ttl=ttl)
+        if Config.BNS_BATCH_WINDOW_MS > 0 and Config.BNS_BATCH_MAX_SIZE > 1:
+            self._bns_batcher = BnsQueryBatcher(
+                self._search_bns_batch,
+                window_ms=Config.BNS_BATCH_WINDOW_MS,
+                max_batch=Config.BNS_BATCH_MAX_SIZE
+            )
+
+        self.state = STATE_LOADING
+        self.load_error = None
+        self.load_seconds = None
+        self._loaded = threading.Event()
+        if Config.ML_BACKGROUND_LOAD:
+            # Don't block worker startup: auth and FIR CRUD can be served while
+            # the models load, ML endpoints answer 503 until we're ready.
+            threading.Thread(target=self._load_and_warm_up, name='ml-loader', daemon=True).start()
+        else:
+            self._load_and_warm_up()
+
+    def _load_and_warm_up(self):
+        started = time.monotonic()
+        try:
+            self._load_models()
+            warm_ok = self._warm_up() if Config.ML_WARMUP else True
+            crime_ok = self.is_ready('crime')
+            bns_ok = self.is_ready('bns')
+            if crime_ok and bns_ok and warm_ok:
+                self.state = STATE_READY
+            elif crime_ok or bns_ok:
+                self.state = STATE_DEGRADED
+            else:
+                self.state = STATE_FAILED
+        except Exception as e:
+            print(f"Error loading ML models: {e}")
+            self.load_error = str(e)
+            self.state = STATE_FAILED
+        finally:
+            self.load_seconds = round(time.monotonic() - started, 2)
+            self._loaded.set()
+            print(f"ML service {self.state} after {self.load_seconds}s")
+
+    def _warm_up(self):
+        """Run one inference per model so the first real request doesn't pay lazy-init costs."""
+        ok = True
+        if self.is_ready('bns'):
+            try:
+                # Straight to the batch path so the warm-up query isn't cached as a result
+                self._predict_bns_batch(['warm up query for section search'], [1])
+            except Exception as e:
+                print(f"BNS warm-up failed: {e}")
+                self.load_error = f"BNS warm-up failed: {e}"
+                ok = False
+        # Warm up inside the cube when there is one, so warm-up alone doesn't pull in scikit-learn
+        ward, year = (self.crime_cube.wards[0], self.crime_cube.year_start) if self.crime_cube else (1, 2024)
+        if self.is_ready('crime') and self.predict_crime(ward, year, 1) is None:
+            self.load_error = 'Crime model warm-up failed'
+            ok = False
+        return ok
+
+    def is_ready(self, feature=None):
+        """True if `feature` ('bns' or 'crime') can serve requests; with no feature, if anything can."""
+        if feature == 'bns':
+            return self.bns_index is not None and self.bns_model is not None and self.bns_sections is not None
+        if feature == 'crime':
+            return self.crime_cube is not None or self.crime_model is not None
+        return self.state in (STATE_READY, STATE_DEGRADED)
+
+    def wait_until_loaded(self, timeout=None):
+        return self._loaded.wait(timeout)
+
+    def status(self):
+        return {
+            'state': self.state,
+            'bns': self.is_ready('bns'),
+            'crime': self.is_ready('crime'),
+            'error': self.load_error,
+            'load_seconds': self.load_seconds
+        }
+
+    def _load_models(self):
+        print("Loading ML Models...")
+        
+        # Load the precomputed crime forecast cube; the RandomForest itself
+        # is only unpickled (lazily) for inputs outside the cube
+        try:
+            if CrimeCube.exists(Config.CRIME_CUBE_PATH):
+                self.crime_cube = CrimeCube.open(Config.CRIME_CUBE_PATH)
+                print(f"Crime forecast cube loaded ({len(self.crime_cube.wards)} wards, "
+                      f"{self.crime_cube.year_start}-{self.crime_cube.year_end}).")
+        except Exception as e:
+            print(f"Error loading crime forecast cube: {e}")
+            self.load_error = f"Crime cube: {e}"
+
+        # Load Crime Model
+        if self.crime_cube is None:
+            self._load_crime_model()
+
+        # Load BNS Assets
+        try:
+            if self._load_bns_assets():
+                # Load the query encoder (backend selected by BNS_ENCODER_BACKEND)
+                print(f"Loading {Config.BNS_ENCODER_BACKEND} encoder ({Config.BNS_ENCODER_MODEL}) for query encoding...")
+                encoder = encoders.load_encoder(
+                    Config.BNS_ENCODER_BACKEND,
+                    Config.BNS_ENCODER_MODEL,
+                    onnx_dir=Config.BNS_ONNX_DIR,
+                    num_threads=Config.BNS_ENCODER_THREADS
+                )
+                if encoder.dimension != self.bns_index.d:
+                    raise ValueError(f"Encoder dimension {encoder.dimension} does not match BNS index dimension {self.bns_index.d}")
+                self.bns_model = encoder
+                print("BNS system loaded successfully.")
+        except Exception as e:
+            print(f"Error loading BNS assets: {e}")
+            self.load_error = f"BNS: {e}"
+
+    @staticmethod
+    def _bns_assets_source():
+        """Prefer the mmap asset directory, falling back to the legacy pickle."""
+        if bns_assets.has_assets(Config.BNS_ASSETS_DIR):
+            return bns_assets.manifest_path(Config.BNS_ASSETS_DIR)
+        if os.path.exists(Config.BNS_ASSETS_PATH):
+            return Config.BNS_ASSETS_PATH
+        return None
+
+    @classmethod
+    def _bns_assets_signature(cls):
+        source = cls._bns_assets_source()
+        if source is None:
+            return None
+        st = os.stat(source)
+        return f"{source}:{st.st_mtime_ns:x}-{st.st_size:x}"
+
+    def _load_crime_model(self):
+        with self._crime_model_lock:
+            if self._crime_model_loaded:
+                return self.crime_model
+            self._crime_model_loaded = True
+            try:
+                if os.path.exists(Config.CRIME_MODEL_PATH):
+                    with open(Config.CRIME_MODEL_PATH, 'rb') as f:
+                        self.crime_model = pickle.load(f)
+                    print("Crime model loaded successfully.")
+                else:
+                    print(f"Warning: Crime model not found at {Config.CRIME_MODEL_PATH}")
+                    self.use_mock = True # Or just for that specific feature
+            except Exception as e:
+                print(f"Error loading crime model: {e}")
+                self.load_error = f"Crime model: {e}"
+                self.use_mock = True
+            return self.crime_model
+
+    def _load_bns_assets(self):
+        """(Re)load the BNS section table and FAISS index; returns False if the assets are missing."""
+        signature = self._bns_assets_signature()
+        if signature is None:
+            print(f"Warning: BNS assets not found at {Config.BNS_ASSETS_DIR} or {Config.BNS_ASSETS_PATH}")
+            return False
+
+        if bns_assets.has_assets(Config.BNS_ASSETS_DIR):
+            assets = bns_assets.load_bns_assets(Config.BNS_ASSETS_DIR)
+            sections, index, version = assets.sections, assets.index, assets.version
+            embeddings, lexical_index = assets.embeddings, assets.lexical
+            metric = assets.manifest['metric']
+            bns_assets.apply_search_params(index, nprobe=Config.BNS_IVF_NPROBE, ef_search=Config.BNS_HNSW_EF_SEARCH)
+            print(f"BNS index: {assets.manifest['index_type']}/{metric}, {index.ntotal} vectors")
+        else:
+            print("Loading legacy BNS pickle; run `python bns_assets.py convert` to switch to the mmap format.")
+            df, embeddings = bns_assets.load_legacy_pickle(Config.BNS_ASSETS_PATH)
+            sections = bns_assets.SectionTable.from_dataframe(df)
+            index = bns_assets.build_index(embeddings, 'flat', 'l2')
+            lexical_index = None
+            version = signature
+            metric = 'l2'
+        if lexical_index is None:
+            lexical_index = bns_assets.build_lexical_index(sections)
+
+        self.bns_sections = sections
+        self.bns_records = bns_assets.section_records(sections)
+        self.bns_index = index
+        self.bns_embeddings = np.asarray(embeddings, dtype=np.float32)
+        self.bns_lexical = lexical_index
+        self.bns_metric = metric
+        self.bns_assets_version = version
+        self._bns_assets_signature_seen = signature
+        # Embeddings are only valid for the encoder, results for these assets
+        self._result_cache.clear()
+        self._bns_assets_checked_at = time.monotonic()
+        return True
+
+    def _refresh_bns_assets(self):
+        """Reload the assets (dropping cached results) if the file on disk changed."""
+        interval = Config.BNS_ASSETS_CHECK_INTERVAL
+        if interval <= 0 or time.monotonic() - self._bns_assets_checked_at < interval:
+            return
+        with self._bns_reload_lock:
+            if time.monotonic() - self._bns_assets_checked_at < interval:
+                return
+            self._bns_assets_checked_at = time.monotonic()
+            signature = self._bns_assets_signature()
+            if signature is not None and signature != self._bns_assets_signature_seen:
+                print("BNS assets changed on disk, reloading...")
+                try:
+                    self._load_bns_assets()
+                except Exception as e:
+                    print(f"Error reloading BNS assets: {e}")
+
+    def cache_stats(self):
+        return {
+            'assets_version': self.bns_assets_version,
+            'embeddings': self._embedding_cache.stats(),
+            'results': self._result_cache.stats()
+        }
+
+    def predict_crime(self, ward, year, month):
+        if self.crime_cube is not None:
+            prediction = self.crime_cube.lookup(ward, year, month)
+            if prediction is not None:
+                return prediction
+        crime_model = self.crime_model or self._load_crime_model()
+        if crime_model:
+            try:
+                # Expecting input as DataFrame with correct columns
+                input_data = pd.DataFrame([[ward, year, month]], columns=CRIME_FEATURES)
+                prediction = crime_model.predict(input_data)[0]
+                return round(prediction)
+            except Exception as e:
+                print(f"Prediction error: {e}")
+                return None
+        return None
+
+    def predict_crime_batch(self, wards=None, years=None, months=None, points=None):
+        """
+        Forecasts for many (ward, year, month) inputs in one model call.
+
+        Pass either the `wards` x `years` x `months` grid or an explicit list
+        of (ward, year, month) `points`. Returns (inputs, predictions): an
+        (n, 3) int matrix and the n rounded forecasts in the same order.
+        """
+        if points is not None:
+            inputs = crime_points(points, max_rows=Config.CRIME_BATCH_MAX_ROWS)
+        else:
+            inputs = crime_grid(wards, years, months, max_rows=Config.CRIME_BATCH_MAX_ROWS)
+        if not self.is_ready('crime'):
+            return inputs, None
+
+        if self.crime_cube is not None:
+            predictions, hit = self.crime_cube.lookup_many(inputs)
+        else:
+            predictions, hit = np.zeros(len(inputs), dtype=np.int64), np.zeros(len(inputs), dtype=bool)
+        misses = ~hit
+        if misses.any():
+            crime_model = self.crime_model or self._load_crime_model()
+            if not crime_model:
+                raise ValueError(f"{int(misses.sum())} inputs are outside the precomputed forecast range")
+            # The model was fitted on a named DataFrame; wrapping the whole matrix
+            # once keeps sklearn's feature-name check happy at no per-row cost.
+            features = pd.DataFrame(inputs[misses], columns=CRIME_FEATURES, copy=False)
+            predictions[misses] = np.rint(crime_model.predict(features)).astype(np.int64)
+        return inputs, predictions
+
+    def predict_bns(self, query, k=5, mode=None):
+        """
+        Top-k BNS sections for `query`. `mode` (default BNS_RETRIEVAL_MODE):
+        'dense' = FAISS over sentence embeddings, 'lexical' = BM25 only,
+        'hybrid' = fusion of both; a strong lexical hit skips the encoder.
+        """
+        mode = (mode or Config.BNS_RETRIEVAL_MODE).lower()
+        if mode not in RETRIEVAL_MODES:
+            raise ValueError(f"Unknown retrieval mode '{mode}', expected one of {RETRIEVAL_MODES}")
+        if self.is_ready('bns'):
+            try:
+                self._refresh_bns_assets()
+                key = (normalize_query(query), k, mode, self.bns_assets_version)
+                cached = self._result_cache.get(key)
+                if cached is not None:
+                    return [dict(r) for r in cached]
+
+                if mode == 'dense' or self.bns_lexical is None:
+                    distances, indices, _ = self._dense_search(query, k)
+                    results = self._format_bns_hits(indices, distances=distances)
+                else:
+                    results = self._predict_bns_lexical(query, k, hybrid=mode == 'hybrid')
+                self._result_cache.set(key, results)
+                return [dict(r) for r in results]
+            except Exception as e:
+                print(f"BNS Prediction error: {e}")
+                return []
+        return []
+
+    def _predict_bns_lexical(self, query, k, hybrid=True):
+        n_candidates = max(k, k * Config.BNS_HYBRID_CANDIDATES)
+        lex_scores, lex_ids = self.bns_lexical.search(query, n_candidates if hybrid else k)
+        if not hybrid or lexical.is_strong_hit(lex_scores, Config.BNS_LEXICAL_FASTPATH_SCORE,
+                                               Config.BNS_LEXICAL_FASTPATH_MARGIN):
+            # Lexical-only answer: no transformer forward pass at all
+            return self._format_bns_hits(lex_ids[:k], scores=lex_scores[:k])
+
+        distances, indices, query_vec = self._dense_search(query, n_candidates)
+        fused_ids, fused_scores = lexical.fuse(indices, distances, lex_ids, lex_scores,
+                                               alpha=Config.BNS_HYBRID_ALPHA)
+        fused_ids = fused_ids[:k]
+        return self._format_bns_hits(fused_ids, distances=self._distances_to(query_vec, fused_ids),
+                                     scores=fused_scores[:k])
+
+    def _dense_search(self, query, k):
+        """(distances, ids, query vector) for one query, batched with concurrent callers."""
+        if self._bns_batcher:
+            return self._bns_batcher.submit(query, k)
+        return self._search_bns_batch([query], [k])[0]
+
+    def _distances_to(self, query_vec, ids):
+        """Exact distance from the query to the given rows, in the index's metric."""
+        vectors = self.bns_embeddings[np.asarray(ids, dtype=np.int64)]
+        if self.bns_metric == 'ip':
+            q = query_vec / max(float(np.linalg.norm(query_vec)), 1e-12)
+            v = vectors / np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12, None)
+            return 1.0 - v @ q
+        return ((vectors - query_vec) ** 2).sum(axis=1)
+
+    def _encode_queries(self, queries):
+        """Embed queries, running the encoder only for texts not already cached."""
+        keys = [normalize_query(q) for q in queries]
+        vecs = [self._embedding_cache.get(key) for key in keys]
+        missing = {}
+        for key, query, vec in zip(keys, queries, vecs):
+            if vec is None and key not in missing:
+                missing[key] = query
+        if missing:
+            encoded = self.bns_model.encode(list(missing.values())).astype(np.float32)
+            fresh = dict(zip(missing.keys(), encoded))
+            for key, vec in fresh.items():
+                self._embedding_cache.set(key, vec)
+            vecs = [vec if vec is not None else fresh[key] for key, vec in zip(keys, vecs)]
+        return np.vstack(vecs).astype(np.float32, copy=False)
+
+    def _search_bns_batch(self, queries, ks):
+        """Encode all queries in one pass and run a single FAISS search over them."""
+        query_vecs = self._encode_queries(queries)
+        search_vecs = query_vecs
+        if self.bns_metric == 'ip':
+            search_vecs = query_vecs.copy()
+            faiss.normalize_L2(search_vecs)
+        distances, indices = self.bns_index.search(search_vecs, max(ks))
+        if self.bns_metric == 'ip':
+            # Report cosine distance so 'distance' stays lower-is-better for clients
+            distances = 1.0 - distances
+        return [
+            (distances[row][:k], indices[row][:k], query_vecs[row])
+            for row, k in enumerate(ks)
+        ]
+
+    def _predict_bns_batch(self, queries, ks):
+        """Dense top-k results for several queries at once."""
+        return [
+            self._format_bns_hits(indices, distances=distances)
+            for distances, indices, _ in self._search_bns_batch(queries, ks)
+        ]
+
+    def _format_bns_hits(self, indices, distances=None, scores=None):
+        records = self.bns_records
+        results = []
+        for i, idx in enumerate(indices):
+            # FAISS pads with -1 when fewer than k vectors are available
+            if 0 <= idx < len(records):
+                result = dict(records[idx])
+                # Lexical fast-path hits have no dense distance
+                result['distance'] = float(distances[i]) if distances is not None else None
+                if scores is not None:
+                    result['score'] = round(float(scores[i]), 6)
+                result['rank'] = i + 1
+                results.append(result)
+        return results
@@ -1,116 +1,141 @@
+"""
+The `ml_service` the routes use.
 
-import os
-import pickle
-import numpy as np
-import pandas as pd
-from sentence_transformers import SentenceTransformer
-import faiss
+By default it is the in-process engine (ml_engine.MLService), so every
+gunicorn worker loads its own copy of the models. With INFERENCE_SOCKET set
+it is a thin client for the inference sidecar (inference_server.py): one
+process on the box owns the models and web workers import no ML libraries.
+"""
+import socket
+import threading
+import time
 
+import inference_protocol as protocol
 from config import Config
+from inference_protocol import RETRIEVAL_MODES
 
-class MLService:
-    _instance = None
-    
-    def __new__(cls):
-        if cls._instance is None:
-            cls._instance = super(MLService, cls).__new__(cls)
-            cls._instance.initialized = False
-        return cls._instance
-    
-    def __init__(self):
-        if self.initialized:
-            return
-        self.initialized = True
-        self.crime_model = None
-        self.bns_df = None
-        self.bns_index = None
-        self.bns_model = None # SentenceTransformer model for encoding queries
-        self.use_mock = False
-        self._load_models()
-        
-    def _load_models(self):
-        print("Loading ML Models...")
-        
-        # Load Crime Model
+
+class RemoteMLService:
+    """Same interface as ml_engine.MLService, answered by the inference sidecar."""
+
+    def __init__(self, socket_path, timeout=30.0, status_ttl=1.0):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self.status_ttl = status_ttl
+        self._local = threading.local() # one persistent connection per worker thread
+        self._status = None
+        self._status_at = 0.0
+
+    def _connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(self.timeout)
+        sock.connect(self.socket_path)
+        return sock
+
+    def _close(self):
+        sock = getattr(self._local, 'sock', None)
+        self._local.sock = None
+        if sock is not None:
+            try:
+                sock.close()
+            except OSError:
+                pass
+
+    def _call(self, op, payload=b''):
+        # A kept-alive connection may have been dropped by a sidecar restart
+        # between requests: retry once on a fresh one (but never after a timeout)
+        for attempt in range(2):
+            reused = getattr(self._local, 'sock', None) is not None
+            try:
+                if not reused:
+                    self._local.sock = self._connect()
+                protocol.send_frame(self._local.sock, op, payload)
+                frame = protocol.recv_frame(self._local.sock)
+                if frame is None:
+                    raise ConnectionError('Inference server closed the connection')
+                break
+            except (OSError, ConnectionError) as e:
+                self._close()
+                if attempt or not reused or isinstance(e, TimeoutError):
+                    raise
+        status, body = frame
+        if status == protocol.STATUS_BAD_REQUEST:
+            raise ValueError(body.decode('utf-8'))
+        if status != protocol.STATUS_OK:
+            raise RuntimeError(f"Inference server error: {body.decode('utf-8')}")
+        return body
+
+    def status(self):
+        now = time.monotonic()
+        if self._status is not None and now - self._status_at < self.status_ttl:
+            return self._status
         try:
-            if os.path.exists(Config.CRIME_MODEL_PATH):
-                with open(Config.CRIME_MODEL_PATH, 'rb') as f:
-                    self.crime_model = pickle.load(f)
-                print("Crime model loaded successfully.")
-            else:
-                print(f"Warning: Crime model not found at {Config.CRIME_MODEL_PATH}")
-                self.use_mock = True # Or just for that specific feature
-        except Exception as e:
-            print(f"Error loading crime model: {e}")
-            self.use_mock = True
-
-        # Load BNS Assets
+            status = protocol.decode_json(self._call(protocol.OP_STATUS))
+        except (OSError, ConnectionError, RuntimeError) as e:
+            status = {'state': 'unavailable', 'bns': False, 'crime': False,
+                      'error': f'Inference server unreachable: {e}', 'load_seconds': None}
+        status['remote'] = self.socket_path
+        self._status, self._status_at = status, now
+        return status
+
+    def is_ready(self, feature=None):
+        status = self.status()
+        if feature in ('bns', 'crime'):
+            return bool(status.get(feature))
+        return status['state'] in ('ready', 'degraded')
+
+    def cache_stats(self):
         try:
-            if os.path.exists(Config.BNS_ASSETS_PATH):
-                with open(Config.BNS_ASSETS_PATH, 'rb') as f:
-                    assets = pickle.load(f)
-                    self.bns_df = assets['df']
-                    embeddings = assets['embeddings']
-                    
-                    # Build FAISS index
-                    dimension = embeddings.shape[1]
-                    self.bns_index = faiss.IndexFlatL2(dimension)
-                    self.bns_index.add(embeddings.astype(np.float32))
-                    
-                    # Load SentenceTransformer for query encoding
-                    # We load it here to avoid reloading if possible, but for query we need it.
-                    # Ideally we should save the model too or use a singleton for it.
-                    # Since it's large, we'll load it.
-                    print("Loading Sentence-BERT for query encoding...")
-                    self.bns_model = SentenceTransformer('all-MiniLM-L6-v2') 
-                    print("BNS system loaded successfully.")
-            else:
-                print(f"Warning: BNS assets not found at {Config.BNS_ASSETS_PATH}")
-        except Exception as e:
-            print(f"Error loading BNS assets: {e}")
+            return protocol.decode_json(self._call(protocol.OP_CACHE_STATS))
+        except (OSError, ConnectionError, RuntimeError):
+            return {}
+
+    def predict_bns(self, query, k=5, mode=None):
+        if mode and mode.lower() not in RETRIEVAL_MODES:
+            raise ValueError(f"Unknown retrieval mode '{mode}', expected one of {RETRIEVAL_MODES}")
+        try:
+            body = self._call(protocol.OP_PREDICT_BNS, protocol.pack_bns_request(query, k, mode and mode.lower()))
+            return protocol.decode_json(body)
+        except (OSError, ConnectionError, RuntimeError) as e:
+            print(f"BNS Prediction error: {e}")
+            return []
 
     def predict_crime(self, ward, year, month):
-        if self.crime_model:
-            try:
-                # Expecting input as DataFrame with correct columns
-                input_data = pd.DataFrame([[ward, year, month]], columns=['Ward', 'Year', 'Month'])
-                prediction = self.crime_model.predict(input_data)[0]
-                return round(prediction)
-            except Exception as e:
-                print(f"Prediction error: {e}")
-                return None
-        return None
-
-    def predict_bns(self, query, k=5):
-        if self.bns_index and self.bns_model and self.bns_df is not None:
-            try:
-                query_vec = self.bns_model.encode([query]).astype(np.float32)
-                distances, indices = self.bns_index.search(query_vec, k)
-                
-                results = []
-                for i, idx in enumerate(indices[0]):
-                    if idx < len(self.bns_df):
-                        item = self.bns_df.iloc[idx]
-                        # Convert to dict and handle NaN
-                        item_dict = item.to_dict()
-                        # Clean up NaN values for JSON
-                        clean_dict = {k: (v if pd.notna(v) else None) for k, v in item_dict.items()}
-                        
-                        result = clean_dict
-                        result['distance'] = float(distances[0][i])
-                        result['rank'] = i + 1
-                        # Ensure core fields exist for frontend
-                        if 'section' not in result and 'Section' in result:
-                            result['section'] = result['Section']
-                        if 'description' not in result and 'Description' in result:
-                            result['description'] = result['Description']
-                            
-                        results.append(result)
-                return results
-            except Exception as e:
-                print(f"BNS Prediction error: {e}")
-                return []
-        return []
+        try:
+            body = self._call(protocol.OP_PREDICT_CRIME, protocol.pack_crime_request(ward, year, month))
+        except (OSError, ConnectionError, RuntimeError) as e:
+            print(f"Prediction error: {e}")
+            return None
+        found, prediction = protocol.CRIME_RESPONSE.unpack(body)
+        return prediction if found else None
+
+    def predict_crime_batch(self, wards=None, years=None, months=None, points=None):
+        # numpy is only needed for batch grids; plain requests stay import-free
+        import numpy as np
+        from crime_cube import crime_grid, crime_points
+
+        if points is not None:
+            inputs = crime_points(points, max_rows=Config.CRIME_BATCH_MAX_ROWS)
+        else:
+            inputs = crime_grid(wards, years, months, max_rows=Config.CRIME_BATCH_MAX_ROWS)
+        # C ints on the wire: out-of-range values would silently wrap around
+        if len(inputs) and (inputs.min() < protocol.INT32_MIN or inputs.max() > protocol.INT32_MAX):
+            raise ValueError(f'ward, year and month must be between {protocol.INT32_MIN} and {protocol.INT32_MAX}')
+        try:
+            body = self._call(protocol.OP_PREDICT_CRIME_BATCH, inputs.astype(np.intc).tobytes())
+        except (OSError, ConnectionError, RuntimeError) as e:
+            print(f"Prediction error: {e}")
+            return inputs, None
+        return inputs, np.frombuffer(body, dtype=np.intc).astype(np.int64)
+
+
+def create_ml_service():
+    if Config.INFERENCE_SOCKET:
+        print(f"Using inference server at {Config.INFERENCE_SOCKET}")
+        return RemoteMLService(Config.INFERENCE_SOCKET, timeout=Config.INFERENCE_TIMEOUT)
+    from ml_engine import MLService
+    return MLService()
+
 
 # Singleton instance
-ml_service = MLService()
+ml_service = create_ml_service()
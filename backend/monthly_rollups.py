@@ -0,0 +1,164 @@
+"""
+Materialized monthly FIR rollups in the `monthly_rollups` collection.
+
+One small document per (station, calendar month, UTC):
+
+    {_id: '<station_id>:YYYY-MM', station_id, year, month, period: 'YYYY-MM',
+     submitted: n,               # FIRs filed that month
+     archived: {<status>: n},    # FIRs archived that month, by final status
+     updated_at}
+
+Rows are $inc'ed when an FIR is filed and when it is archived (fir_routes.py)
+and recomputed by rebuild() in the daily station-stats job. Range reads are
+one indexed query on (station_id, period); months without a row read as 0.
+"""
+import re
+from datetime import datetime
+
+from station_stats import status_key
+
+MAX_RANGE_MONTHS = 120
+
+
+def period(year, month):
+    return f'{year:04d}-{month:02d}'
+
+
+def parse_period(value, name='period'):
+    """(year, month) from 'YYYY-MM'; ValueError if malformed."""
+    match = re.fullmatch(r'(\d{4})-(\d{2})', value or '')
+    if not match or not 1 <= int(match.group(2)) <= 12:
+        raise ValueError(f'{name} must be YYYY-MM')
+    return int(match.group(1)), int(match.group(2))
+
+
+def month_index(year, month):
+    return year * 12 + month - 1
+
+
+def from_index(index):
+    year, month = divmod(index, 12)
+    return year, month + 1
+
+
+def _inc(db, station_id, date, counters):
+    if not station_id or date is None:
+        return
+    try:
+        db.monthly_rollups.update_one(
+            {'_id': f'{station_id}:{period(date.year, date.month)}'},
+            {
+                '$inc': counters,
+                '$set': {'updated_at': datetime.utcnow()},
+                '$setOnInsert': {'station_id': station_id, 'year': date.year, 'month': date.month,
+                                 'period': period(date.year, date.month)}
+            },
+            upsert=True
+        )
+    except Exception as e:
+        print(f"Could not update monthly rollup for {station_id}: {e}")
+
+
+def record_submitted(db, fir):
+    _inc(db, fir.get('station_id'), fir.get('submission_date'), {'submitted': 1})
+
+
+def record_archived(db, fir, status, archived_at):
+    record_archived_many(db, [(fir, status)], archived_at)
+
+
+def record_archived_many(db, archived, archived_at):
+    """[(fir, final status)] archived at the same time; one $inc per station."""
+    by_station = {}
+    for fir, status in archived:
+        counters = by_station.setdefault(fir.get('station_id'), {})
+        field = f'archived.{status_key(status)}'
+        counters[field] = counters.get(field, 0) + 1
+    for station_id, counters in by_station.items():
+        _inc(db, station_id, archived_at, counters)
+
+
+def months_range(db, station_id, start, end):
+    """
+    Rows for every month from `start` to `end` inclusive, each (year, month),
+    oldest first and zero-filled: [{year, month, period, submitted, archived}].
+    """
+    first, last = month_index(*start), month_index(*end)
+    if last < first:
+        raise ValueError('end is before start')
+    if last - first >= MAX_RANGE_MONTHS:
+        raise ValueError(f'range is longer than {MAX_RANGE_MONTHS} months')
+
+    stored = {}
+    if station_id:
+        query = {'station_id': station_id, 'period': {'$gte': period(*start), '$lte': period(*end)}}
+        projection = {'_id': 0, 'period': 1, 'submitted': 1, 'archived': 1}
+        stored = {row['period']: row for row in db.monthly_rollups.find(query, projection)}
+
+    rows = []
+    for index in range(first, last + 1):
+        year, month = from_index(index)
+        row = stored.get(period(year, month), {})
+        rows.append({'year': year, 'month': month, 'period': period(year, month),
+                     'submitted': row.get('submitted', 0), 'archived': row.get('archived', {})})
+    return rows
+
+
+def last_months(db, station_id, count=6, today=None):
+    """The last `count` calendar months up to and including the current one."""
+    today = today or datetime.utcnow()
+    end = month_index(today.year, today.month)
+    return months_range(db, station_id, from_index(end - count + 1), (today.year, today.month))
+
+
+def year_over_year(db, station_id, year):
+    """{year: 12 rows, year - 1: 12 rows} in a single range read."""
+    rows = months_range(db, station_id, (year - 1, 1), (year, 12))
+    return {year - 1: rows[:12], year: rows[12:]}
+
+
+def chart_series(rows):
+    """(labels, submitted counts) for the dashboard chart."""
+    return ([datetime(row['year'], row['month'], 1).strftime('%b') for row in rows],
+            [row['submitted'] for row in rows])
+
+
+def rebuild(db, station_id=None):
+    """Recompute the rollups of every station (or one) from firs/archives; returns the number of rows."""
+    match = {'station_id': station_id} if station_id else {'station_id': {'$nin': [None, '']}}
+    rows = {}
+
+    def row(station, key):
+        year, month = int(key[:4]), int(key[5:7])
+        return rows.setdefault((station, key), {
+            '_id': f'{station}:{key}', 'station_id': station, 'year': year, 'month': month,
+            'period': key, 'submitted': 0, 'archived': {}
+        })
+
+    def by_month(collection, date_field, extra_key=None):
+        group_id = {'station': '$station_id',
+                    'period': {'$dateToString': {'format': '%Y-%m', 'date': f'${date_field}'}}}
+        if extra_key:
+            group_id['key'] = extra_key
+        return collection.aggregate([
+            {'$match': dict(match, **{date_field: {'$type': 'date'}})},
+            {'$group': {'_id': group_id, 'count': {'$sum': 1}}}
+        ])
+
+    for collection in (db.firs, db.archives):
+        for r in by_month(collection, 'submission_date'):
+            row(r['_id']['station'], r['_id']['period'])['submitted'] += r['count']
+    # Archived FIRs carry the time of their final update
+    for r in by_month(db.archives, 'last_updated', '$status'):
+        archived = row(r['_id']['station'], r['_id']['period'])['archived']
+        key = status_key(r['_id']['key'])
+        archived[key] = archived.get(key, 0) + r['count']
+
+    now = datetime.utcnow()
+    for doc in rows.values():
+        db.monthly_rollups.replace_one({'_id': doc['_id']}, dict(doc, updated_at=now), upsert=True)
+    stale = {'_id': {'$nin': [doc['_id'] for doc in rows.values()]}}
+    if station_id:
+        stale['station_id'] = station_id
+    db.monthly_rollups.delete_many(stale)
+    return len(rows)
@@ -0,0 +1,222 @@
+"""
+Citizen notifications: creation, unread counters and live delivery.
+
+create() inserts notifications, bumps the per-user unread counter in
+`notification_counts` ({_id: user_id, unread: n}) and hands each one to the
+NotificationHub, which pushes it to the user's open Server-Sent Events
+streams (GET /api/fir/notifications/stream).
+
+Delivery between processes (several gunicorn workers) uses a Mongo change
+stream on `notifications` when the deployment supports one (replica set /
+Atlas); on a standalone server the hub falls back to in-process pub/sub, and
+clients in other workers pick changes up from the unread count on reconnect.
+
+A counter is seeded from count_documents() before its first change, and
+reconcile() recounts them all as part of the daily maintenance job (see
+jobs.py), or on demand:
+    python notifications.py reconcile [user_id]
+"""
+import json
+import queue
+import threading
+import time
+from datetime import datetime
+
+from pymongo import ReturnDocument
+from pymongo.errors import OperationFailure
+
+from config import Config
+
+
+class NotificationHub:
+    """Per-user fan-out to the queues of open SSE streams."""
+
+    def __init__(self, max_streams=None):
+        self.max_streams = Config.NOTIFICATIONS_MAX_STREAMS if max_streams is None else max_streams
+        self.change_stream_active = False
+        self._subscribers = {}
+        self._lock = threading.Lock()
+        self._watcher = None
+
+    def subscribe(self, user_id):
+        """A queue receiving the user's notifications; None when at the stream limit."""
+        with self._lock:
+            if self.stream_count() >= self.max_streams:
+                return None
+            q = queue.Queue(maxsize=100)
+            self._subscribers.setdefault(user_id, set()).add(q)
+            return q
+
+    def unsubscribe(self, user_id, q):
+        with self._lock:
+            queues = self._subscribers.get(user_id)
+            if queues:
+                queues.discard(q)
+                if not queues:
+                    del self._subscribers[user_id]
+
+    def stream_count(self):
+        return sum(len(queues) for queues in self._subscribers.values())
+
+    def publish(self, notification):
+        with self._lock:
+            queues = list(self._subscribers.get(notification['user_id'], ()))
+        for q in queues:
+            try:
+                q.put_nowait(notification)
+            except queue.Full:
+                pass # a stalled client; it re-syncs from the unread count on reconnect
+
+    def published_locally(self, notification):
+        # With a change stream every process (this one included) hears about the insert from Mongo
+        if not self.change_stream_active:
+            self.publish(notification)
+
+    def start(self, db):
+        """Watch `notifications` for inserts in a background thread, if the deployment allows it."""
+        if self._watcher is None:
+            self._watcher = threading.Thread(target=self._watch, args=(db,), name='notification-watch', daemon=True)
+            self._watcher.start()
+
+    def _watch(self, db):
+        pipeline = [{'$match': {'operationType': 'insert'}}]
+        while True:
+            try:
+                with db.notifications.watch(pipeline) as stream:
+                    self.change_stream_active = True
+                    for change in stream:
+                        self.publish(change['fullDocument'])
+            except OperationFailure as e:
+                # Standalone servers have no change streams (code 40573)
+                print(f"Notification change stream unavailable ({e}); using in-process delivery")
+                self.change_stream_active = False
+                return
+            except Exception as e:
+                print(f"Notification change stream interrupted: {e}")
+                self.change_stream_active = False
+                time.sleep(5)
+
+
+hub = NotificationHub()
+
+
+def create(db, notifications):
+    """Insert notifications, update the unread counters and push them to open streams."""
+    if not notifications:
+        return
+    unread = {}
+    for notification in notifications:
+        if not notification.get('is_read'):
+            unread[notification['user_id']] = unread.get(notification['user_id'], 0) + 1
+    # Seed missing counters before the insert, so the seed doesn't count these too
+    for user_id in unread:
+        _ensure_counter(db, user_id)
+    db.notifications.insert_many(notifications, ordered=False)
+    for user_id, count in unread.items():
+        _adjust(db, user_id, count)
+    for notification in notifications:
+        hub.published_locally(notification)
+
+
+def _ensure_counter(db, user_id):
+    """The user's counter, initialised from their unread notifications if it doesn't exist yet."""
+    counter = db.notification_counts.find_one({'_id': user_id})
+    if counter is None:
+        count = db.notifications.count_documents({'user_id': user_id, 'is_read': False})
+        counter = db.notification_counts.find_one_and_update(
+            {'_id': user_id}, {'$setOnInsert': {'unread': count}}, upsert=True, return_document=ReturnDocument.AFTER)
+    return counter
+
+
+def _adjust(db, user_id, delta):
+    # Only called once _ensure_counter() has run; decrements never take the counter below 0
+    try:
+        if delta >= 0:
+            db.notification_counts.update_one({'_id': user_id}, {'$inc': {'unread': delta}}, upsert=True)
+        elif not db.notification_counts.update_one({'_id': user_id, 'unread': {'$gte': -delta}},
+                                                   {'$inc': {'unread': delta}}).matched_count:
+            db.notification_counts.update_one({'_id': user_id}, {'$set': {'unread': 0}})
+    except Exception as e:
+        print(f"Could not update unread count for {user_id}: {e}")
+
+
+def unread_count(db, user_id):
+    """The counter, initialised from the notifications themselves the first time."""
+    return max(_ensure_counter(db, user_id).get('unread', 0), 0)
+
+
+def mark_read(db, user_id, notification_id):
+    _ensure_counter(db, user_id)
+    result = db.notifications.update_one({'_id': notification_id, 'user_id': user_id, 'is_read': False},
+                                         {'$set': {'is_read': True}})
+    if result.modified_count:
+        _adjust(db, user_id, -1)
+    return result.modified_count
+
+
+def mark_all_read(db, user_id):
+    _ensure_counter(db, user_id)
+    result = db.notifications.update_many({'user_id': user_id, 'is_read': False}, {'$set': {'is_read': True}})
+    if result.modified_count:
+        _adjust(db, user_id, -result.modified_count)
+    return result.modified_count
+
+
+def reconcile(db, user_id=None):
+    """Recount unread notifications into the counters (all users, or one); returns how many were written."""
+    match = {'is_read': False}
+    if user_id is not None:
+        match['user_id'] = user_id
+    counts = {row['_id']: row['unread'] for row in db.notifications.aggregate([
+        {'$match': match}, {'$group': {'_id': '$user_id', 'unread': {'$sum': 1}}}])}
+    stale = {'_id': user_id} if user_id is not None else {}
+    stale_ids = [c['_id'] for c in db.notification_counts.find(stale, {'_id': 1}) if c['_id'] not in counts]
+    if stale_ids:
+        db.notification_counts.update_many({'_id': {'$in': stale_ids}}, {'$set': {'unread': 0}})
+    for uid, count in counts.items():
+        db.notification_counts.replace_one({'_id': uid}, {'unread': count}, upsert=True)
+    return len(counts) + len(stale_ids)
+
+
+def _sse(event, data):
+    return f"event: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+
+
+def stream(db, user_id, q, heartbeat=None, max_seconds=None):
+    """
+    SSE frames for one connection: the unread count first, then each new
+    notification (followed by the new count). Ends after `max_seconds`; the
+    browser's EventSource reconnects on its own.
+    """
+    heartbeat = heartbeat or Config.NOTIFICATIONS_HEARTBEAT_SECONDS
+    deadline = time.monotonic() + (max_seconds or Config.NOTIFICATIONS_STREAM_MAX_SECONDS)
+    try:
+        yield f"retry: {int(Config.NOTIFICATIONS_RETRY_MS)}\n"
+        yield _sse('unread', {'unread': unread_count(db, user_id)})
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            try:
+                notification = q.get(timeout=min(heartbeat, remaining))
+            except queue.Empty:
+                yield ': keep-alive\n\n'
+                continue
+            notification = dict(notification, _id=str(notification['_id']))
+            if isinstance(notification.get('created_at'), datetime):
+                notification['created_at'] = notification['created_at'].isoformat()
+            yield _sse('notification', notification)
+            yield _sse('unread', {'unread': unread_count(db, user_id)})
+    finally:
+        hub.unsubscribe(user_id, q)
+
+
+if __name__ == '__main__':
+    import sys
+    from pymongo import MongoClient
+
+    if len(sys.argv) < 2 or sys.argv[1] != 'reconcile':
+        print('usage: python notifications.py reconcile [user_id]')
+        sys.exit(1)
+    db = MongoClient(Config.MONGO_URI).get_default_database()
+    print(f"Reconciled {reconcile(db, sys.argv[2] if len(sys.argv) > 2 else None)} unread counter(s)")
@@ -0,0 +1,179 @@
+"""
+Keyset pagination and field projection for the FIR list APIs.
+
+Lists are ordered newest first on (date field, _id). The cursor is an opaque
+base64url token of the last item's (date, _id); the next page is everything
+strictly "before" it, so pages stay stable while new FIRs arrive and each
+request reads at most `limit + 1` documents. Responses keep the JSON array
+body and return the token in the X-Next-Cursor header (absent on the last page).
+
+Every list is paged: a request without `limit` gets DEFAULT_LIMIT items, so
+no response (or the memory behind it) grows with the size of the collection.
+Clients that need more than the newest page follow X-Next-Cursor.
+"""
+import base64
+import heapq
+import json
+import re
+from datetime import datetime
+
+from pymongo import DESCENDING
+from pymongo.errors import OperationFailure
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 200
+NEXT_CURSOR_HEADER = 'X-Next-Cursor'
+
+# Heavy fields left out of list views unless asked for with ?fields=
+LIST_EXCLUDED_FIELDS = ('original_text', 'translated_text', 'ai_suggestions')
+
+_FIELD_RE = re.compile(r'^[A-Za-z_][A-Za-z0-9_]*$')
+
+
+def encode_cursor(date, _id):
+    payload = json.dumps({'d': date.isoformat() if isinstance(date, datetime) else date, 'i': str(_id)},
+                         separators=(',', ':'))
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def decode_cursor(token):
+    """(datetime or None, _id) from a cursor token; ValueError if it is malformed."""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        payload = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        date = payload['d']
+        return (datetime.fromisoformat(date) if date is not None else None), payload['i']
+    except Exception:
+        raise ValueError('Invalid cursor')
+
+
+def parse_page_args(args, default_limit=DEFAULT_LIMIT, max_limit=MAX_LIMIT):
+    """(limit, decoded cursor or None) from request args; ValueError on bad input."""
+    try:
+        limit = int(args.get('limit', default_limit))
+    except (TypeError, ValueError):
+        raise ValueError('limit must be an integer')
+    if limit < 1:
+        raise ValueError('limit must be positive')
+    cursor = args.get('cursor')
+    return min(limit, max_limit), decode_cursor(cursor) if cursor else None
+
+
+def list_projection(fields_param, excluded=LIST_EXCLUDED_FIELDS):
+    """
+    Mongo projection for a list view: the comma-separated `fields` (plus the
+    sort keys, always returned) or, by default, everything but `excluded`.
+    """
+    if fields_param:
+        fields = [f.strip() for f in fields_param.split(',') if f.strip()]
+        bad = [f for f in fields if not _FIELD_RE.match(f)]
+        if bad or len(fields) > 50:
+            raise ValueError(f"Invalid fields: {', '.join(bad) or 'too many'}")
+        projection = {f: 1 for f in fields}
+        projection['_id'] = 1
+        return projection
+    return {f: 0 for f in excluded}
+
+
+def keyset_query(query, cursor, date_field):
+    """`query` restricted to items after `cursor` in (date_field desc, _id desc) order."""
+    if cursor is None:
+        return query
+    date, _id = cursor
+    if date is None:
+        # Items without the date sort last (null is lowest), so only their _id can go on
+        after = {date_field: None, '_id': {'$lt': _id}}
+        return {'$and': [query, after]} if query else after
+    after = {'$or': [
+        {date_field: {'$lt': date}},
+        {date_field: date, '_id': {'$lt': _id}},
+        {date_field: None} # undated items come after every dated one
+    ]}
+    return {'$and': [query, after]} if query else after
+
+
+def sort_spec(date_field):
+    return [(date_field, DESCENDING), ('_id', DESCENDING)]
+
+
+def _with_sort_key(projection, date_field):
+    if projection and all(projection.values()):
+        return dict(projection, **{date_field: 1}) # the cursor needs the sort key
+    return projection
+
+
+def find_page(collection, query, date_field, limit, cursor=None, projection=None):
+    """Up to limit + 1 documents after `cursor`, newest first (the extra one tells if there is a next page)."""
+    return list(collection.find(keyset_query(query, cursor, date_field), _with_sort_key(projection, date_field))
+                .sort(sort_spec(date_field)).limit(limit + 1))
+
+
+def fetch_page(collection, query, date_field, limit, cursor=None, projection=None):
+    """(documents, next cursor or None) for one page, newest first."""
+    return page_result(find_page(collection, query, date_field, limit, cursor, projection), date_field, limit)
+
+
+def union_pipeline(query, date_field, limit, cursor=None, projection=None, union_with=()):
+    """
+    Aggregation for one page across several collections with the same shape.
+    Every branch is limited (and served by its own index) before $unionWith,
+    and the union is sorted and limited again, all inside the database.
+    """
+    branch = [
+        {'$match': keyset_query(query, cursor, date_field)},
+        {'$sort': dict(sort_spec(date_field))},
+        {'$limit': limit + 1},
+    ]
+    projection = _with_sort_key(projection, date_field)
+    if projection:
+        branch.append({'$project': projection})
+    pipeline = list(branch)
+    for name in union_with:
+        pipeline.append({'$unionWith': {'coll': name, 'pipeline': branch}})
+    if union_with:
+        pipeline += [{'$sort': dict(sort_spec(date_field))}, {'$limit': limit + 1}]
+    return pipeline
+
+
+def fetch_union_page(collection, union_with, query, date_field, limit, cursor=None, projection=None):
+    """(documents, next cursor or None) for one page of `collection` plus the `union_with` collections."""
+    pipeline = union_pipeline(query, date_field, limit, cursor, projection, union_with)
+    try:
+        docs = list(collection.aggregate(pipeline))
+    except OperationFailure as e:
+        # $unionWith needs MongoDB 4.4+; older servers get the same page merged here
+        print(f"$unionWith unavailable ({e}), merging pages in the application")
+        pages = [find_page(c, query, date_field, limit, cursor, projection)
+                 for c in [collection] + [collection.database[name] for name in union_with]]
+        return merge_pages(date_field, limit, *pages)
+    return page_result(docs, date_field, limit)
+
+
+def merge_pages(date_field, limit, *pages):
+    """
+    One page out of several find_page() results (e.g. firs + archives) taken
+    with the same cursor; each is already in order, so this is a k-way merge.
+    """
+    def key(doc):
+        return doc.get(date_field) or datetime.min, doc['_id']
+    merged = list(heapq.merge(*pages, key=key, reverse=True))[:limit + 1]
+    return page_result(merged, date_field, limit)
+
+
+def page_result(docs, date_field, limit):
+    """Trim a limit+1 fetch to a page and derive its next cursor."""
+    if len(docs) <= limit:
+        return docs, None
+    docs = docs[:limit]
+    last = docs[-1]
+    return docs, encode_cursor(last.get(date_field), last['_id'])
+
+
+def paged_response(payload, next_cursor):
+    """JSON response for `payload` (ObjectIds and dates included) with the pagination header set."""
+    from serialization import json_response
+
+    resp = json_response(payload)
+    if next_cursor:
+        resp.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return resp
@@ -0,0 +1,83 @@
+"""
+The authenticated user behind a request.
+
+    @police_bp.route('/dashboard')
+    @principal_required('police', on_missing=lambda: redirect(url_for('police.login')))
+    def dashboard():
+        user = g.principal
+
+The JWT identity is resolved once per request into `g.principal`. Profiles
+come from a process-wide TTL cache keyed by (role, user id), so a page view
+normally costs no Mongo round trip. invalidate() drops an entry when the
+profile is edited; other workers pick the edit up within PRINCIPAL_CACHE_TTL
+seconds. Fields that don't change during a session (role, station_id) are
+taken from the JWT claims.
+"""
+from functools import wraps
+
+from bson import ObjectId
+from bson.errors import InvalidId
+from flask import g, jsonify
+from flask_jwt_extended import get_jwt, get_jwt_identity, jwt_required
+
+from cache import LRUCache
+from config import Config
+from db import get_db
+
+COLLECTIONS = {'citizen': 'users', 'police': 'police'}
+PROFILE_PROJECTION = {'password_hash': 0}
+CLAIM_FIELDS = ('role', 'station_id')
+
+_cache = LRUCache(Config.PRINCIPAL_CACHE_SIZE, Config.PRINCIPAL_CACHE_TTL)
+
+
+def load_user(db, role, user_id):
+    """A user's profile (without the password hash) or None; a copy, safe to modify."""
+    key = (role, str(user_id))
+    user = _cache.get(key)
+    if user is None:
+        try:
+            oid = ObjectId(user_id)
+        except (InvalidId, TypeError):
+            return None
+        user = db[COLLECTIONS[role]].find_one({'_id': oid}, PROFILE_PROJECTION)
+        if user is None:
+            return None # not cached, so a user created a moment later is found
+        _cache.set(key, user)
+    return dict(user)
+
+
+def invalidate(user_id, role=None):
+    for r in ([role] if role else COLLECTIONS):
+        _cache.pop((r, str(user_id)))
+
+
+def current_principal():
+    """The request's user merged with its stable JWT claims; None if the account is gone."""
+    if 'principal' not in g:
+        claims = get_jwt()
+        role = claims.get('role', 'citizen')
+        user = load_user(get_db(), role, get_jwt_identity()) if role in COLLECTIONS else None
+        if user is not None:
+            user.update({field: claims[field] for field in CLAIM_FIELDS if field in claims})
+        g.principal = user
+    return g.principal
+
+
+def principal_required(role=None, on_missing=None):
+    """jwt_required() that also loads g.principal (and checks its role)."""
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            user = current_principal()
+            if user is None:
+                return on_missing() if on_missing else (jsonify({'error': 'User not found'}), 404)
+            if role and user.get('role') != role:
+                return on_missing() if on_missing else (jsonify({'error': 'Unauthorized'}), 403)
+            return view(*args, **kwargs)
+        return jwt_required()(wrapper)
+    return decorator
+
+
+def stats():
+    return _cache.stats()
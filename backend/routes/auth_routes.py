@@ -1,10 +1,11 @@
 
 from flask import Blueprint, request, jsonify
-from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
+from flask_jwt_extended import create_access_token, jwt_required
 from werkzeug.security import check_password_hash, generate_password_hash
 from db import get_db
+import accounts
 import datetime
-from bson import ObjectId
+import principal
 
 auth_bp = Blueprint('auth', __name__)
 
@@ -22,10 +23,8 @@ def login():
     if db is None:
          return jsonify({'error': 'Database not connected'}), 500
 
-    # Check in users collection first, then police
-    user = db.users.find_one({'username': username})
-    if not user:
-        user = db.police.find_one({'username': username})
+    # One read over both users and police
+    user = accounts.find_credentials(db, username)
     
     if user and check_password_hash(user['password_hash'], password):
         # Determine role from user object or default
@@ -68,12 +67,6 @@ def register():
     if not username or not password:
         return jsonify({'error': 'Username and password required'}), 400
         
-    db = get_db()
-    
-    # Check uniqueness across both collections
-    if db.users.find_one({'username': username}) or db.police.find_one({'username': username}):
-        return jsonify({'error': 'User already exists'}), 400
-        
     new_user = {
         'username': username,
         'full_name': full_name,
@@ -81,9 +74,8 @@ def register():
         'created_at': datetime.datetime.utcnow()
     }
 
-    collection = db.users # Default
-
-    # Role specific validation
+    # Role specific validation; uniqueness (username, aadhar, phone, police ID)
+    # is left to the unique indexes (checked up front only if one is missing), see accounts.py
     if role == 'citizen':
         aadhar = data.get('aadhar')
         phone = data.get('phone')
@@ -91,17 +83,10 @@ def register():
         
         if not aadhar or not phone:
              return jsonify({'error': 'Aadhar and Phone number are required for citizens'}), 400
-             
-        # Check uniqueness
-        if db.users.find_one({'aadhar': aadhar}):
-            return jsonify({'error': 'Aadhar already registered'}), 400
-        if db.users.find_one({'phone': phone}):
-            return jsonify({'error': 'Phone number already registered'}), 400
             
-        new_user['aadhar'] = aadhar
-        new_user['phone'] = phone
+        new_user['aadhar'] = str(aadhar)
+        new_user['phone'] = str(phone)
         new_user['email'] = email
-        collection = db.users
         
     elif role == 'police':
         police_id = data.get('police_id')
@@ -113,40 +98,37 @@ def register():
         if not station_id:
             return jsonify({'error': 'Station ID is required for police personnel'}), 400
             
-        if db.police.find_one({'police_id': police_id}):
-            return jsonify({'error': 'Police ID already registered'}), 400
-            
         new_user['police_id'] = str(police_id)
         new_user['station_id'] = str(station_id)
-        collection = db.police
+
+    else:
+        return jsonify({'error': 'Invalid role'}), 400
     
     new_user['password_hash'] = generate_password_hash(password)
     
-    collection.insert_one(new_user)
+    try:
+        accounts.register(get_db(), role, new_user)
+    except accounts.AccountExists as e:
+        return jsonify({'error': str(e)}), 400
     
     return jsonify({'message': 'User registered successfully'}), 201
 
 @auth_bp.route('/me', methods=['GET'])
 @jwt_required()
 def get_current_user():
-    current_user_id = get_jwt_identity()
     db = get_db()
     
     if db is None:
         return jsonify({'error': 'Database error'}), 500
         
-    # Check users first
-    user = db.users.find_one({'_id': ObjectId(current_user_id)})
-    if not user:
-        # Check police
-        user = db.police.find_one({'_id': ObjectId(current_user_id)})
+    # Cached profile for the token's role (password hash already left out)
+    user = principal.current_principal()
         
     if not user:
         return jsonify({'error': 'User not found'}), 404
         
-    # Convert ObjectId to string and remove password
+    # Convert ObjectId to string
     user['_id'] = str(user['_id'])
-    user.pop('password_hash', None)
     
     # For police, resolve station name
     if user.get('role') == 'police':
@@ -1,16 +1,35 @@
 
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, Response, request, jsonify, stream_with_context
 from flask_jwt_extended import jwt_required, get_jwt_identity, get_jwt
 from db import get_db
 from datetime import datetime
-from deep_translator import GoogleTranslator
-from ml_service import ml_service
+import fir_updates
+import http_cache
+import jobs
+import monthly_rollups
+import notifications
+import pagination
+import principal
+import serialization
+import station_stats
+from config import Config
 import uuid
-import pandas as pd
-from bson import ObjectId
 
 fir_bp = Blueprint('fir', __name__)
 
+def _archive_query(user_id, claims):
+    # Citizens see their own archives; police their station's (all stations if none is assigned)
+    if claims.get('role', 'citizen') == 'citizen':
+        return {'user_id': user_id}
+    if claims.get('station_id'):
+        return {'station_id': claims['station_id']}
+    return {}
+
+def _page_args():
+    # (limit, cursor, projection) for the list endpoints; ValueError -> 400
+    limit, cursor = pagination.parse_page_args(request.args)
+    return limit, cursor, pagination.list_projection(request.args.get('fields'))
+
 @fir_bp.route('/', methods=['POST'])
 @jwt_required()
 def submit_fir():
@@ -34,33 +53,18 @@ def submit_fir():
     if not original_text:
         return jsonify({'error': 'FIR description is required'}), 400
         
-    # Translation
-    translated_text = original_text
-    if language != 'en':
-        try:
-            # Note: GoogleTranslator might block if used too heavily.
-            translated_text = GoogleTranslator(source='auto', target='en').translate(original_text)
-        except Exception as e:
-            print(f"Translation failed: {e}")
-            pass
-            
     # Prepare FIR Entry
     fir_id = str(uuid.uuid4())
     current_time = datetime.utcnow()
     
-    # ML Prediction for BNS Sections
-    ai_suggestions = []
-    try:
-        if translated_text:
-            ai_suggestions = ml_service.predict_bns(translated_text, k=5)
-    except Exception as e:
-        print(f"ML Prediction failed in fir_routes: {e}")
+    # Translation and BNS suggestions run in a background job (see jobs.py);
+    # until it finishes translated_text is the original and ai_status is pending
 
     fir_entry = {
         '_id': fir_id,
         'user_id': user_id,
         'original_text': original_text,
-        'translated_text': translated_text,
+        'translated_text': original_text,
         'language': language,
         'incident_date': incident_date,
         'incident_time': incident_time,
@@ -69,7 +73,8 @@ def submit_fir():
         'status': 'pending',
         'submission_date': current_time,
         'last_updated': current_time,
-        'ai_suggestions': ai_suggestions
+        'ai_suggestions': [],
+        'ai_status': jobs.AI_PENDING
     }
     
     db = get_db()
@@ -82,8 +87,8 @@ def submit_fir():
         fir_entry['complainant_email'] = data.get('complainant_email', 'N/A')
         fir_entry['source'] = 'police_manual'
     else:
-        # Citizen Entry - Fetch details
-        user = db.users.find_one({'_id': ObjectId(user_id)})
+        # Citizen Entry - Fetch details (cached profile, see principal.py)
+        user = principal.current_principal()
         fir_entry['complainant_name'] = user.get('full_name', 'Unknown') if user else 'Unknown'
         fir_entry['complainant_phone'] = user.get('phone', 'N/A') if user else 'N/A'
         fir_entry['complainant_aadhar'] = user.get('aadhar', 'N/A') if user else 'N/A'
@@ -91,32 +96,38 @@ def submit_fir():
         fir_entry['source'] = 'citizen_portal'
 
     db.firs.insert_one(fir_entry)
-    return jsonify({'message': 'FIR submitted successfully', 'fir_id': fir_id}), 201
+    station_stats.record_submitted(db, fir_entry)
+    monthly_rollups.record_submitted(db, fir_entry)
+    http_cache.touch(db, [fir_entry])
+    try:
+        jobs.enqueue(db, jobs.FIR_AI_JOB, {'fir_id': fir_id})
+    except Exception as e:
+        print(f"Could not queue AI suggestions for FIR {fir_id}: {e}")
+        db.firs.update_one({'_id': fir_id}, {'$set': {'ai_status': jobs.AI_FAILED, 'ai_error': str(e)}})
+    return jsonify({'message': 'FIR submitted successfully', 'fir_id': fir_id, 'ai_status': jobs.AI_PENDING}), 201
 
 @fir_bp.route('/', methods=['GET'])
 @jwt_required()
 def get_user_firs():
     user_id = get_jwt_identity()
+    try:
+        limit, cursor, projection = _page_args()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
     db = get_db()
     if db is not None:
-        # Fetch from active firs
-        active_firs = list(db.firs.find({'user_id': user_id}))
-        # Fetch from archives
-        archived_firs = list(db.archives.find({'user_id': user_id}))
-        
-        all_firs = active_firs + archived_firs
-        
-        for fir in all_firs:
-            fir['_id'] = str(fir['_id'])
-            if 'submission_date' in fir:
-                 fir['submission_date'] = fir['submission_date'].isoformat()
-            if 'last_updated' in fir and isinstance(fir['last_updated'], datetime):
-                 fir['last_updated'] = fir['last_updated'].isoformat()
-                 
-        # Sort by submission date desc
-        all_firs.sort(key=lambda x: x.get('submission_date', ''), reverse=True)
-                 
-        return jsonify(all_firs), 200
+        # Unchanged since the client's copy: 304 without reading any FIR
+        etag, last_modified = http_cache.list_validators(db, f"user:{user_id}")
+        if http_cache.is_fresh(etag, last_modified):
+            return http_cache.not_modified(etag, last_modified)
+
+        # Active and archived FIRs in one aggregation ($unionWith): each side
+        # reads at most limit + 1 documents off its user_submitted_id index
+        all_firs, next_cursor = pagination.fetch_union_page(
+            db.firs, ['archives'], {'user_id': user_id}, 'submission_date', limit, cursor, projection)
+
+        return http_cache.with_validators(pagination.paged_response(all_firs, next_cursor), etag, last_modified), 200
     return jsonify([]), 200
 
 @fir_bp.route('/archives', methods=['GET'])
@@ -124,28 +135,43 @@ def get_user_firs():
 def get_archived_firs():
     user_id = get_jwt_identity()
     claims = get_jwt()
-    role = claims.get('role', 'citizen')
+    try:
+        limit, cursor, projection = _page_args()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     
     db = get_db()
     if db is not None:
-        query = {}
-        # If citizen, only show their own archives
-        if role == 'citizen':
-            query['user_id'] = user_id
-        # If police, show all archives (or filter by station if implemented)
-        
-        archives = list(db.archives.find(query).sort('submission_date', -1))
+        query = _archive_query(user_id, claims)
+        scope = f"user:{user_id}" if 'user_id' in query else http_cache.station_scope(query.get('station_id'))
+        etag, last_modified = http_cache.list_validators(db, scope)
+        if http_cache.is_fresh(etag, last_modified):
+            return http_cache.not_modified(etag, last_modified)
         
-        for fir in archives:
-            fir['_id'] = str(fir['_id'])
-            if 'submission_date' in fir and isinstance(fir['submission_date'], datetime):
-                 fir['submission_date'] = fir['submission_date'].isoformat()
-            if 'last_updated' in fir and isinstance(fir['last_updated'], datetime):
-                 fir['last_updated'] = fir['last_updated'].isoformat()
-                 
-        return jsonify(archives), 200
+        archives, next_cursor = pagination.fetch_page(db.archives, query, 'submission_date', limit, cursor, projection)
+
+        return http_cache.with_validators(pagination.paged_response(archives, next_cursor), etag, last_modified), 200
     return jsonify([]), 500
 
+@fir_bp.route('/archives/export', methods=['GET'])
+@jwt_required()
+def export_archived_firs():
+    # Every archived FIR visible to the caller, streamed straight from the cursor:
+    # a JSON array, or one FIR per line with ?format=ndjson
+    export_format = request.args.get('format', 'json')
+    if export_format not in ('json', 'ndjson'):
+        return jsonify({'error': 'format must be json or ndjson'}), 400
+    projection = pagination.list_projection(request.args.get('fields'))
+
+    db = get_db()
+    if db is None:
+        return jsonify({'error': 'Database error'}), 500
+    cursor = db.archives.find(_archive_query(get_jwt_identity(), get_jwt()), projection) \
+        .sort(pagination.sort_spec('submission_date')).batch_size(Config.EXPORT_BATCH_SIZE)
+    resp = serialization.stream_response(cursor, ndjson=export_format == 'ndjson')
+    resp.headers['Content-Disposition'] = f'attachment; filename=archives.{export_format}'
+    return resp
+
 # Police Endpoints
 
 @fir_bp.route('/pending', methods=['GET'])
@@ -155,6 +181,10 @@ def get_pending_firs():
     # Check if user is police
     if claims.get('role') != 'police':
         return jsonify({'error': 'Unauthorized'}), 403
+    try:
+        limit, cursor, projection = _page_args()
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
         
     station_id = claims.get('station_id')
     # If a station_id is assigned, filter by it. If not, maybe show all (or none). 
@@ -166,13 +196,12 @@ def get_pending_firs():
         
     db = get_db()
     if db is not None:
-        # Fetch pending or in-progress
-        firs = list(db.firs.find(query))
-        for fir in firs:
-            fir['_id'] = str(fir['_id'])
-            if 'submission_date' in fir:
-                 fir['submission_date'] = fir['submission_date'].isoformat()
-        return jsonify(firs), 200
+        etag, last_modified = http_cache.list_validators(db, http_cache.station_scope(station_id))
+        if http_cache.is_fresh(etag, last_modified):
+            return http_cache.not_modified(etag, last_modified)
+        # Fetch pending or in-progress, newest first
+        firs, next_cursor = pagination.fetch_page(db.firs, query, 'submission_date', limit, cursor, projection)
+        return http_cache.with_validators(pagination.paged_response(firs, next_cursor), etag, last_modified), 200
     return jsonify([]), 500
 
 @fir_bp.route('/<fir_id>', methods=['GET'])
@@ -187,6 +216,16 @@ def get_fir_details(fir_id):
     if db is None:
         return jsonify({'error': 'Database error'}), 500
         
+    if http_cache.is_conditional():
+        # Revalidation: check access and freshness on a few fields before loading
+        # the complaint texts and AI suggestions
+        validators = {'user_id': 1, 'last_updated': 1, 'ai_updated_at': 1}
+        fir = db.firs.find_one({'_id': fir_id}, validators) or db.archives.find_one({'_id': fir_id}, validators)
+        if fir and (role == 'police' or fir['user_id'] == user_id):
+            etag, last_modified = http_cache.fir_etag(fir)
+            if http_cache.is_fresh(etag, last_modified):
+                return http_cache.not_modified(etag, last_modified)
+
     fir = db.firs.find_one({'_id': fir_id})
     if not fir:
         # Check archives
@@ -198,20 +237,16 @@ def get_fir_details(fir_id):
     # access control
     if role != 'police' and fir['user_id'] != user_id:
         return jsonify({'error': 'Unauthorized'}), 403
+
+    etag, last_modified = http_cache.fir_etag(fir)
         
-    fir['_id'] = str(fir['_id'])
-    if 'submission_date' in fir and isinstance(fir['submission_date'], datetime):
-         fir['submission_date'] = fir['submission_date'].isoformat()
-    if 'last_updated' in fir and isinstance(fir['last_updated'], datetime):
-         fir['last_updated'] = fir['last_updated'].isoformat()
-         
     # Check for missing complainant details and fetch from user if possible
     if fir.get('source') == 'citizen_portal' and (
         not fir.get('complainant_email') or fir.get('complainant_email') == 'N/A' or
         not fir.get('complainant_phone') or fir.get('complainant_phone') == 'N/A'
     ):
         try:
-            user_record = db.users.find_one({'_id': ObjectId(fir['user_id'])})
+            user_record = principal.load_user(db, 'citizen', fir['user_id'])
             if user_record:
                 if not fir.get('complainant_email') or fir['complainant_email'] == 'N/A':
                     fir['complainant_email'] = user_record.get('email', 'N/A')
@@ -224,107 +259,134 @@ def get_fir_details(fir_id):
         except Exception as e:
             print(f"Error fetching user details for FIR {fir_id}: {e}")
 
-    return jsonify(fir), 200
+    return http_cache.with_validators(serialization.json_response(fir), etag, last_modified)
+
+@fir_bp.route('/<fir_id>/ai_status', methods=['GET'])
+@jwt_required()
+def get_fir_ai_status(fir_id):
+    # Cheap polling endpoint for the dashboard while AI suggestions are pending
+    user_id = get_jwt_identity()
+    claims = get_jwt()
+    role = claims.get('role', 'citizen')
+
+    db = get_db()
+    if db is None:
+        return jsonify({'error': 'Database error'}), 500
+
+    projection = {'user_id': 1, 'ai_status': 1, 'ai_error': 1, 'ai_suggestions': 1, 'translated_text': 1}
+    fir = db.firs.find_one({'_id': fir_id}, projection) or db.archives.find_one({'_id': fir_id}, projection)
+    if not fir:
+        return jsonify({'error': 'FIR not found'}), 404
+    if role != 'police' and fir['user_id'] != user_id:
+        return jsonify({'error': 'Unauthorized'}), 403
+
+    # FIRs filed before the job pipeline have their suggestions inline
+    ai_status = fir.get('ai_status', jobs.AI_DONE)
+    response = {'fir_id': fir_id, 'ai_status': ai_status}
+    if ai_status == jobs.AI_DONE:
+        response['translated_text'] = fir.get('translated_text')
+        response['ai_suggestions'] = fir.get('ai_suggestions', [])
+    elif ai_status == jobs.AI_FAILED:
+        response['error'] = fir.get('ai_error')
+    return jsonify(response), 200
 
 @fir_bp.route('/<fir_id>/update', methods=['PUT'])
 @jwt_required()
 def update_fir(fir_id):
     # Verify police role here ideally
-    data = request.json
-    status = data.get('status')
-    sections = data.get('applicable_sections', []) # List of strings
-    police_notes = data.get('police_notes', '')
-    
-    if not status:
+    data = request.json or {}
+    if not data.get('status'):
         return jsonify({'error': 'Status is required'}), 400
         
     db = get_db()
     if db is not None:
-        old_fir = db.firs.find_one({'_id': fir_id})
-        
-        if not old_fir:
-             return jsonify({'error': 'FIR not found'}), 404
-             
-        old_status = old_fir.get('status')
-        
-        update_data = {
-            'status': status,
-            'police_notes': police_notes,
-            'last_updated': datetime.utcnow()
-        }
-        
-        if sections:
-            update_data['applicable_sections'] = sections
-            
-        if status == 'resolved':
-            # Move to archives
-            archived_fir = old_fir.copy()
-            archived_fir.update(update_data)
-            
-            # Insert into archives
-            db.archives.insert_one(archived_fir)
-            
-            # Remove from firs
-            db.firs.delete_one({'_id': fir_id})
-            
-            # Notify user
-            msg = f"Your FIR ({fir_id[:8]}) has been marked as RESOLVED."
-            notification = {
-                '_id': str(uuid.uuid4()),
-                'user_id': old_fir['user_id'],
-                'message': msg,
-                'is_read': False,
-                'created_at': datetime.utcnow()
-            }
-            db.notifications.insert_one(notification)
-            
+        result = fir_updates.apply_updates(db, [dict(data, fir_id=fir_id)])[0]
+        if not result['ok']:
+            return jsonify({'error': result['error']}), result['code']
+        if result['archived']:
             return jsonify({'message': 'FIR completed and archived'}), 200
-            
-        else:
-            # Normal update
-            result = db.firs.update_one({'_id': fir_id}, {'$set': update_data})
-            
-            if result.matched_count:
-                # Create Notification if status changed
-                if old_status != status:
-                    msg = f"Your FIR ({fir_id[:8]}) status has been updated to '{status.replace('_', ' ').title()}'."
-                    notification = {
-                        '_id': str(uuid.uuid4()),
-                        'user_id': old_fir['user_id'],
-                        'message': msg,
-                        'is_read': False,
-                        'created_at': datetime.utcnow()
-                    }
-                    db.notifications.insert_one(notification)
-                    
-                return jsonify({'message': 'FIR updated successfully'}), 200
-            else:
-                return jsonify({'error': 'FIR not found'}), 404
+        return jsonify({'message': 'FIR updated successfully'}), 200
     return jsonify({'error': 'Database error'}), 500
 
+@fir_bp.route('/bulk_update', methods=['POST'])
+@jwt_required()
+def bulk_update_firs():
+    # {"updates": [{fir_id, status, applicable_sections, police_notes}, ...]} -> per-item results
+    claims = get_jwt()
+    if claims.get('role') != 'police':
+        return jsonify({'error': 'Unauthorized'}), 403
+
+    updates = (request.json or {}).get('updates')
+    if not isinstance(updates, list) or not updates:
+        return jsonify({'error': 'updates must be a non-empty list'}), 400
+    if len(updates) > Config.FIR_BULK_MAX_UPDATES:
+        return jsonify({'error': f'At most {Config.FIR_BULK_MAX_UPDATES} updates per request'}), 400
+
+    db = get_db()
+    if db is None:
+        return jsonify({'error': 'Database error'}), 500
+    results = fir_updates.apply_updates(db, updates, station_id=claims.get('station_id'))
+    updated = sum(result['ok'] for result in results)
+    return jsonify({'updated': updated, 'failed': len(results) - updated, 'results': results}), 200
+
 @fir_bp.route('/notifications', methods=['GET'])
 @jwt_required()
 def get_notifications():
     user_id = get_jwt_identity()
+    try:
+        limit, cursor = pagination.parse_page_args(request.args)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
     db = get_db()
     if db is not None:
-        notifs = list(db.notifications.find({'user_id': user_id}).sort('created_at', -1))
-        for n in notifs:
-            n['_id'] = str(n['_id'])
-            if 'created_at' in n:
-                n['created_at'] = n['created_at'].isoformat()
-        return jsonify(notifs), 200
+        notifs, next_cursor = pagination.fetch_page(db.notifications, {'user_id': user_id}, 'created_at', limit, cursor)
+        return pagination.paged_response(notifs, next_cursor), 200
     return jsonify([]), 500
 
+@fir_bp.route('/notifications/unread_count', methods=['GET'])
+@jwt_required()
+def get_unread_count():
+    # Counter document, not a scan of the user's notifications
+    user_id = get_jwt_identity()
+    db = get_db()
+    if db is not None:
+        return jsonify({'unread': notifications.unread_count(db, user_id)}), 200
+    return jsonify({'error': 'Database error'}), 500
+
+@fir_bp.route('/notifications/stream', methods=['GET'])
+@jwt_required(locations=['headers', 'cookies', 'query_string']) # EventSource can't send headers: ?jwt=<token>
+def stream_notifications():
+    user_id = get_jwt_identity()
+    db = get_db()
+    if db is None:
+        return jsonify({'error': 'Database error'}), 500
+    q = notifications.hub.subscribe(user_id)
+    if q is None:
+        # Too many open streams in this process; the client polls unread_count instead
+        resp = jsonify({'error': 'Too many notification streams'})
+        resp.headers['Retry-After'] = '30'
+        return resp, 503
+    resp = Response(stream_with_context(notifications.stream(db, user_id, q)), mimetype='text/event-stream')
+    resp.headers['Cache-Control'] = 'no-cache'
+    resp.headers['X-Accel-Buffering'] = 'no' # don't let a proxy buffer the stream
+    return resp
+
+@fir_bp.route('/notifications/read_all', methods=['PUT'])
+@jwt_required()
+def mark_all_notifications_read():
+    user_id = get_jwt_identity()
+    db = get_db()
+    if db is not None:
+        count = notifications.mark_all_read(db, user_id)
+        return jsonify({'message': 'Marked all as read', 'updated': count}), 200
+    return jsonify({'error': 'Database error'}), 500
+
 @fir_bp.route('/notifications/<notification_id>/read', methods=['PUT'])
 @jwt_required()
 def mark_notification_read(notification_id):
     user_id = get_jwt_identity()
     db = get_db()
     if db is not None:
-        db.notifications.update_one(
-            {'_id': notification_id, 'user_id': user_id},
-            {'$set': {'is_read': True}}
-        )
+        notifications.mark_read(db, user_id, notification_id)
         return jsonify({'message': 'Marked as read'}), 200
     return jsonify({'error': 'Database error'}), 500
@@ -1,13 +1,26 @@
 
-from flask import Blueprint, request, jsonify
+import json
+from flask import Blueprint, Response, request, jsonify, stream_with_context
 from flask_jwt_extended import jwt_required
-from ml_service import ml_service
+from config import Config
+from crime_cube import INPUT_MAX, INPUT_MIN, check_batch_rows, check_input_range
+from ml_service import ml_service, RETRIEVAL_MODES
 
 intelligence_bp = Blueprint('intelligence', __name__)
 
+def model_unavailable(feature):
+    """Fast 503 while the models are still loading (or failed to load)."""
+    status = ml_service.status()
+    message = 'Models are still loading' if status['state'] == 'loading' else f'{feature} model not available'
+    resp = jsonify({'error': message, 'ml_state': status['state']})
+    resp.headers['Retry-After'] = '5'
+    return resp, 503
+
 @intelligence_bp.route('/predict_crime', methods=['POST'])
 @jwt_required()
 def predict_crime():
+    if not ml_service.is_ready('crime'):
+        return model_unavailable('Crime')
     data = request.json
     try:
         ward = int(data.get('ward'))
@@ -22,16 +35,96 @@ def predict_crime():
     except Exception as e:
         return jsonify({'error': str(e)}), 400
 
+def parse_axis(value, name, low=INPUT_MIN, high=INPUT_MAX):
+    """An axis of the forecast grid: an int, a list of ints, or {"start": a, "end": b} (inclusive)."""
+    if isinstance(value, dict):
+        start, end = int(value['start']), int(value['end'])
+        if start > end:
+            raise ValueError(f'{name} start must not be after its end')
+        # Bounds and size are checked on the ends, before the range is built
+        check_input_range([start, end], name, low, high)
+        if end - start + 1 > Config.CRIME_BATCH_MAX_ROWS:
+            raise ValueError(f'{name} spans more than {Config.CRIME_BATCH_MAX_ROWS} values')
+        return list(range(start, end + 1))
+    if isinstance(value, list):
+        if len(value) > Config.CRIME_BATCH_MAX_ROWS:
+            raise ValueError(f'{name} has more than {Config.CRIME_BATCH_MAX_ROWS} values')
+        values = [int(v) for v in value]
+    else:
+        values = [int(value)]
+    if not values:
+        raise ValueError(f'{name} must not be empty')
+    check_input_range(values, name, low, high)
+    return values
+
+@intelligence_bp.route('/predict_crime/batch', methods=['POST'])
+@jwt_required()
+def predict_crime_batch():
+    """
+    Forecasts for a ward x year x month grid (or explicit "points": [[ward, year, month], ...])
+    in a single model call. "format": "rows" (default), "columnar" or "ndjson" (streamed).
+    """
+    if not ml_service.is_ready('crime'):
+        return model_unavailable('Crime')
+    data = request.json or {}
+    fmt = data.get('format', 'rows')
+    if fmt not in ('rows', 'columnar', 'ndjson'):
+        return jsonify({'error': 'format must be one of rows, columnar, ndjson'}), 400
+    try:
+        if 'points' in data:
+            check_batch_rows(len(data['points']), Config.CRIME_BATCH_MAX_ROWS)
+            points = [[int(w), int(y), int(m)] for w, y, m in data['points']]
+            for column, name, low, high in ((0, 'ward', INPUT_MIN, INPUT_MAX), (1, 'year', INPUT_MIN, INPUT_MAX),
+                                            (2, 'month', 1, 12)):
+                check_input_range([point[column] for point in points], name, low, high)
+            inputs, predictions = ml_service.predict_crime_batch(points=points)
+        else:
+            wards = parse_axis(data.get('wards'), 'wards', low=1)
+            years = parse_axis(data.get('years'), 'years')
+            months = parse_axis(data.get('months', {'start': 1, 'end': 12}), 'months', 1, 12)
+            # Reject an oversized grid before it is built
+            check_batch_rows(len(wards) * len(years) * len(months), Config.CRIME_BATCH_MAX_ROWS)
+            inputs, predictions = ml_service.predict_crime_batch(wards=wards, years=years, months=months)
+    except (KeyError, TypeError, ValueError, OverflowError) as e:
+        return jsonify({'error': str(e)}), 400
+    if predictions is None:
+        return jsonify({'error': 'Prediction failed or model not loaded'}), 500
+
+    if fmt == 'columnar':
+        return jsonify({
+            'ward': inputs[:, 0].tolist(),
+            'year': inputs[:, 1].tolist(),
+            'month': inputs[:, 2].tolist(),
+            'prediction': predictions.tolist()
+        }), 200
+
+    if fmt == 'ndjson':
+        def generate():
+            for (ward, year, month), prediction in zip(inputs.tolist(), predictions.tolist()):
+                yield json.dumps({'ward': ward, 'year': year, 'month': month, 'prediction': prediction}) + '\n'
+        return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+    results = [{'ward': ward, 'year': year, 'month': month, 'prediction': prediction}
+               for (ward, year, month), prediction in zip(inputs.tolist(), predictions.tolist())]
+    return jsonify({'results': results, 'count': len(results)}), 200
+
 @intelligence_bp.route('/predict_bns', methods=['POST'])
 @jwt_required()
 def predict_bns():
+    if not ml_service.is_ready('bns'):
+        return model_unavailable('BNS')
     data = request.json
     try:
         query = data.get('query')
         if not query:
             return jsonify({'error': 'Query is required'}), 400
             
-        results = ml_service.predict_bns(query)
+        # Optional per-request retrieval mode: dense | hybrid | lexical
+        mode = data.get('mode')
+        if mode and mode not in RETRIEVAL_MODES:
+            return jsonify({'error': f"mode must be one of {', '.join(RETRIEVAL_MODES)}"}), 400
+
+        results = ml_service.predict_bns(query, mode=mode)
         return jsonify({'results': results}), 200
     except Exception as e:
         return jsonify({'error': str(e)}), 400
@@ -1,12 +1,22 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, make_response, jsonify
-from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity, set_access_cookies, unset_jwt_cookies
+from flask import Blueprint, render_template, request, redirect, url_for, flash, make_response, jsonify, g
+from flask_jwt_extended import create_access_token, get_jwt_identity, set_access_cookies, unset_jwt_cookies
 from werkzeug.security import check_password_hash, generate_password_hash
 from db import get_db
+import accounts
 import datetime
+import monthly_rollups
+import principal
+import station_stats
 from bson import ObjectId
 
 police_bp = Blueprint('police', __name__)
 
+def _to_login():
+    return redirect(url_for('police.login'))
+
+# Police pages: the officer comes from principal.py (cached), not a find_one per view
+police_page = principal.principal_required('police', on_missing=_to_login)
+
 @police_bp.route('/')
 def index():
     # If user is already logged in, redirect to dashboard
@@ -23,7 +33,7 @@ def login():
         password = request.form.get('password')
         
         db = get_db()
-        user = db.police.find_one({'username': username})
+        user = accounts.find_credentials(db, username, role='police')
         
         if user and check_password_hash(user['password_hash'], password):
             access_token = create_access_token(identity=str(user['_id']), additional_claims={"role": "police", "station_id": user.get('station_id')})
@@ -51,17 +61,7 @@ def signup():
              flash('Passwords do not match', 'error')
              return redirect(url_for('police.signup'))
         
-        db = get_db()
-        
-        if db.police.find_one({'username': username}):
-            flash('Username already exists', 'error')
-            return redirect(url_for('police.signup'))
-            
-        if db.police.find_one({'police_id': police_id}):
-             flash('Police ID already registered', 'error')
-             return redirect(url_for('police.signup'))
-
-        # Check phone/email if needed, for now just inserting
+        # Username and police ID uniqueness come from the unique indexes, see accounts.py
         
         new_user = {
             'username': username,
@@ -75,7 +75,11 @@ def signup():
             'created_at': datetime.datetime.utcnow()
         }
         
-        db.police.insert_one(new_user)
+        try:
+            accounts.register(get_db(), 'police', new_user)
+        except accounts.AccountExists as e:
+            flash('Username already exists' if e.field == 'username' else str(e), 'error')
+            return redirect(url_for('police.signup'))
         flash('Registration successful! Please login.', 'success')
         return redirect(url_for('police.login'))
 
@@ -88,56 +92,21 @@ def logout():
     return resp
 
 @police_bp.route('/dashboard')
-@jwt_required()
+@police_page
 def dashboard():
-    current_user_id = get_jwt_identity()
+    user = g.principal
     db = get_db()
-    user = db.police.find_one({'_id': ObjectId(current_user_id)})
-    
-    if not user:
-        return redirect(url_for('police.login'))
         
-    # Fetch Stats
-    # Total Pending FIRs for this station
-    pending_firs_count = db.firs.count_documents({'station_id': user.get('station_id'), 'status': 'pending'})
+    # Counters come from the station's station_stats document
+    stats = station_stats.get_stats(db, user.get('station_id'))
+    pending_firs_count = stats.get('active', {}).get('pending', 0)
     
     # Recent FIRs
     recent_firs = list(db.firs.find({'station_id': user.get('station_id')}).sort('submission_date', -1).limit(5))
     
-    # Chart Data: Group by Month (Last 6 Months)
-    pipeline = [
-        {
-            '$match': {
-                'station_id': user.get('station_id'),
-                'submission_date': {'$gte': datetime.datetime.utcnow() - datetime.timedelta(days=180)}
-            }
-        },
-        {
-            '$group': {
-                '_id': {'$month': '$submission_date'},
-                'count': {'$sum': 1}
-            }
-        },
-        {'$sort': {'_id': 1}}
-    ]
-    
-    monthly_stats = list(db.firs.aggregate(pipeline))
-    
-    # Format for Chart.js
-    months = ['Jan', 'Feb', 'Mar', 'Apr', 'May', 'Jun', 'Jul', 'Aug', 'Sep', 'Oct', 'Nov', 'Dec']
-    chart_labels = []
-    chart_data = []
-    
-    # Create a map of existing data
-    stats_map = {item['_id']: item['count'] for item in monthly_stats}
-    
-    # Get last 6 months list
-    today = datetime.datetime.today()
-    for i in range(5, -1, -1):
-        d = today - datetime.timedelta(days=i*30)
-        m_idx = d.month 
-        chart_labels.append(months[m_idx-1])
-        chart_data.append(stats_map.get(m_idx, 0))
+    # Chart Data: submissions in each of the last 6 calendar months (precomputed rollups)
+    chart_labels, chart_data = monthly_rollups.chart_series(
+        monthly_rollups.last_months(db, user.get('station_id'), 6))
         
     return render_template('police/dashboard.html', 
                            user=user, 
@@ -147,14 +116,10 @@ def dashboard():
                            chart_data=chart_data)
 
 @police_bp.route('/inbox')
-@jwt_required()
+@police_page
 def inbox():
-    current_user_id = get_jwt_identity()
+    user = g.principal
     db = get_db()
-    user = db.police.find_one({'_id': ObjectId(current_user_id)})
-    
-    if not user:
-        return redirect(url_for('police.login'))
         
     # Fetch all FIRs for station, sorted by newest
     firs = list(db.firs.find({'station_id': user.get('station_id')}).sort('submission_date', -1))
@@ -162,14 +127,10 @@ def inbox():
     return render_template('police/inbox.html', user=user, firs=firs)
 
 @police_bp.route('/archives')
-@jwt_required()
+@police_page
 def archives():
-    current_user_id = get_jwt_identity()
+    user = g.principal
     db = get_db()
-    user = db.police.find_one({'_id': ObjectId(current_user_id)})
-    
-    if not user:
-        return redirect(url_for('police.login'))
         
     # Fetch archived FIRs (Assuming they are in 'archives' collection or 'firs' with specific status)
     # Based on fir_routes.py, resolved/rejected FIRs might be moved to 'archives' collection.
@@ -179,44 +140,48 @@ def archives():
     return render_template('police/archives.html', user=user, firs=archived_firs)
 
 @police_bp.route('/analytics')
-@jwt_required()
+@police_page
 def analytics():
-    current_user_id = get_jwt_identity()
+    user = g.principal
     db = get_db()
-    user = db.police.find_one({'_id': ObjectId(current_user_id)})
-    
-    if not user:
-        return redirect(url_for('police.login'))
         
-    # Real Analytics Data
-    total_firs = db.firs.count_documents({'station_id': user.get('station_id')})
-    # Count from archives as well for total history
-    archived_count = db.archives.count_documents({'station_id': user.get('station_id')})
-    
-    resolved_firs = db.archives.count_documents({'station_id': user.get('station_id'), 'status': 'resolved'})
-    pending_firs = db.firs.count_documents({'station_id': user.get('station_id'), 'status': 'pending'})
-    rejected_firs = db.archives.count_documents({'station_id': user.get('station_id'), 'status': 'rejected'}) # Assuming rejected also archived
-    # If rejected are kept in firs, add check there too.
-    rejected_active = db.firs.count_documents({'station_id': user.get('station_id'), 'status': 'rejected'})
-    
-    stats = {
-        'total': total_firs + archived_count,
-        'resolved': resolved_firs,
-        'pending': pending_firs,
-        'rejected': rejected_firs + rejected_active
-    }
+    # Real Analytics Data (active + archived totals, kept incrementally)
+    stats = station_stats.summary(station_stats.get_stats(db, user.get('station_id')))
     
     return render_template('police/analytics.html', user=user, stats=stats)
 
+@police_bp.route('/trends')
+@principal.principal_required('police')
+def trends():
+    # Monthly rollups for the officer's station: ?months=N (default 6), ?year=YYYY (vs. the year before)
+    # or ?start=YYYY-MM&end=YYYY-MM (at most monthly_rollups.MAX_RANGE_MONTHS months)
+    user = g.principal
+    db = get_db()
+
+    try:
+        if request.args.get('start') or request.args.get('end'):
+            start = monthly_rollups.parse_period(request.args.get('start'), 'start')
+            end = monthly_rollups.parse_period(request.args.get('end'), 'end')
+            rows = monthly_rollups.months_range(db, user.get('station_id'), start, end)
+            return jsonify({'station_id': user.get('station_id'), 'months': rows}), 200
+        if request.args.get('year'):
+            year = int(request.args['year'])
+            data = monthly_rollups.year_over_year(db, user.get('station_id'), year)
+            return jsonify({'station_id': user.get('station_id'), 'years': {str(y): rows for y, rows in data.items()}}), 200
+        months = int(request.args.get('months', 6))
+        if months < 1:
+            raise ValueError('months must be positive')
+        rows = monthly_rollups.last_months(db, user.get('station_id'), months)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    return jsonify({'station_id': user.get('station_id'), 'months': rows}), 200
+
 @police_bp.route('/profile', methods=['GET', 'POST'])
-@jwt_required()
+@police_page
 def profile():
     current_user_id = get_jwt_identity()
+    user = g.principal
     db = get_db()
-    user = db.police.find_one({'_id': ObjectId(current_user_id)})
-    
-    if not user:
-        return redirect(url_for('police.login'))
         
     if request.method == 'POST':
         full_name = request.form.get('full_name')
@@ -232,6 +197,7 @@ def profile():
         }
         
         db.police.update_one({'_id': ObjectId(current_user_id)}, {'$set': update_data})
+        principal.invalidate(current_user_id, 'police')
         flash('Profile updated successfully', 'success')
         return redirect(url_for('police.profile'))
         
@@ -0,0 +1,144 @@
+"""
+Offline script / language detection ahead of the translator.
+
+Citizens often pick a regional language and type English (or the reverse), so
+the client's `language` field is only a hint. Text is split into runs by
+Unicode script; a Latin run is English when English function words outnumber
+romanized-Hindi/Bengali marker words, romanized when the reverse holds, and
+otherwise (no evidence either way) follows the client's `language`. Only the
+non-English spans are sent for translation, and wholly English text skips the
+translator entirely.
+"""
+import re
+import threading
+
+# Unicode blocks of the scripts FIRs arrive in (anything else non-Latin is
+# treated the same way: it needs translation)
+SCRIPT_BLOCKS = (
+    (0x0900, 0x097F, 'devanagari'),
+    (0x0980, 0x09FF, 'bengali'),
+    (0x0A00, 0x0A7F, 'gurmukhi'),
+    (0x0A80, 0x0AFF, 'gujarati'),
+    (0x0B00, 0x0B7F, 'oriya'),
+    (0x0B80, 0x0BFF, 'tamil'),
+    (0x0C00, 0x0C7F, 'telugu'),
+    (0x0C80, 0x0CFF, 'kannada'),
+    (0x0D00, 0x0D7F, 'malayalam'),
+    (0x0600, 0x06FF, 'arabic'),
+)
+
+ENGLISH_WORDS = frozenset("""
+a an the is are was were be been am i me my we our you your he him his she her it its they them their
+this that these those of to in on at by for from with without into over under near and or but not no
+has have had do does did will would can could should may might there here when where who what which
+while after before because about again then than very also just someone somebody stolen stole took
+""".split())
+
+# Common function words of romanized Hindi/Bengali ("mera phone chori ho gaya").
+# Words that are also English ("the") are left out: they would cancel out
+ROMANIZED_WORDS = frozenset("""
+hai hain tha thi ka ki ke ko se mein mai main mera meri mere hum humara aap apna apni nahi nahin
+kya kyun kab kaha kahan koi kuch ho gaya gayi gaye kar karo kiya raha rahi aur bhi par pe wala wali
+ami amar tumi apni amake ache chilo hoyeche kore theke kintu ebong na
+""".split())
+
+MIN_LATIN_WORDS_ALONE = 3 # shorter Latin runs inside regional text are translated with their context
+
+_WORD_RE = re.compile(r"[A-Za-z]+(?:'[A-Za-z]+)?")
+
+_counters = {'texts': 0, 'english_skipped': 0, 'translator_calls_avoided': 0, 'mixed': 0,
+             'chars': 0, 'chars_translated': 0}
+_counters_lock = threading.Lock()
+
+
+def char_script(ch):
+    code = ord(ch)
+    if code < 0x0250:
+        return 'latin' if ch.isalpha() else None # digits, punctuation and spaces are neutral
+    for start, end, name in SCRIPT_BLOCKS:
+        if start <= code <= end:
+            return name
+    return 'other' if ch.isalpha() else None
+
+
+def script_runs(text):
+    """[(script, run text)] with neutral characters attached to the preceding run."""
+    runs = []
+    for ch in text:
+        script = char_script(ch)
+        if runs and (script is None or script == runs[-1][0]):
+            runs[-1][1].append(ch)
+        elif runs and runs[-1][0] is None:
+            # Leading neutral characters join the first real run
+            runs[-1][0] = script
+            runs[-1][1].append(ch)
+        else:
+            runs.append([script, [ch]])
+    return [(script or 'latin', ''.join(chars)) for script, chars in runs]
+
+
+def latin_language(latin_text):
+    """'en', 'romanized', or None when the words give no evidence either way."""
+    words = [w.lower() for w in _WORD_RE.findall(latin_text)]
+    english = sum(w in ENGLISH_WORDS for w in words)
+    romanized = sum(w in ROMANIZED_WORDS for w in words)
+    if english > romanized:
+        return 'en'
+    if romanized > english:
+        return 'romanized'
+    return None
+
+
+def translation_spans(text, language=None):
+    """
+    [(span, needs_translation)] covering `text` in order; adjacent spans with
+    the same decision are merged so each one is a single translator input.
+    Latin runs without clear evidence are translated unless `language` is 'en'.
+    """
+    runs = script_runs(text)
+    decisions = []
+    for i, (script, run) in enumerate(runs):
+        if script != 'latin':
+            decisions.append(True)
+            continue
+        # A word or two of English inside regional text ("mera phone chori")
+        # is translated together with its neighbours for context
+        next_to_regional = (i > 0 and runs[i - 1][0] != 'latin') or (i + 1 < len(runs) and runs[i + 1][0] != 'latin')
+        if next_to_regional and len(_WORD_RE.findall(run)) < MIN_LATIN_WORDS_ALONE:
+            decisions.append(True)
+        elif not _WORD_RE.search(run):
+            decisions.append(False) # digits and punctuation only
+        else:
+            detected = latin_language(run)
+            decisions.append(detected == 'romanized' or (detected is None and language != 'en'))
+
+    spans = []
+    for (_, run), needs in zip(runs, decisions):
+        if spans and spans[-1][1] == needs:
+            spans[-1][0] += run
+        else:
+            spans.append([run, needs])
+    return [(span, needs) for span, needs in spans]
+
+
+def record(spans, claimed_language):
+    """Update the counters for one text; returns True if translation can be skipped."""
+    needs_any = any(needs for _, needs in spans)
+    with _counters_lock:
+        _counters['texts'] += 1
+        _counters['chars'] += sum(len(span) for span, _ in spans)
+        _counters['chars_translated'] += sum(len(span) for span, needs in spans if needs)
+        if not needs_any:
+            _counters['english_skipped'] += 1
+            if claimed_language != 'en':
+                _counters['translator_calls_avoided'] += 1
+        elif any(not needs and span.strip() for span, needs in spans):
+            _counters['mixed'] += 1
+    return not needs_any
+
+
+def stats():
+    with _counters_lock:
+        counters = dict(_counters)
+    counters['chars_avoided'] = counters['chars'] - counters['chars_translated']
+    return counters
@@ -0,0 +1,117 @@
+"""
+JSON for API responses, BSON types included.
+
+dumps() encodes ObjectId as its hex string and datetime as ISO 8601 (the
+format the routes used to produce by hand with str() / isoformat()), using
+orjson when it is installed and the standard library otherwise. JSONProvider
+plugs it into Flask so jsonify() uses it too:
+
+    app.json = serialization.JSONProvider(app)
+
+stream_response() writes a cursor out as a JSON array or NDJSON while it is
+being read, for responses too large to build in memory (see
+GET /api/fir/archives/export). An error half-way through can only cut the
+body short, so clients should treat a truncated array as a failed request.
+"""
+import json
+from datetime import date, datetime
+
+from bson import ObjectId
+from flask import Response, current_app, stream_with_context
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError: # same output, just slower
+    orjson = None
+
+JSON_MIMETYPE = 'application/json'
+NDJSON_MIMETYPE = 'application/x-ndjson'
+
+# Streamed responses are flushed in chunks of about this size
+STREAM_CHUNK_BYTES = 64 * 1024
+
+_ORJSON_OPTIONS = (orjson.OPT_NON_STR_KEYS | orjson.OPT_SERIALIZE_NUMPY) if orjson else 0
+
+
+def _default(obj):
+    if isinstance(obj, ObjectId):
+        return str(obj)
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    if hasattr(obj, 'tolist'): # numpy scalars and arrays (e.g. AI suggestion distances)
+        return obj.tolist()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def dumps(obj, indent=False):
+    """UTF-8 encoded JSON for `obj`."""
+    if orjson is not None:
+        return orjson.dumps(obj, default=_default, option=_ORJSON_OPTIONS | (orjson.OPT_INDENT_2 if indent else 0))
+    if indent:
+        return json.dumps(obj, default=_default, ensure_ascii=False, indent=2).encode('utf-8')
+    return json.dumps(obj, default=_default, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def loads(s):
+    return orjson.loads(s) if orjson is not None else json.loads(s)
+
+
+class JSONProvider(DefaultJSONProvider):
+    """Flask's JSON provider on top of dumps(); responses skip the bytes -> str -> bytes round trip."""
+
+    def dumps(self, obj, **kwargs):
+        return dumps(obj, indent=bool(kwargs.get('indent'))).decode('utf-8')
+
+    def loads(self, s, **kwargs):
+        return loads(s)
+
+    def response(self, *args, **kwargs):
+        obj = self._prepare_response_obj(args, kwargs)
+        indent = (self.compact is None and self._app.debug) or self.compact is False
+        return self._app.response_class(dumps(obj, indent) + b'\n', mimetype=self.mimetype)
+
+
+def json_response(obj, status=200):
+    """A JSON response for `obj` whatever provider the app uses."""
+    return current_app.response_class(dumps(obj) + b'\n', status=status, mimetype=JSON_MIMETYPE)
+
+
+def _chunks(docs, start, separator, end, transform, chunk_bytes):
+    buf = bytearray(start)
+    first = True
+    try:
+        for doc in docs:
+            if not first:
+                buf += separator
+            buf += dumps(transform(doc) if transform else doc)
+            first = False
+            if len(buf) >= chunk_bytes:
+                yield bytes(buf)
+                buf.clear()
+        if start or not first: # an empty NDJSON body stays empty
+            buf += end
+        yield bytes(buf)
+    finally:
+        close = getattr(docs, 'close', None)
+        if close:
+            close() # client went away: release the server-side cursor now
+
+
+def iter_array(docs, transform=None, chunk_bytes=STREAM_CHUNK_BYTES):
+    """`docs` (any iterable, e.g. a PyMongo cursor) as the chunks of one JSON array."""
+    return _chunks(docs, b'[', b',', b']\n', transform, chunk_bytes)
+
+
+def iter_ndjson(docs, transform=None, chunk_bytes=STREAM_CHUNK_BYTES):
+    """`docs` as newline-delimited JSON, one document per line."""
+    return _chunks(docs, b'', b'\n', b'\n', transform, chunk_bytes)
+
+
+def stream_response(docs, ndjson=False, transform=None):
+    """A streamed 200 response for `docs`, as NDJSON or a JSON array."""
+    if ndjson:
+        return Response(stream_with_context(iter_ndjson(docs, transform)), mimetype=NDJSON_MIMETYPE)
+    return Response(stream_with_context(iter_array(docs, transform)), mimetype=JSON_MIMETYPE)
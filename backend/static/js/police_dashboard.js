@@ -129,12 +129,34 @@ window.openReviewModal = async function (firId) {
         document.getElementById('modalNotes').value = fir.police_notes || '';
         document.getElementById('modalSections').value = (fir.applicable_sections || []).join(', ');
 
+        // Translation runs in the background; refresh it once the job is done
+        if (fir.ai_status === 'pending') pollAiStatus(firId);
+
     } catch (error) {
         console.error(error);
         alert('Error loading FIR details');
     }
 };
 
+async function pollAiStatus(firId, delayMs = 2000) {
+    // Stop polling once the modal is closed or shows another FIR
+    await new Promise(resolve => setTimeout(resolve, delayMs));
+    if (currentFirId !== firId) return;
+    try {
+        const response = await fetch(`/api/fir/${firId}/ai_status`);
+        if (!response.ok) return;
+        const data = await response.json();
+        if (currentFirId !== firId) return;
+        if (data.ai_status === 'done') {
+            document.getElementById('modalTranslatedText').textContent = data.translated_text || document.getElementById('modalOriginalText').textContent;
+        } else if (data.ai_status === 'pending') {
+            pollAiStatus(firId, Math.min(delayMs * 1.5, 10000));
+        }
+    } catch (error) {
+        console.error(error);
+    }
+}
+
 window.closeReviewModal = function () {
     document.getElementById('reviewModal').classList.add('hidden');
     currentFirId = null;
@@ -301,6 +323,57 @@ window.updateFIR = async function () {
     }
 };
 
+// --- Bulk updates (inbox) ---
+
+function selectedFirIds() {
+    return Array.from(document.querySelectorAll('.bulk-select:checked')).map(box => box.value);
+}
+
+window.updateBulkCount = function () {
+    const counter = document.getElementById('bulkSelectedCount');
+    if (counter) counter.textContent = selectedFirIds().length;
+};
+
+window.toggleBulkSelectAll = function (source) {
+    document.querySelectorAll('.bulk-select').forEach(box => {
+        // Only rows left visible by the search/status filter
+        if (box.closest('tr').style.display !== 'none') box.checked = source.checked;
+    });
+    updateBulkCount();
+};
+
+window.bulkUpdateSelected = async function () {
+    const firIds = selectedFirIds();
+    if (firIds.length === 0) {
+        alert('Select at least one FIR');
+        return;
+    }
+    const status = document.getElementById('bulkStatus').value;
+    if (!confirm(`Mark ${firIds.length} FIR(s) as ${status.replace('_', ' ')}?`)) return;
+
+    try {
+        // One request for the whole selection; the server reports each FIR separately
+        const response = await fetch('/api/fir/bulk_update', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ updates: firIds.map(id => ({ fir_id: id, status: status })) })
+        });
+        const data = await response.json();
+        if (!response.ok) {
+            alert(data.error || 'Bulk update failed');
+            return;
+        }
+        if (data.failed) {
+            const failures = data.results.filter(r => !r.ok).map(r => `${r.fir_id}: ${r.error}`);
+            alert(`${data.updated} updated, ${data.failed} failed:\n${failures.join('\n')}`);
+        }
+        location.reload();
+    } catch (error) {
+        console.error(error);
+        alert('Error updating FIRs');
+    }
+};
+
 // --- Utilities ---
 
 window.filterTable = function () {
@@ -318,11 +391,13 @@ window.filterTable = function () {
         // Skip empty state row if present (has colspan)
         if (rows[i].cells.length < 2) continue;
 
-        const firId = rows[i].cells[0].textContent.toLowerCase();
-        const complainant = rows[i].cells[1].textContent.toLowerCase();
-        const statusSpan = rows[i].cells[3].getElementsByTagName('span')[0]; // Adjust index if needed (Dashboard vs Inbox)
+        // The inbox has a bulk-select checkbox column first
+        const offset = rows[i].cells[0].querySelector('.bulk-select') ? 1 : 0;
+        const firId = rows[i].cells[offset].textContent.toLowerCase();
+        const complainant = rows[i].cells[offset + 1].textContent.toLowerCase();
+        const statusSpan = rows[i].cells[offset + 3].getElementsByTagName('span')[0]; // Adjust index if needed (Dashboard vs Inbox)
         // Dashboard: ID(0), Complainant(1), Date(2), Status(3), Action(4)
-        // Inbox: ID(0), Complainant(1), Date(2), Location(3), Status(4), Action(5)
+        // Inbox: Select, ID(0), Complainant(1), Date(2), Location(3), Status(4), Action(5)
 
         // Dynamic Status column finding
         let statusText = '';
@@ -330,7 +405,7 @@ window.filterTable = function () {
             statusText = statusSpan.textContent.trim().toLowerCase();
         } else {
             // Fallback for inbox where it might be index 4
-            const statusSpanInbox = rows[i].cells[4]?.getElementsByTagName('span')[0];
+            const statusSpanInbox = rows[i].cells[offset + 4]?.getElementsByTagName('span')[0];
             if (statusSpanInbox) statusText = statusSpanInbox.textContent.trim().toLowerCase();
         }
 
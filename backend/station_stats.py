@@ -0,0 +1,131 @@
+"""
+Per-station FIR counters in the `station_stats` collection.
+
+One document per station, so the police dashboard and analytics pages are
+a single _id read however many FIRs the station has:
+
+    {_id: station_id,
+     active: {<status>: n},      # FIRs in `firs` by status
+     archived: {<status>: n},    # FIRs moved to `archives` by status
+     updated_at, rebuilt_at}
+
+Per-month figures live in monthly_rollups.py.
+
+fir_routes.py keeps the counters current with $inc on every submission and
+status transition. rebuild() recomputes them from `firs` and `archives`; it
+runs as a daily background job (see jobs.py) to repair any drift, and on
+demand for a station that has no document yet:
+    python station_stats.py rebuild [station_id]
+"""
+import re
+from datetime import datetime
+
+_KEY_RE = re.compile(r'^[A-Za-z0-9_-]+$')
+
+
+def status_key(status):
+    # Statuses come from request bodies; keep them usable as field names
+    status = str(status or 'unknown')
+    return status if _KEY_RE.match(status) else 'other'
+
+
+def _inc(db, station_id, counters):
+    if not station_id or not counters:
+        return
+    try:
+        db.station_stats.update_one(
+            {'_id': station_id},
+            {'$inc': counters, '$set': {'updated_at': datetime.utcnow()}},
+            upsert=True
+        )
+    except Exception as e:
+        # The daily rebuild repairs a missed increment
+        print(f"Could not update station stats for {station_id}: {e}")
+
+
+def record_submitted(db, fir):
+    _inc(db, fir.get('station_id'), {f"active.{status_key(fir.get('status'))}": 1})
+
+
+def record_transition(db, station_id, old_status, new_status, archived=False):
+    """A FIR in `firs` went from old_status to new_status (and to `archives` if archived)."""
+    record_transitions(db, [(station_id, old_status, new_status, archived)])
+
+
+def record_transitions(db, transitions):
+    """Several (station_id, old_status, new_status, archived) transitions, one $inc per station."""
+    by_station = {}
+    for station_id, old_status, new_status, archived in transitions:
+        old_key, new_key = status_key(old_status), status_key(new_status)
+        if old_key == new_key and not archived:
+            continue
+        counters = by_station.setdefault(station_id, {})
+        for field, delta in ((f'active.{old_key}', -1), (f"{'archived' if archived else 'active'}.{new_key}", 1)):
+            counters[field] = counters.get(field, 0) + delta
+    for station_id, counters in by_station.items():
+        _inc(db, station_id, {field: delta for field, delta in counters.items() if delta})
+
+
+def _count(collection, match, key):
+    pipeline = [
+        {'$match': match},
+        {'$group': {'_id': {'station': '$station_id', 'key': key}, 'count': {'$sum': 1}}}
+    ]
+    return collection.aggregate(pipeline)
+
+
+def rebuild(db, station_id=None):
+    """Recompute the counters of every station (or one) from scratch; returns the number of stations."""
+    match = {'station_id': station_id} if station_id else {'station_id': {'$nin': [None, '']}}
+    docs = {}
+
+    def doc(station):
+        return docs.setdefault(station, {'_id': station, 'active': {}, 'archived': {}})
+
+    for collection, field in ((db.firs, 'active'), (db.archives, 'archived')):
+        for row in _count(collection, match, '$status'):
+            counters = doc(row['_id']['station'])[field]
+            key = status_key(row['_id']['key'])
+            counters[key] = counters.get(key, 0) + row['count']
+
+    now = datetime.utcnow()
+    if station_id and station_id not in docs:
+        doc(station_id)
+    for station, d in docs.items(): # one small document per station
+        db.station_stats.replace_one({'_id': station}, dict(d, updated_at=now, rebuilt_at=now), upsert=True)
+    if not station_id:
+        # Stations that no longer have any FIRs
+        db.station_stats.delete_many({'_id': {'$nin': list(docs)}})
+    return len(docs)
+
+
+def get_stats(db, station_id):
+    """The station's counters document, rebuilt on first use."""
+    stats = db.station_stats.find_one({'_id': station_id})
+    if stats is None and station_id:
+        rebuild(db, station_id)
+        stats = db.station_stats.find_one({'_id': station_id})
+    return stats or {'_id': station_id, 'active': {}, 'archived': {}}
+
+
+def summary(stats):
+    """Totals shown on the analytics page."""
+    active, archived = stats.get('active', {}), stats.get('archived', {})
+    return {
+        'total': sum(active.values()) + sum(archived.values()),
+        'resolved': archived.get('resolved', 0),
+        'pending': active.get('pending', 0),
+        'rejected': archived.get('rejected', 0) + active.get('rejected', 0)
+    }
+
+
+if __name__ == '__main__':
+    import sys
+    from pymongo import MongoClient
+    from config import Config
+
+    if len(sys.argv) < 2 or sys.argv[1] != 'rebuild':
+        print('usage: python station_stats.py rebuild [station_id]')
+        sys.exit(1)
+    db = MongoClient(Config.MONGO_URI).get_default_database()
+    print(f"Rebuilt stats for {rebuild(db, sys.argv[2] if len(sys.argv) > 2 else None)} station(s)")
@@ -0,0 +1,8 @@
+import os
+import sys
+
+# Tests import backend modules (config, ml_service, ...) directly
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+# Never try to download models from the Hugging Face hub during tests
+os.environ.setdefault('HF_HUB_OFFLINE', '1')
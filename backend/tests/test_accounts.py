@@ -0,0 +1,118 @@
+import mongomock
+import pytest
+from pymongo.errors import DuplicateKeyError
+
+import accounts
+from indexes import INDEX_SPECS, ensure_indexes
+
+
+@pytest.fixture
+def db(monkeypatch):
+    monkeypatch.setattr(accounts, '_usernames_ready', False)
+    monkeypatch.setattr(accounts, '_indexed', set())
+    db = mongomock.MongoClient().db
+    ensure_indexes(db, {name: INDEX_SPECS[name] for name in ('users', 'police')}, superseded={})
+    return db
+
+
+def citizen(username, aadhar='1111', phone='9000'):
+    return {'username': username, 'role': 'citizen', 'aadhar': aadhar, 'phone': phone, 'password_hash': 'h'}
+
+
+def officer(username, police_id='P1'):
+    return {'username': username, 'role': 'police', 'police_id': police_id, 'station_id': '100', 'password_hash': 'h'}
+
+
+def test_usernames_are_unique_across_collections(db):
+    accounts.register(db, 'citizen', citizen('asha'))
+    with pytest.raises(accounts.AccountExists) as e:
+        accounts.register(db, 'police', officer('asha'))
+    assert e.value.field == 'username' and str(e.value) == 'User already exists'
+    assert db.police.count_documents({}) == 0
+
+
+def test_failed_insert_releases_the_username(db):
+    accounts.register(db, 'police', officer('ravi'))
+    with pytest.raises(accounts.AccountExists):
+        accounts.register(db, 'police', officer('meena', police_id='P1'))
+    assert db.usernames.find_one({'_id': 'meena'}) is None
+    accounts.register(db, 'police', officer('meena', police_id='P2'))
+    assert db.usernames.find_one({'_id': 'meena'})['role'] == 'police'
+
+
+def test_duplicate_field_from_the_server_error():
+    error = DuplicateKeyError('E11000 duplicate key error collection: db.users index: aadhar_unique dup key',
+                              11000, {'keyPattern': {'aadhar': 1}, 'keyValue': {'aadhar': '1111'}})
+    assert accounts.duplicate_field(error) == 'aadhar'
+    error = DuplicateKeyError('E11000 duplicate key error collection: db.police index: police_id_unique dup key', 11000)
+    assert accounts.duplicate_field(error) == 'police_id'
+    assert str(accounts.AccountExists('phone')) == 'Phone number already registered'
+
+
+def test_find_credentials_looks_in_both_collections(db):
+    accounts.register(db, 'citizen', citizen('asha'))
+    accounts.register(db, 'police', officer('ravi'))
+    assert accounts.find_credentials(db, 'asha')['role'] == 'citizen'
+    assert accounts.find_credentials(db, 'ravi')['password_hash'] == 'h'
+    assert accounts.find_credentials(db, 'asha', role='police') is None
+    assert accounts.find_credentials(db, 'nobody') is None
+
+
+def test_backfill_claims_existing_accounts_once(db):
+    db.users.insert_one(citizen('old'))
+    db.police.insert_one(officer('older'))
+    assert accounts.backfill_usernames(db) == 2
+    assert accounts.backfill_usernames(db) == 0
+    with pytest.raises(accounts.AccountExists):
+        accounts.register(db, 'police', officer('old', police_id='P9'))
+
+
+def test_registration_claims_legacy_accounts_first(db):
+    db.usernames.insert_one({'_id': 'someone', 'role': 'citizen'}) # usernames already in use
+    db.users.insert_one(citizen('legacy'))
+    with pytest.raises(accounts.AccountExists):
+        accounts.register(db, 'police', officer('legacy'))
+    assert db.usernames.find_one({'_id': 'legacy'})['role'] == 'citizen'
+
+
+def test_legacy_numeric_values_are_normalized_before_indexing(monkeypatch):
+    monkeypatch.setattr(accounts, '_usernames_ready', False)
+    monkeypatch.setattr(accounts, '_indexed', set())
+    db = mongomock.MongoClient().db
+    db.users.insert_one(dict(citizen('old'), aadhar=1111, phone=9000.0))
+    db.police.insert_one(dict(officer('older'), police_id=7))
+    assert accounts.normalize_unique_fields(db) == 3
+    assert accounts.normalize_unique_fields(db) == 0
+    assert db.users.find_one({'username': 'old'})['phone'] == '9000'
+
+    ensure_indexes(db, {name: INDEX_SPECS[name] for name in ('users', 'police')}, superseded={})
+    assert accounts.unindexed_fields(db, 'users') == []
+    with pytest.raises(accounts.AccountExists): # now covered by the partial index
+        accounts.register(db, 'citizen', citizen('new', phone='9001'))
+    assert db.users.count_documents({}) == 1
+
+
+def test_missing_unique_index_falls_back_to_a_check(monkeypatch):
+    monkeypatch.setattr(accounts, '_usernames_ready', False)
+    monkeypatch.setattr(accounts, '_indexed', set())
+    db = mongomock.MongoClient().db # index creation failed: nothing but _id
+    db.users.insert_one(dict(citizen('old'), aadhar=1111))
+    with pytest.raises(accounts.AccountExists) as e:
+        accounts.register(db, 'citizen', citizen('new', phone='9001'))
+    assert e.value.field == 'aadhar' and db.users.count_documents({}) == 1
+    accounts.register(db, 'citizen', citizen('new', aadhar='2222', phone='9001'))
+    assert db.users.count_documents({}) == 2
+
+
+def test_login_lookup_prefers_users_explicitly():
+    class Recorder:
+        pipeline = None
+
+        def aggregate(self, pipeline):
+            Recorder.pipeline = pipeline
+            return iter([{'username': 'asha'}])
+
+    assert accounts.find_credentials({'users': Recorder()}, 'asha') == {'username': 'asha'}
+    stages = [next(iter(stage)) for stage in Recorder.pipeline]
+    assert stages[-3:] == ['$sort', '$limit', '$project']
+    assert Recorder.pipeline[3]['$unionWith']['pipeline'][-1] == {'$addFields': {'_login_order': 1}}
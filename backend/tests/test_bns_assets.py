@@ -0,0 +1,74 @@
+import numpy as np
+import pandas as pd
+
+import bns_assets
+
+
+def make_df():
+    return pd.DataFrame({
+        'Section': ['BNS_303', 'BNS_316', 'BNS_318'],
+        'Description': ['Theft of movable property', None, 'Cheating — धोखाधड़ी'],
+        'Punishment': [np.nan, 'Imprisonment up to 5 years', ''],
+    })
+
+
+def test_round_trip_matches_dataframe(tmp_path):
+    df = make_df()
+    embeddings = np.random.default_rng(1).random((3, 4)).astype(np.float64)
+    manifest = bns_assets.write_bns_assets(str(tmp_path), df, embeddings)
+
+    assets = bns_assets.load_bns_assets(str(tmp_path))
+    assert assets.version == manifest['version']
+    assert len(assets.sections) == 3
+    assert assets.sections.row(0) == {'Section': 'BNS_303', 'Description': 'Theft of movable property', 'Punishment': None}
+    assert assets.sections.row(1)['Description'] is None
+    assert assets.sections.row(2)['Description'] == 'Cheating — धोखाधड़ी'
+    assert assets.sections.row(2)['Punishment'] == ''
+
+    # Embeddings come back as a read-only float32 mmap and the index is prebuilt
+    assert isinstance(assets.embeddings, np.memmap)
+    assert assets.embeddings.dtype == np.float32
+    assert assets.index.ntotal == 3
+    _, ids = assets.index.search(embeddings[:1].astype(np.float32), 1)
+    assert ids[0][0] == 0
+
+    # The BM25 index is stored alongside and opened with the assets
+    assert assets.manifest['lexical'] is True
+    assert list(assets.lexical.search('theft property', 1)[1]) == [0]
+
+
+def test_convert_legacy_pickle(tmp_path):
+    legacy = tmp_path / 'bns_assets.pkl'
+    pd.to_pickle({'df': make_df(), 'embeddings': np.eye(3, dtype=np.float32)}, legacy)
+
+    out_dir = tmp_path / 'bns'
+    bns_assets.convert_legacy_pickle(str(legacy), str(out_dir))
+    assert bns_assets.has_assets(str(out_dir))
+    assert bns_assets.load_bns_assets(str(out_dir)).sections.column('Section') == ['BNS_303', 'BNS_316', 'BNS_318']
+
+
+def test_index_types_find_stored_vectors(tmp_path):
+    vectors = np.random.default_rng(2).random((400, 16)).astype(np.float32)
+    for index_type, metric in [('flat', 'l2'), ('ip', None), ('ivf', 'l2'), ('hnsw', 'l2'), ('hnsw', 'ip')]:
+        index = bns_assets.build_index(vectors, index_type, metric)
+        bns_assets.apply_search_params(index, nprobe=64, ef_search=128)
+        queries = vectors[:20].copy()
+        if metric != 'l2':
+            import faiss
+            faiss.normalize_L2(queries)
+        _, ids = index.search(queries, 1)
+        assert (ids[:, 0] == np.arange(20)).mean() >= 0.95, (index_type, metric)
+
+
+def test_prebuilt_index_is_persisted_and_rebuilt(tmp_path):
+    df = pd.DataFrame({'Section': [f'BNS_{i}' for i in range(100)]})
+    embeddings = np.random.default_rng(3).random((100, 8)).astype(np.float32)
+    bns_assets.write_bns_assets(str(tmp_path), df, embeddings, index_type='hnsw', hnsw_m=8)
+    assets = bns_assets.load_bns_assets(str(tmp_path))
+    assert assets.manifest['index_type'] == 'hnsw'
+    assert type(assets.index).__name__ == 'IndexHNSWFlat'
+
+    manifest = bns_assets.rebuild_index(str(tmp_path), index_type='ip')
+    assert (manifest['index_type'], manifest['metric'], manifest['normalize']) == ('flat', 'ip', True)
+    assert manifest['version'] != assets.version
+    assert bns_assets.load_bns_assets(str(tmp_path)).index.metric_type == 0  # METRIC_INNER_PRODUCT
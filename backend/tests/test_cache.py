@@ -0,0 +1,26 @@
+import time
+
+from cache import LRUCache
+
+
+def test_lru_eviction_order():
+    cache = LRUCache(maxsize=2)
+    cache.set('a', 1)
+    cache.set('b', 2)
+    assert cache.get('a') == 1  # 'a' is now most recently used
+    cache.set('c', 3)
+    assert cache.get('b') is None
+    assert cache.get('a') == 1
+    assert cache.get('c') == 3
+    stats = cache.stats()
+    assert stats['evictions'] == 1
+    assert stats['hits'] == 3 and stats['misses'] == 1
+
+
+def test_ttl_expiry():
+    cache = LRUCache(maxsize=4, ttl=0.05)
+    cache.set('k', 'v')
+    assert cache.get('k') == 'v'
+    time.sleep(0.06)
+    assert cache.get('k') is None
+    assert len(cache) == 0
@@ -0,0 +1,90 @@
+import os
+
+import numpy as np
+import pytest
+
+pytest.importorskip('onnxruntime')
+pytest.importorskip('onnx')
+torch = pytest.importorskip('torch')
+pytest.importorskip('sentence_transformers')
+
+import encoders
+
+WORDS = ('my phone was stolen from the park police complaint cheque bounced dowry '
+         'harassment stalking theft money house car').split()
+TEXTS = [
+    'My phone was stolen from the park',
+    'cheque bounced',
+    'dowry harassment and stalking by neighbours near the house',
+    'unknown words like xylophone are split into pieces',
+]
+
+
+def build_tiny_sentence_transformer(path):
+    """A small random BERT with the same mean-pooling + normalize head as MiniLM (no download)."""
+    from tokenizers import Tokenizer, models, normalizers, pre_tokenizers, processors
+    from transformers import BertConfig, BertModel, BertTokenizerFast
+    from sentence_transformers import SentenceTransformer
+    try:
+        from sentence_transformers.sentence_transformer import modules as st_models
+    except ImportError:
+        from sentence_transformers import models as st_models
+
+    letters = 'abcdefghijklmnopqrstuvwxyz'
+    tokens = ['[PAD]', '[UNK]', '[CLS]', '[SEP]', '[MASK]'] + WORDS + list(letters) + ['##' + c for c in letters]
+    vocab = {token: i for i, token in enumerate(dict.fromkeys(tokens))}
+    tokenizer = Tokenizer(models.WordPiece(vocab, unk_token='[UNK]'))
+    tokenizer.normalizer = normalizers.BertNormalizer(lowercase=True)
+    tokenizer.pre_tokenizer = pre_tokenizers.BertPreTokenizer()
+    tokenizer.post_processor = processors.TemplateProcessing(
+        single='[CLS] $A [SEP]', special_tokens=[('[CLS]', vocab['[CLS]']), ('[SEP]', vocab['[SEP]'])])
+
+    torch.manual_seed(0)
+    raw_dir = os.path.join(path, 'raw')
+    config = BertConfig(vocab_size=len(vocab), hidden_size=32, num_hidden_layers=2, num_attention_heads=2,
+                        intermediate_size=64, max_position_embeddings=64)
+    BertModel(config).save_pretrained(raw_dir)
+    BertTokenizerFast(tokenizer_object=tokenizer, unk_token='[UNK]', pad_token='[PAD]', cls_token='[CLS]',
+                      sep_token='[SEP]', mask_token='[MASK]').save_pretrained(raw_dir)
+
+    transformer = st_models.Transformer(raw_dir, max_seq_length=32)
+    model = SentenceTransformer(modules=[transformer, st_models.Pooling(32, 'mean'), st_models.Normalize()])
+    model_dir = os.path.join(path, 'sentence_transformer')
+    model.save(model_dir)
+    return model_dir
+
+
+@pytest.fixture(scope='module')
+def exported(tmp_path_factory):
+    path = str(tmp_path_factory.mktemp('encoder'))
+    model_dir = build_tiny_sentence_transformer(path)
+    onnx_dir = os.path.join(path, 'onnx')
+    encoders.export_onnx(model_dir, onnx_dir, quantize=True)
+    return model_dir, onnx_dir
+
+
+def cosine(a, b):
+    return (a * b).sum(axis=1) / (np.linalg.norm(a, axis=1) * np.linalg.norm(b, axis=1))
+
+
+def test_onnx_embeddings_match_torch(exported):
+    model_dir, onnx_dir = exported
+    reference = encoders.load_encoder('torch', model_dir).encode(TEXTS)
+    onnx = encoders.load_encoder('onnx', model_dir, onnx_dir=onnx_dir).encode(TEXTS, batch_size=3)
+    assert onnx.shape == reference.shape and onnx.dtype == np.float32
+    np.testing.assert_allclose(onnx, reference, atol=1e-4)
+
+
+def test_quantized_embeddings_stay_close(exported):
+    model_dir, onnx_dir = exported
+    reference = encoders.load_encoder('torch', model_dir).encode(TEXTS)
+    for backend in ('onnx-int8', 'torch-int8'):
+        quantized = encoders.load_encoder(backend, model_dir, onnx_dir=onnx_dir).encode(TEXTS)
+        assert cosine(quantized, reference).min() > 0.98, backend
+
+
+def test_unknown_backend_and_missing_export(tmp_path):
+    with pytest.raises(ValueError):
+        encoders.load_encoder('tensorrt')
+    with pytest.raises(FileNotFoundError):
+        encoders.load_encoder('onnx', onnx_dir=str(tmp_path))
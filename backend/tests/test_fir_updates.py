@@ -0,0 +1,105 @@
+from datetime import datetime
+
+import mongomock
+import pytest
+
+import fir_updates
+
+
+@pytest.fixture
+def db(monkeypatch):
+    monkeypatch.setattr(fir_updates, '_transactions_supported', None)
+    db = mongomock.MongoClient().db
+    for i, station in enumerate(['s1', 's1', 's2']):
+        db.firs.insert_one({'_id': f'fir-{i}', 'user_id': f'u{i}', 'station_id': station, 'status': 'pending',
+                            'submission_date': datetime(2024, 1, 1), 'original_text': 'text'})
+    db.station_stats.insert_many([{'_id': 's1', 'active': {'pending': 2}, 'archived': {}},
+                                  {'_id': 's2', 'active': {'pending': 1}, 'archived': {}}])
+    return db
+
+
+def test_invalid_and_unknown_items_get_their_own_results(db):
+    results = fir_updates.apply_updates(db, [
+        {'fir_id': 'fir-0'},
+        'not an object',
+        {'fir_id': 'missing', 'status': 'resolved'},
+        {'fir_id': 'fir-2', 'status': 'resolved'},
+        {'fir_id': 'fir-1', 'status': 'resolved', 'applicable_sections': 'BNS 303'},
+    ], station_id='s1')
+    assert [r['code'] for r in results] == [400, 400, 404, 403, 400]
+    assert results[0]['error'] == 'Status is required'
+    assert db.firs.count_documents({}) == 3 and db.notifications.count_documents({}) == 0
+
+
+def test_resolved_firs_are_archived_in_one_batch(db):
+    results = fir_updates.apply_updates(db, [
+        {'fir_id': 'fir-0', 'status': 'resolved', 'applicable_sections': ['BNS 303'], 'police_notes': 'recovered'},
+        {'fir_id': 'fir-2', 'status': 'resolved'},
+        {'fir_id': 'fir-0', 'status': 'resolved'},
+    ])
+    assert [(r['code'], r.get('archived')) for r in results] == [(200, True), (200, True), (400, None)]
+    assert fir_updates._transactions_supported is False # mongomock has no sessions
+
+    assert sorted(db.firs.distinct('_id')) == ['fir-1']
+    archived = db.archives.find_one({'_id': 'fir-0'})
+    assert archived['status'] == 'resolved' and archived['applicable_sections'] == ['BNS 303']
+    assert archived['original_text'] == 'text' and archived['police_notes'] == 'recovered'
+
+    notes = list(db.notifications.find({}, {'_id': 0, 'user_id': 1, 'message': 1}))
+    assert sorted(n['user_id'] for n in notes) == ['u0', 'u2']
+    assert all('RESOLVED' in n['message'] for n in notes)
+
+    stats = {doc['_id']: doc for doc in db.station_stats.find()}
+    assert stats['s1']['active'] == {'pending': 1} and stats['s1']['archived'] == {'resolved': 1}
+    assert stats['s2']['active'] == {'pending': 0}
+    assert db.monthly_rollups.count_documents({}) == 2
+
+
+def test_retried_archive_is_idempotent(db):
+    fir = db.firs.find_one({'_id': 'fir-0'})
+    db.archives.insert_one(dict(fir, status='resolved')) # archived, but the delete never happened
+    assert fir_updates.apply_updates(db, [{'fir_id': 'fir-0', 'status': 'resolved'}])[0]['ok']
+    assert db.firs.count_documents({'_id': 'fir-0'}) == 0
+
+
+def test_archive_skips_firs_changed_after_they_were_read(db, monkeypatch):
+    archive = fir_updates._archive
+
+    def racing_archive(db, moves):
+        # Another officer's update lands between our read and the move
+        db.firs.update_one({'_id': 'fir-0'}, {'$set': {'status': 'investigating', 'last_updated': datetime(2024, 2, 1)}})
+        return archive(db, moves)
+
+    monkeypatch.setattr(fir_updates, '_archive', racing_archive)
+    results = fir_updates.apply_updates(db, [{'fir_id': 'fir-0', 'status': 'resolved'},
+                                             {'fir_id': 'fir-1', 'status': 'resolved'}])
+    assert [r['code'] for r in results] == [409, 200]
+    assert db.firs.find_one({'_id': 'fir-0'})['status'] == 'investigating'
+    assert db.archives.distinct('_id') == ['fir-1']
+
+    stats = db.station_stats.find_one({'_id': 's1'})
+    assert stats['active'] == {'pending': 1} and stats['archived'] == {'resolved': 1}
+    assert db.monthly_rollups.count_documents({}) == 1
+    assert [n['user_id'] for n in db.notifications.find()] == ['u1']
+
+
+def test_concurrent_resolves_archive_a_fir_once(db, monkeypatch):
+    archive = fir_updates._archive
+    raced = []
+
+    def racing_archive(db, moves):
+        # A second request that read fir-0 before us archives it first
+        if not raced:
+            raced.append(None)
+            raced[0] = fir_updates.apply_updates(db, [{'fir_id': 'fir-0', 'status': 'resolved'}])[0]
+        return archive(db, moves)
+
+    monkeypatch.setattr(fir_updates, '_archive', racing_archive)
+    result = fir_updates.apply_updates(db, [{'fir_id': 'fir-0', 'status': 'resolved'}])[0]
+    assert raced[0]['code'] == 200 and result['code'] == 409
+    assert db.archives.count_documents({'_id': 'fir-0'}) == 1
+
+    stats = db.station_stats.find_one({'_id': 's1'})
+    assert stats['active'] == {'pending': 1} and stats['archived'] == {'resolved': 1}
+    assert db.notifications.count_documents({}) == 1
+    assert db.monthly_rollups.find_one()['archived'] == {'resolved': 1}
@@ -0,0 +1,140 @@
+import gzip
+import json
+from datetime import datetime, timedelta
+
+import mongomock
+import pytest
+from flask import Flask, Response, jsonify
+from flask_jwt_extended import JWTManager, create_access_token
+
+import http_cache
+import pagination
+import routes.fir_routes as fir_routes
+
+
+@pytest.fixture
+def setup(monkeypatch):
+    db = mongomock.MongoClient().db
+    db.firs.insert_many([{'_id': f'f{i}', 'user_id': 'u1', 'station_id': '100', 'status': 'pending',
+                          'original_text': 'text', 'submission_date': datetime(2024, 1, 1, i),
+                          'last_updated': datetime(2024, 1, 1, i)} for i in range(3)])
+    monkeypatch.setattr(fir_routes, 'get_db', lambda: db)
+
+    app = Flask(__name__)
+    app.config['JWT_SECRET_KEY'] = 'test-secret-key-with-enough-length'
+    JWTManager(app)
+    app.register_blueprint(fir_routes.fir_bp, url_prefix='/api/fir')
+    app.after_request(http_cache.compress)
+    with app.app_context():
+        citizen = create_access_token(identity='u1', additional_claims={'role': 'citizen'})
+        police = create_access_token(identity='p1', additional_claims={'role': 'police', 'station_id': '100'})
+    return app, db, {'Authorization': f'Bearer {citizen}'}, {'Authorization': f'Bearer {police}'}
+
+
+def test_list_revalidation_skips_the_query_until_a_write(setup, monkeypatch):
+    app, db, citizen, police = setup
+    loads = []
+    # mongomock has no $unionWith; the page itself is covered in test_pagination.py
+    monkeypatch.setattr(pagination, 'fetch_union_page', lambda *args, **kwargs: loads.append(args) or ([], None))
+    client = app.test_client()
+    first = client.get('/api/fir/', headers=citizen)
+    etag = first.headers['ETag']
+    assert first.status_code == 200 and etag.startswith('W/') and first.headers['Cache-Control'] == 'private, no-cache'
+
+    assert client.get('/api/fir/', headers=dict(citizen, **{'If-None-Match': etag})).status_code == 304
+    assert len(loads) == 1 # answered without reading any FIR
+    # Another page is another representation
+    assert client.get('/api/fir/?limit=1', headers=dict(citizen, **{'If-None-Match': etag})).status_code == 200
+
+    http_cache.touch(db, [{'user_id': 'u1', 'station_id': '100'}])
+    second = client.get('/api/fir/', headers=dict(citizen, **{'If-None-Match': etag}))
+    assert second.status_code == 200 and second.headers['ETag'] != etag
+
+
+def test_touch_reaches_station_lists(setup):
+    app, db, _, police = setup
+    client = app.test_client()
+    etag = client.get('/api/fir/pending', headers=police).headers['ETag']
+    http_cache.touch(db, [{'user_id': 'someone-else', 'station_id': '200'}])
+    assert client.get('/api/fir/pending', headers=dict(police, **{'If-None-Match': etag})).status_code == 304
+    http_cache.touch(db, [{'user_id': 'someone-else', 'station_id': '100'}])
+    assert client.get('/api/fir/pending', headers=dict(police, **{'If-None-Match': etag})).status_code == 200
+
+
+def test_fir_details_follow_last_updated(setup):
+    app, db, citizen, _ = setup
+    client = app.test_client()
+    first = client.get('/api/fir/f1', headers=citizen)
+    etag, last_modified = first.headers['ETag'], first.headers['Last-Modified']
+    assert client.get('/api/fir/f1', headers=dict(citizen, **{'If-None-Match': etag})).status_code == 304
+    assert client.get('/api/fir/f1', headers=dict(citizen, **{'If-Modified-Since': last_modified})).status_code == 304
+
+    db.firs.update_one({'_id': 'f1'}, {'$set': {'ai_updated_at': datetime(2024, 2, 1)}})
+    assert client.get('/api/fir/f1', headers=dict(citizen, **{'If-None-Match': etag})).status_code == 200
+
+
+def test_changes_within_the_current_second_are_not_validated_by_date(setup):
+    app, db, citizen, _ = setup
+    client = app.test_client()
+    now = datetime.utcnow() + timedelta(seconds=5) # still "this second" however slow the test runs
+    db.firs.update_one({'_id': 'f1'}, {'$set': {'last_updated': now}})
+    resp = client.get('/api/fir/f1', headers=citizen)
+    assert 'Last-Modified' not in resp.headers and resp.headers['ETag']
+
+    # A client holding the second of this change can't tell it from a later one in the same second
+    since = now.replace(microsecond=0).strftime('%a, %d %b %Y %H:%M:%S GMT')
+    assert client.get('/api/fir/f1', headers=dict(citizen, **{'If-Modified-Since': since})).status_code == 200
+
+
+def test_fir_details_revalidation_still_checks_access(setup):
+    app, db, _, _ = setup
+    with app.app_context():
+        other = create_access_token(identity='u2', additional_claims={'role': 'citizen'})
+    etag, _ = http_cache.fir_etag(db.firs.find_one({'_id': 'f1'}))
+    resp = app.test_client().get('/api/fir/f1', headers={'Authorization': f'Bearer {other}',
+                                                          'If-None-Match': f'W/"{etag}"'})
+    assert resp.status_code == 403
+
+
+@pytest.fixture
+def compress_app():
+    app = Flask(__name__)
+    app.after_request(http_cache.compress)
+
+    @app.route('/big')
+    def big():
+        return jsonify([{'description': 'Whoever commits theft ' * 5, 'rank': i} for i in range(50)])
+
+    @app.route('/small')
+    def small():
+        return jsonify({'ok': True})
+
+    @app.route('/stream')
+    def stream():
+        return Response((chunk for chunk in ['data: x\n\n'] * 200), mimetype='text/event-stream')
+
+    return app.test_client()
+
+
+def test_large_json_is_gzipped(compress_app, monkeypatch):
+    monkeypatch.setattr(http_cache, 'brotli', None)
+    resp = compress_app.get('/big', headers={'Accept-Encoding': 'gzip, deflate'})
+    assert resp.headers['Content-Encoding'] == 'gzip' and 'Accept-Encoding' in resp.headers['Vary']
+    assert int(resp.headers['Content-Length']) == len(resp.get_data())
+    assert len(json.loads(gzip.decompress(resp.get_data()))) == 50
+
+
+def test_brotli_when_available_and_preferred(compress_app, monkeypatch):
+    class FakeBrotli:
+        @staticmethod
+        def compress(data, quality):
+            return b'br:' + data[:10]
+    monkeypatch.setattr(http_cache, 'brotli', FakeBrotli)
+    assert compress_app.get('/big', headers={'Accept-Encoding': 'gzip, br'}).headers['Content-Encoding'] == 'br'
+    assert compress_app.get('/big', headers={'Accept-Encoding': 'gzip'}).headers['Content-Encoding'] == 'gzip'
+
+
+def test_small_streamed_and_unaccepted_bodies_are_left_alone(compress_app):
+    assert 'Content-Encoding' not in compress_app.get('/small', headers={'Accept-Encoding': 'gzip'}).headers
+    assert 'Content-Encoding' not in compress_app.get('/big').headers
+    assert 'Content-Encoding' not in compress_app.get('/stream', headers={'Accept-Encoding': 'gzip'}).headers
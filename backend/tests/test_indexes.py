@@ -0,0 +1,68 @@
+import mongomock
+
+from indexes import INDEX_SPECS, QUERY_SHAPES, audit_query_shapes, ensure_indexes, plan_stages
+
+
+def test_ensure_indexes_is_idempotent():
+    db = mongomock.MongoClient().db
+    first = ensure_indexes(db)
+    assert ensure_indexes(db) == first
+    assert 'station_status_submitted_id' in db.firs.index_information()
+    assert 'user_created_id' in db.notifications.index_information()
+
+
+def test_superseded_indexes_are_dropped():
+    db = mongomock.MongoClient().db
+    db.notifications.create_index([('user_id', 1), ('created_at', -1)], name='user_created')
+    ensure_indexes(db)
+    indexes = db.notifications.index_information()
+    assert 'user_created' not in indexes and 'user_created_id' in indexes
+
+
+def test_every_query_shape_has_a_matching_index():
+    # Equality/range fields must form the index prefix, followed by the sort key
+    for name, collection, query, sort in QUERY_SHAPES:
+        wanted = set(query)
+        # a sort on a range-filtered field is already served by the prefix
+        sort_keys = [key for key, _ in sort or [] if key not in wanted]
+        covered = False
+        for keys, _ in INDEX_SPECS[collection]:
+            fields = [key for key, _ in keys]
+            prefix = set(fields[:len(wanted)])
+            if prefix == wanted and fields[len(wanted):len(wanted) + len(sort_keys)] == sort_keys:
+                covered = True
+            # equality on every field but the sort key also works ({user_id} + sort submission_date)
+            elif not sort_keys and wanted <= set(fields) and fields[0] in wanted:
+                covered = True
+        assert covered, f'{name} has no supporting index'
+
+
+def test_plan_stages_walks_nested_plans():
+    plan = {'stage': 'FETCH', 'inputStage': {'stage': 'SORT', 'inputStage': {'stage': 'COLLSCAN'}}}
+    assert plan_stages(plan) == ['FETCH', 'SORT', 'COLLSCAN']
+    assert plan_stages({'queryPlan': {'stage': 'OR', 'inputStages': [{'stage': 'IXSCAN'}]}}) == ['OR', 'IXSCAN']
+
+
+class FakeCursor:
+    def __init__(self, plan):
+        self.plan = plan
+
+    def sort(self, sort):
+        return self
+
+    def explain(self):
+        return {'queryPlanner': {'winningPlan': self.plan}}
+
+
+class FakeDB(dict):
+    def __getitem__(self, name):
+        plan = super().__getitem__(name)
+        return type('Collection', (), {'find': lambda self, query: FakeCursor(plan)})()
+
+
+def test_audit_reports_collection_scans_and_memory_sorts():
+    db = FakeDB(firs={'stage': 'COLLSCAN'},
+                archives={'stage': 'SORT', 'inputStage': {'stage': 'IXSCAN'}},
+                notifications={'stage': 'FETCH', 'inputStage': {'stage': 'IXSCAN'}})
+    shapes = [('a', 'firs', {}, None), ('b', 'archives', {}, [('x', 1)]), ('c', 'notifications', {}, None)]
+    assert audit_query_shapes(db, shapes) == {'a': 'COLLSCAN', 'b': 'in-memory SORT'}
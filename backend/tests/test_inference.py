@@ -0,0 +1,68 @@
+import threading
+
+import numpy as np
+import pytest
+
+from inference_server import InferenceServer
+from ml_service import RemoteMLService
+from test_ml_service import make_crime_service
+
+
+@pytest.fixture
+def sidecar(tmp_path):
+    engine = make_crime_service()
+    engine.load_seconds = 0.0
+    path = str(tmp_path / 'inference.sock')
+    server = InferenceServer(path, engine)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield engine, RemoteMLService(path, timeout=5, status_ttl=0)
+    server.shutdown()
+    server.server_close()
+
+
+def test_remote_service_matches_engine(sidecar):
+    engine, remote = sidecar
+    assert remote.status()['state'] == 'ready'
+    assert remote.is_ready('bns') and remote.is_ready('crime')
+
+    assert remote.predict_bns('description of section 3', k=3) == engine.predict_bns('description of section 3', k=3)
+    assert remote.predict_bns('description of section 3', k=2, mode='lexical') == \
+        engine.predict_bns('description of section 3', k=2, mode='lexical')
+    assert remote.predict_crime(5, 2024, 7) == engine.predict_crime(5, 2024, 7)
+
+    inputs, predictions = remote.predict_crime_batch(wards=[1, 5], years=[2024], months=range(1, 13))
+    expected_inputs, expected = engine.predict_crime_batch(wards=[1, 5], years=[2024], months=range(1, 13))
+    assert np.array_equal(inputs, expected_inputs)
+    assert predictions.tolist() == expected.tolist()
+    assert remote.cache_stats()['results']['size'] >= 1
+
+
+def test_remote_errors(sidecar):
+    engine, remote = sidecar
+    with pytest.raises(ValueError):
+        remote.predict_bns('query', mode='fuzzy')
+    engine.crime_model = None
+    assert remote.predict_crime(5, 2024, 7) is None
+    assert remote.predict_crime_batch(points=[(5, 2024, 7)])[1] is None
+
+
+def test_remote_rejects_values_the_protocol_cannot_carry(sidecar):
+    _, remote = sidecar
+    for k in (0, 0x10000, 'five'):
+        with pytest.raises(ValueError):
+            remote.predict_bns('query', k=k)
+    with pytest.raises(ValueError):
+        remote.predict_crime(2**31, 2024, 7)
+    with pytest.raises(ValueError):
+        remote.predict_crime_batch(points=[(5, 2**31, 7)])
+    with pytest.raises(ValueError):
+        remote.predict_crime_batch(points=[(5, 2**70, 7)])
+    assert remote.predict_crime(5, 2024, 7) is not None # the connection is still usable
+
+
+def test_unreachable_sidecar_reports_unavailable(tmp_path):
+    remote = RemoteMLService(str(tmp_path / 'missing.sock'), timeout=1)
+    assert remote.status()['state'] == 'unavailable'
+    assert not remote.is_ready() and not remote.is_ready('bns')
+    assert remote.predict_bns('theft') == []
@@ -0,0 +1,145 @@
+from datetime import datetime, timedelta
+
+import mongomock
+import pytest
+
+import jobs
+
+
+class FakeML:
+    def __init__(self, ready=True, state='ready'):
+        self.ready = ready
+        self.state = state
+        self.queries = []
+
+    def is_ready(self, feature=None):
+        return self.ready
+
+    def status(self):
+        return {'state': self.state}
+
+    def predict_bns(self, query, k=5, mode=None):
+        self.queries.append(query)
+        return [{'section': 'BNS_303', 'distance': 0.1, 'rank': 1}]
+
+
+@pytest.fixture
+def db(monkeypatch):
+    monkeypatch.setattr(jobs.Config, 'JOB_RETRY_BASE_SECONDS', 0)
+    return mongomock.MongoClient().db
+
+
+@pytest.fixture
+def fake_ml(monkeypatch):
+    import ml_service
+    fake = FakeML()
+    monkeypatch.setattr(ml_service, 'ml_service', fake)
+    return fake
+
+
+def add_fir(db, language='hi'):
+    db.firs.insert_one({'_id': 'fir-1', 'user_id': 'u1', 'original_text': 'chori hui', 'language': language,
+                        'ai_status': jobs.AI_PENDING, 'ai_suggestions': []})
+    jobs.enqueue(db, jobs.FIR_AI_JOB, {'fir_id': 'fir-1'}, max_attempts=2)
+
+
+def test_fir_ai_job_translates_and_attaches_suggestions(db, fake_ml, monkeypatch):
+    monkeypatch.setattr(jobs, 'translate_to_english', lambda db, text, language: ('theft happened', True))
+    add_fir(db)
+    assert jobs.run_pending(db) == 1
+
+    fir = db.firs.find_one({'_id': 'fir-1'})
+    assert fir['ai_status'] == jobs.AI_DONE
+    assert fir['translated_text'] == 'theft happened'
+    assert fir['ai_suggestions'][0]['section'] == 'BNS_303'
+    assert fake_ml.queries == ['theft happened']
+    assert db.jobs.find_one()['status'] == jobs.JOB_DONE
+
+
+def test_translation_retries_then_falls_back_to_original(db, fake_ml, monkeypatch):
+    monkeypatch.setattr(jobs, 'translate_to_english', lambda db, text, language: (text, False))
+    add_fir(db)
+
+    jobs.run_pending(db, limit=1)
+    job = db.jobs.find_one()
+    assert job['status'] == jobs.JOB_QUEUED and 'Translation unavailable' in job['last_error']
+    assert db.firs.find_one()['ai_status'] == jobs.AI_PENDING
+
+    jobs.run_pending(db) # last attempt: suggestions from the untranslated text
+    fir = db.firs.find_one()
+    assert fir['ai_status'] == jobs.AI_DONE and fir['translated_text'] == 'chori hui'
+
+
+def test_model_loading_is_retried_beyond_max_attempts(db, fake_ml):
+    fake_ml.ready, fake_ml.state = False, 'loading'
+    add_fir(db, language='en')
+    for _ in range(4):
+        jobs.run_pending(db, limit=1)
+    assert db.jobs.find_one()['status'] == jobs.JOB_QUEUED
+    assert db.firs.find_one()['ai_status'] == jobs.AI_PENDING
+
+    fake_ml.ready = True
+    jobs.run_pending(db)
+    assert db.firs.find_one()['ai_status'] == jobs.AI_DONE
+
+
+def test_waiting_for_the_model_keeps_the_translation_retries(db, fake_ml, monkeypatch):
+    monkeypatch.setattr(jobs, 'translate_to_english', lambda db, text, language: (text, False))
+    fake_ml.ready, fake_ml.state = False, 'loading'
+    add_fir(db)
+    for _ in range(4):
+        jobs.run_pending(db, limit=1)
+    assert db.jobs.find_one()['attempts'] == 0
+
+    fake_ml.ready = True
+    jobs.run_pending(db, limit=1) # first real attempt: translation fails and is retried
+    job = db.jobs.find_one()
+    assert job['status'] == jobs.JOB_QUEUED and 'Translation unavailable' in job['last_error']
+    assert db.firs.find_one()['ai_status'] == jobs.AI_PENDING
+
+    jobs.run_pending(db)
+    assert db.firs.find_one()['translated_text'] == 'chori hui'
+
+
+def test_suggestions_follow_a_fir_archived_mid_job(db, fake_ml, monkeypatch):
+    def translate_while_resolved(db, text, language):
+        fir = db.firs.find_one_and_delete({'_id': 'fir-1'})
+        db.archives.insert_one(dict(fir, status='resolved'))
+        return 'theft happened', True
+
+    monkeypatch.setattr(jobs, 'translate_to_english', translate_while_resolved)
+    add_fir(db)
+    jobs.run_pending(db)
+    archived = db.archives.find_one({'_id': 'fir-1'})
+    assert archived['ai_status'] == jobs.AI_DONE and archived['ai_suggestions'][0]['section'] == 'BNS_303'
+    assert db.jobs.find_one()['status'] == jobs.JOB_DONE
+
+
+def test_permanent_failure_marks_fir_failed(db, fake_ml):
+    fake_ml.ready, fake_ml.state = False, 'degraded'
+    add_fir(db, language='en')
+    jobs.run_pending(db)
+    assert db.jobs.find_one()['status'] == jobs.JOB_FAILED
+    fir = db.firs.find_one()
+    assert fir['ai_status'] == jobs.AI_FAILED and fir['ai_error']
+
+
+def test_expired_lease_is_reclaimed(db):
+    jobs.enqueue(db, 'noop', {})
+    job = jobs.claim_job(db, 'worker-a')
+    assert job['attempts'] == 1
+    assert jobs.claim_job(db, 'worker-b') is None
+
+    db.jobs.update_one({'_id': job['_id']}, {'$set': {'lease_until': datetime.utcnow() - timedelta(seconds=1)}})
+    reclaimed = jobs.claim_job(db, 'worker-b')
+    assert reclaimed['_id'] == job['_id'] and reclaimed['worker'] == 'worker-b' and reclaimed['attempts'] == 2
+
+
+def test_station_stats_rebuild_chain_survives_short_intervals(db, monkeypatch):
+    monkeypatch.setattr(jobs.Config, 'STATION_STATS_REBUILD_HOURS', 6)
+    assert jobs.schedule_station_stats_rebuild(db) is not None
+    assert jobs.schedule_station_stats_rebuild(db) is None # another process, same slot
+    job = db.jobs.find_one({'type': jobs.STATION_STATS_JOB})
+    jobs.rebuild_station_stats(db, job) # queues the next 6h slot, usually the same calendar day
+    jobs.rebuild_station_stats(db, job)
+    assert db.jobs.count_documents({'type': jobs.STATION_STATS_JOB}) == 2
@@ -0,0 +1,32 @@
+import numpy as np
+
+import lexical
+
+
+def test_tokenize_folds_case_plurals_and_stopwords():
+    assert lexical.tokenize('The CHEQUES were stolen, injuries!') == ['cheque', 'stolen', 'injury']
+
+
+def test_bm25_ranks_rare_terms_first(tmp_path):
+    texts = ['theft of property', 'theft of a vehicle', 'dowry death and theft', 'criminal intimidation']
+    index = lexical.LexicalIndex.build(texts)
+    scores, ids = index.search('dowry theft', 3)
+    assert ids[0] == 2
+    assert list(ids[1:]) == [0, 1] or list(ids[1:]) == [1, 0]
+    assert np.all(np.diff(scores) <= 0)
+
+    # Postings survive a save/open round trip (opened via mmap)
+    def atomic_write(path, writer):
+        writer(path)
+
+    index.save(str(tmp_path), atomic_write)
+    reopened = lexical.LexicalIndex.open(str(tmp_path))
+    np.testing.assert_allclose(reopened.scores('dowry theft'), index.scores('dowry theft'))
+    assert len(index.search('unrelated words', 3)[1]) == 0
+
+
+def test_fuse_combines_both_rankings():
+    ids, scores = lexical.fuse([0, 1, 2], np.array([0.1, 0.2, 0.9]), [2, 3], np.array([9.0, 1.0]), alpha=0.5)
+    assert ids[0] in (0, 2)
+    assert set(ids) == {0, 1, 2, 3}
+    assert scores == sorted(scores, reverse=True)
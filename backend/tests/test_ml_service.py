@@ -0,0 +1,323 @@
+import threading
+import time
+
+import faiss
+import numpy as np
+import pandas as pd
+import pytest
+
+from bns_assets import SectionTable, build_lexical_index, section_records
+from cache import LRUCache
+from ml_engine import MLService, BnsQueryBatcher, crime_grid, STATE_DEGRADED, STATE_FAILED, STATE_READY
+
+
+class FakeEncoder:
+    """Deterministic stand-in for SentenceTransformer that records batch sizes."""
+
+    def __init__(self, dim=8):
+        self.dim = dim
+        self.batch_sizes = []
+
+    def encode(self, texts):
+        self.batch_sizes.append(len(texts))
+        vecs = [np.random.default_rng(abs(hash(t)) % (2 ** 32)).random(self.dim) for t in texts]
+        return np.asarray(vecs, dtype=np.float32)
+
+
+def make_service(n_sections=20, dim=8):
+    service = object.__new__(MLService)
+    service.initialized = True
+    service.crime_model = None
+    service.crime_cube = None
+    service._crime_model_loaded = True # tests set the crime model/cube directly
+    service._crime_model_lock = threading.Lock()
+    service.use_mock = False
+    service.bns_model = FakeEncoder(dim)
+    service.bns_sections = SectionTable.from_dataframe(pd.DataFrame({
+        'Section': [f'BNS_{i:03d}' for i in range(n_sections)],
+        'Description': [f'Description of section {i}' for i in range(n_sections)],
+    }))
+    embeddings = np.random.default_rng(0).random((n_sections, dim)).astype(np.float32)
+    service.bns_index = faiss.IndexFlatL2(dim)
+    service.bns_index.add(embeddings)
+    service.bns_embeddings = embeddings
+    service.bns_lexical = build_lexical_index(service.bns_sections)
+    service.bns_records = section_records(service.bns_sections)
+    service._bns_batcher = None
+    service.bns_metric = 'l2'
+    service.bns_assets_version = 'v1'
+    service._bns_assets_signature_seen = 'v1'
+    service._bns_assets_checked_at = time.monotonic() # no on-disk asset checks within a test
+    service._bns_reload_lock = threading.Lock()
+    service._embedding_cache = LRUCache(64)
+    service._result_cache = LRUCache(64)
+    service.state = STATE_READY
+    service.load_error = None
+    service.load_seconds = None
+    service._loaded = threading.Event()
+    return service
+
+
+def test_batched_results_match_single_queries():
+    service = make_service()
+    queries = [f'complaint number {i}' for i in range(12)]
+    expected = {q: service.predict_bns(q, k=3) for q in queries}
+    assert all(len(hits) == 3 for hits in expected.values())
+
+    service.bns_model.batch_sizes.clear()
+    service._embedding_cache.clear()
+    service._result_cache.clear()
+    service._bns_batcher = BnsQueryBatcher(service._search_bns_batch, window_ms=50, max_batch=16)
+
+    results = {}
+    barrier = threading.Barrier(len(queries))
+
+    def call(q):
+        barrier.wait()
+        results[q] = service.predict_bns(q, k=3)
+
+    threads = [threading.Thread(target=call, args=(q,)) for q in queries]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert results == expected
+    assert sum(service.bns_model.batch_sizes) == len(queries)
+    assert len(service.bns_model.batch_sizes) < len(queries)
+
+
+def test_batch_respects_per_query_k():
+    service = make_service()
+    hits = service._predict_bns_batch(['a', 'b'], [1, 4])
+    assert [len(h) for h in hits] == [1, 4]
+    assert [h['rank'] for h in hits[1]] == [1, 2, 3, 4]
+    assert hits[0][0]['section'].startswith('BNS_')
+
+
+def test_batcher_propagates_errors():
+    def failing(queries, ks):
+        raise RuntimeError('encoder down')
+
+    batcher = BnsQueryBatcher(failing, window_ms=1, max_batch=4)
+    try:
+        batcher.submit('x', 5)
+    except RuntimeError as e:
+        assert 'encoder down' in str(e)
+    else:
+        raise AssertionError('expected RuntimeError')
+
+
+def test_repeated_queries_skip_the_encoder(monkeypatch):
+    monkeypatch.setattr('config.Config.BNS_ASSETS_CHECK_INTERVAL', 0)
+    service = make_service()
+    first = service.predict_bns('My phone was  stolen', k=3)
+    again = service.predict_bns('my phone was stolen ', k=3)
+    assert again == first
+    assert service.bns_model.batch_sizes == [1]
+    assert service.cache_stats()['results']['hits'] == 1
+
+    # A different k misses the result cache but reuses the cached embedding
+    service.predict_bns('my phone was stolen', k=2)
+    assert service.bns_model.batch_sizes == [1]
+    assert service.cache_stats()['embeddings']['hits'] == 1
+
+
+def test_asset_version_change_invalidates_results(monkeypatch):
+    monkeypatch.setattr('config.Config.BNS_ASSETS_CHECK_INTERVAL', 0)
+    service = make_service()
+    service.predict_bns('cheque bounced', k=3)
+    service.bns_assets_version = 'v2'
+    service.predict_bns('cheque bounced', k=3)
+    assert service.cache_stats()['results']['hits'] == 0
+    assert service.cache_stats()['embeddings']['hits'] == 1
+
+
+def test_cached_results_are_not_shared_with_callers(monkeypatch):
+    monkeypatch.setattr('config.Config.BNS_ASSETS_CHECK_INTERVAL', 0)
+    service = make_service()
+    service.predict_bns('dowry harassment', k=2)[0]['section'] = 'tampered'
+    assert service.predict_bns('dowry harassment', k=2)[0]['section'] != 'tampered'
+
+
+class FakeCrimeModel:
+    def predict(self, frame):
+        return [41.6] * len(frame)
+
+
+def test_readiness_states_after_loading(monkeypatch):
+    service = make_service()
+    monkeypatch.setattr(service, '_load_models', lambda: None)
+
+    service.crime_model = FakeCrimeModel()
+    service._load_and_warm_up()
+    assert service.state == STATE_READY and service.wait_until_loaded(0)
+    # Warm-up went through the encoder but did not populate the result cache
+    assert service.bns_model.batch_sizes == [1]
+    assert len(service._result_cache) == 0
+
+    service.crime_model = None
+    service._load_and_warm_up()
+    assert service.state == STATE_DEGRADED
+    assert service.status() == {'state': STATE_DEGRADED, 'bns': True, 'crime': False, 'error': None, 'load_seconds': service.load_seconds}
+
+    service.bns_model = None
+    service._load_and_warm_up()
+    assert service.state == STATE_FAILED
+    assert not service.is_ready()
+
+
+def make_legal_service():
+    service = make_service(n_sections=4)
+    service.bns_sections = SectionTable.from_dataframe(pd.DataFrame({
+        'Section': ['BNS_080', 'BNS_078', 'BNS_303', 'BNS_318'],
+        'Description': ['Dowry death of a woman', 'Stalking a woman', 'Theft of movable property', 'Cheating by cheque'],
+    }))
+    service.bns_lexical = build_lexical_index(service.bns_sections)
+    service.bns_records = section_records(service.bns_sections)
+    return service
+
+
+def test_lexical_mode_skips_the_encoder():
+    service = make_legal_service()
+    hits = service.predict_bns('he keeps stalking me', k=2, mode='lexical')
+    assert [h['section'] for h in hits] == ['BNS_078']
+    assert hits[0]['distance'] is None and hits[0]['score'] > 0
+    assert service.bns_model.batch_sizes == []
+
+
+def test_hybrid_promotes_exact_legal_terms(monkeypatch):
+    monkeypatch.setattr('config.Config.BNS_HYBRID_ALPHA', 0.3)
+    service = make_legal_service()
+    hits = service.predict_bns('my cheque bounced', k=4, mode='hybrid')
+    assert hits[0]['section'] == 'BNS_318'
+    assert len(hits) == 4
+    # Every fused hit still carries an exact dense distance
+    assert all(isinstance(h['distance'], float) for h in hits)
+    assert service.bns_model.batch_sizes == [1]
+
+
+def test_hybrid_fast_path_on_strong_lexical_hit(monkeypatch):
+    monkeypatch.setattr('config.Config.BNS_LEXICAL_FASTPATH_SCORE', 0.5)
+    service = make_legal_service()
+    hits = service.predict_bns('dowry', k=3, mode='hybrid')
+    assert hits[0]['section'] == 'BNS_080'
+    assert service.bns_model.batch_sizes == []
+
+
+def test_section_records_are_read_only_and_results_are_copies():
+    service = make_service(n_sections=3)
+    record = service.bns_records[1]
+    assert record['section'] == record['Section'] == 'BNS_001'
+    try:
+        record['section'] = 'tampered'
+        assert False, 'records should be immutable'
+    except TypeError:
+        pass
+
+    hits = service._format_bns_hits([1], distances=[0.5])
+    hits[0]['section'] = 'changed'
+    assert service.bns_records[1]['section'] == 'BNS_001'
+
+
+def make_crime_service():
+    from sklearn.ensemble import RandomForestRegressor
+
+    service = make_service()
+    rng = np.random.default_rng(0)
+    X = pd.DataFrame({'Ward': rng.integers(1, 10, 200), 'Year': rng.integers(2018, 2024, 200),
+                      'Month': rng.integers(1, 13, 200)})
+    y = X['Ward'] * 3 + X['Month'] + rng.random(200)
+    service.crime_model = RandomForestRegressor(n_estimators=5, random_state=0).fit(X, y)
+    return service
+
+
+def test_crime_grid_is_ward_major():
+    grid = crime_grid([1, 2], [2024], [1, 2, 3])
+    assert grid.tolist() == [[1, 2024, 1], [1, 2024, 2], [1, 2024, 3],
+                             [2, 2024, 1], [2, 2024, 2], [2, 2024, 3]]
+
+
+def test_predict_crime_batch_matches_single_predictions():
+    service = make_crime_service()
+    inputs, predictions = service.predict_crime_batch(wards=[1, 5, 9], years=[2024], months=range(1, 13))
+    assert inputs.shape == (36, 3) and predictions.shape == (36,)
+    for (ward, year, month), prediction in zip(inputs.tolist(), predictions.tolist()):
+        assert prediction == service.predict_crime(ward, year, month)
+
+    inputs, predictions = service.predict_crime_batch(points=[(5, 2024, 7), (1, 2023, 1)])
+    assert predictions.tolist() == [service.predict_crime(5, 2024, 7), service.predict_crime(1, 2023, 1)]
+
+
+def test_predict_crime_batch_without_model():
+    inputs, predictions = make_service().predict_crime_batch(points=[(1, 2024, 1)])
+    assert predictions is None and inputs.shape == (1, 3)
+
+
+def test_crime_cube_answers_without_the_model(tmp_path):
+    from crime_cube import CrimeCube
+
+    trained = make_crime_service()
+    path = str(tmp_path / 'crime_cube.npy')
+    CrimeCube.build(trained.crime_model, wards=[1, 5, 9], years=[2023, 2025]).save(path)
+
+    service = make_service()
+    service.crime_cube = CrimeCube.open(path)
+    assert service.is_ready('crime')
+    for ward, year, month in [(1, 2023, 1), (5, 2024, 7), (9, 2025, 12)]:
+        assert service.predict_crime(ward, year, month) == trained.predict_crime(ward, year, month)
+    # Outside the cube with no model to fall back to
+    assert service.predict_crime(2, 2024, 1) is None
+    assert service.predict_crime(1, 2030, 1) is None
+
+    inputs, predictions = service.predict_crime_batch(wards=[1, 9], years=[2024], months=range(1, 13))
+    assert predictions.tolist() == trained.predict_crime_batch(points=inputs)[1].tolist()
+
+
+def test_crime_cube_falls_back_to_model_outside_range(tmp_path):
+    from crime_cube import CrimeCube
+
+    service = make_crime_service()
+    path = str(tmp_path / 'crime_cube.npy')
+    CrimeCube.build(service.crime_model, wards=[1], years=[2024]).save(path)
+    service.crime_cube = CrimeCube.open(path)
+
+    points = [(1, 2024, 3), (5, 2022, 8)]
+    _, predictions = service.predict_crime_batch(points=points)
+    assert predictions.tolist() == [service.predict_crime(*p) for p in points]
+    assert service.predict_crime(5, 2022, 8) is not None
+
+
+def test_predict_crime_batch_rejects_oversized_grids_before_building_them(monkeypatch):
+    import crime_cube
+    monkeypatch.setattr(crime_cube.np, 'meshgrid', lambda *a, **k: pytest.fail('grid was built'))
+    with pytest.raises(ValueError, match='exceeds the limit'):
+        make_service().predict_crime_batch(wards=range(1, 1001), years=range(1, 1001), months=range(1, 13))
+
+
+def test_out_of_range_batch_inputs_are_rejected(monkeypatch):
+    from flask import Flask
+    from flask_jwt_extended import JWTManager, create_access_token
+
+    import routes.intelligence_routes as intelligence_routes
+
+    service = make_crime_service()
+    with pytest.raises(ValueError):
+        service.predict_crime_batch(points=[(1, 10 ** 20, 1)])
+    with pytest.raises(ValueError):
+        service.predict_crime_batch(wards=[1], years=[10 ** 20], months=[1])
+
+    monkeypatch.setattr(intelligence_routes, 'ml_service', service)
+    app = Flask(__name__)
+    app.config['JWT_SECRET_KEY'] = 'test-secret-key-with-enough-length'
+    JWTManager(app)
+    app.register_blueprint(intelligence_routes.intelligence_bp, url_prefix='/api/intelligence')
+    with app.app_context():
+        headers = {'Authorization': f"Bearer {create_access_token(identity='p1')}"}
+    client = app.test_client()
+    for body in ({'wards': [1], 'years': [10 ** 20]}, {'points': [[1, 10 ** 20, 1]]},
+                 {'wards': [1], 'years': {'start': 2024, 'end': 10 ** 20}}, {'points': [[1, 2024, 13]]}):
+        resp = client.post('/api/intelligence/predict_crime/batch', json=body, headers=headers)
+        assert resp.status_code == 400, body
+    resp = client.post('/api/intelligence/predict_crime/batch', json={'points': [[1, 2024, 1]]}, headers=headers)
+    assert resp.status_code == 200
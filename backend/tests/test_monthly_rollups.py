@@ -0,0 +1,77 @@
+from datetime import datetime
+
+import mongomock
+import pytest
+
+import monthly_rollups
+
+
+@pytest.fixture
+def db():
+    return mongomock.MongoClient().db
+
+
+def file_fir(db, fir_id, date, station='s1'):
+    fir = {'_id': fir_id, 'station_id': station, 'status': 'pending', 'submission_date': date, 'last_updated': date}
+    db.firs.insert_one(fir)
+    monthly_rollups.record_submitted(db, fir)
+    return fir
+
+
+def archive(db, fir, when):
+    db.archives.insert_one(dict(fir, status='resolved', last_updated=when))
+    db.firs.delete_one({'_id': fir['_id']})
+    monthly_rollups.record_archived(db, fir, 'resolved', when)
+
+
+def test_last_months_are_calendar_months_across_years(db):
+    file_fir(db, 'a', datetime(2023, 11, 30))
+    file_fir(db, 'b', datetime(2024, 2, 1))
+    file_fir(db, 'c', datetime(2023, 2, 10)) # same month a year earlier must not be merged in
+    rows = monthly_rollups.last_months(db, 's1', 6, today=datetime(2024, 2, 29))
+    assert [row['period'] for row in rows] == ['2023-09', '2023-10', '2023-11', '2023-12', '2024-01', '2024-02']
+    assert monthly_rollups.chart_series(rows) == (['Sep', 'Oct', 'Nov', 'Dec', 'Jan', 'Feb'], [0, 0, 1, 0, 0, 1])
+
+
+def test_year_over_year(db):
+    file_fir(db, 'a', datetime(2023, 3, 1))
+    file_fir(db, 'b', datetime(2024, 3, 1))
+    file_fir(db, 'c', datetime(2024, 3, 9))
+    data = monthly_rollups.year_over_year(db, 's1', 2024)
+    assert [row['submitted'] for row in data[2023]][2] == 1
+    assert [row['submitted'] for row in data[2024]][2] == 2
+    assert len(data[2023]) == len(data[2024]) == 12
+
+
+def test_incremental_rollups_match_a_rebuild(db):
+    a = file_fir(db, 'a', datetime(2024, 1, 15))
+    file_fir(db, 'b', datetime(2024, 1, 20))
+    file_fir(db, 'c', datetime(2024, 2, 2), station='s2')
+    archive(db, a, datetime(2024, 3, 1))
+
+    def snapshot():
+        return {station: monthly_rollups.months_range(db, station, (2024, 1), (2024, 3)) for station in ('s1', 's2')}
+    incremental = snapshot()
+
+    db.monthly_rollups.update_one({'_id': 's1:2024-01'}, {'$inc': {'submitted': 7}}) # drift
+    db.monthly_rollups.insert_one({'_id': 's1:1999-01', 'station_id': 's1', 'period': '1999-01', 'submitted': 3})
+    assert monthly_rollups.rebuild(db) == 3
+    assert snapshot() == incremental
+    assert incremental['s1'][2]['archived'] == {'resolved': 1}
+    assert db.monthly_rollups.count_documents({'period': '1999-01'}) == 0
+
+
+def test_range_validation(db):
+    with pytest.raises(ValueError):
+        monthly_rollups.months_range(db, 's1', (2024, 5), (2024, 1))
+    with pytest.raises(ValueError):
+        monthly_rollups.months_range(db, 's1', (2000, 1), (2024, 1))
+
+
+def test_parse_period_and_range_cap():
+    assert monthly_rollups.parse_period('2024-03') == (2024, 3)
+    for bad in ('2024-13', '2024-3', '24-03', '', None):
+        with pytest.raises(ValueError):
+            monthly_rollups.parse_period(bad)
+    with pytest.raises(ValueError):
+        monthly_rollups.months_range(None, 's1', (2000, 1), (2024, 12))
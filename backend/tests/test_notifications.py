@@ -0,0 +1,90 @@
+import json
+from datetime import datetime
+
+import mongomock
+import pytest
+
+import notifications
+
+
+@pytest.fixture
+def db():
+    return mongomock.MongoClient().db
+
+
+@pytest.fixture
+def hub(monkeypatch):
+    hub = notifications.NotificationHub(max_streams=2)
+    monkeypatch.setattr(notifications, 'hub', hub)
+    return hub
+
+
+def make(n, user_id='u1'):
+    return {'_id': f'n{n}', 'user_id': user_id, 'message': f'message {n}', 'is_read': False,
+            'created_at': datetime(2024, 1, 1, 0, n)}
+
+
+def test_counters_follow_create_and_read(db, hub):
+    notifications.create(db, [make(1), make(2), make(3), make(4, 'u2')])
+    assert notifications.unread_count(db, 'u1') == 3
+    assert notifications.mark_read(db, 'u1', 'n1') == 1
+    assert notifications.mark_read(db, 'u1', 'n1') == 0 # already read: no double decrement
+    assert notifications.mark_read(db, 'u2', 'n2') == 0 # someone else's
+    assert notifications.unread_count(db, 'u1') == 2
+    assert notifications.mark_all_read(db, 'u1') == 2
+    assert notifications.unread_count(db, 'u1') == 0
+    assert notifications.unread_count(db, 'u2') == 1
+
+
+def test_unread_count_is_initialised_from_existing_notifications(db):
+    db.notifications.insert_many([make(1), dict(make(2), is_read=True)])
+    assert notifications.unread_count(db, 'u1') == 1
+    assert db.notification_counts.find_one({'_id': 'u1'})['unread'] == 1
+
+
+def test_counter_is_seeded_before_the_first_change(db, hub):
+    # Unread notifications from before the counters existed
+    db.notifications.insert_many([make(1), make(2)])
+    notifications.create(db, [make(3)])
+    assert notifications.unread_count(db, 'u1') == 3
+
+    db.notifications.insert_many([make(4, 'u2'), make(5, 'u2')])
+    assert notifications.mark_read(db, 'u2', 'n4') == 1
+    assert notifications.unread_count(db, 'u2') == 1
+
+
+def test_counter_never_goes_negative_and_reconcile_repairs_it(db, hub):
+    notifications.create(db, [make(1)])
+    db.notification_counts.update_one({'_id': 'u1'}, {'$set': {'unread': 0}}) # drifted
+    assert notifications.mark_read(db, 'u1', 'n1') == 1
+    assert db.notification_counts.find_one({'_id': 'u1'})['unread'] == 0
+
+    db.notifications.insert_many([make(2), make(3, 'u2')])
+    db.notification_counts.insert_one({'_id': 'u3', 'unread': 4})
+    assert notifications.reconcile(db) == 3
+    assert [notifications.unread_count(db, u) for u in ('u1', 'u2', 'u3')] == [1, 1, 0]
+
+
+def test_hub_delivers_only_to_the_recipient_and_caps_streams(db, hub):
+    mine, other = hub.subscribe('u1'), hub.subscribe('u2')
+    assert hub.subscribe('u3') is None
+    notifications.create(db, [make(1)])
+    assert mine.get_nowait()['_id'] == 'n1' and other.empty()
+
+    hub.change_stream_active = True # every process hears inserts from Mongo instead
+    notifications.create(db, [make(2)])
+    assert mine.empty()
+
+
+def test_stream_sends_unread_count_then_notifications(db, hub):
+    q = hub.subscribe('u1')
+    notifications.create(db, [make(1)])
+    frames = list(notifications.stream(db, 'u1', q, heartbeat=0.01, max_seconds=0.05))
+    events = [f for f in frames if f.startswith('event:')]
+    assert frames[0].startswith('retry:')
+    assert events[0] == 'event: unread\ndata: {"unread": 1}\n\n'
+    payload = json.loads(events[1].split('data: ', 1)[1])
+    assert events[1].startswith('event: notification') and payload['message'] == 'message 1'
+    assert payload['created_at'] == '2024-01-01T00:01:00'
+    assert ': keep-alive\n\n' in frames
+    assert hub.stream_count() == 0 # unsubscribed when the stream ends
@@ -0,0 +1,137 @@
+from datetime import datetime, timedelta
+
+import mongomock
+import pytest
+
+import pagination
+
+BASE = datetime(2024, 1, 1)
+
+
+def make_firs(collection, count, user_id='u', start=0):
+    # Pairs share a submission_date so the _id tie-break is exercised
+    for i in range(start, start + count):
+        collection.insert_one({'_id': f'fir-{i:03d}', 'user_id': user_id, 'submission_date': BASE + timedelta(hours=i // 2),
+                               'status': 'pending', 'original_text': 'x' * 100, 'ai_suggestions': [{'section': '303'}]})
+
+
+def walk(fetch):
+    ids, cursor = [], None
+    while True:
+        docs, next_cursor = fetch(cursor)
+        ids.extend(doc['_id'] for doc in docs)
+        if next_cursor is None:
+            return ids
+        cursor = pagination.decode_cursor(next_cursor)
+
+
+def test_cursor_round_trip():
+    token = pagination.encode_cursor(BASE, 'fir-001')
+    assert pagination.decode_cursor(token) == (BASE, 'fir-001')
+    assert pagination.decode_cursor(pagination.encode_cursor(None, 'fir-002')) == (None, 'fir-002')
+    with pytest.raises(ValueError):
+        pagination.decode_cursor('not-a-cursor')
+
+
+def test_parse_page_args():
+    assert pagination.parse_page_args({}) == (pagination.DEFAULT_LIMIT, None)
+    assert pagination.parse_page_args({'limit': '10000'})[0] == pagination.MAX_LIMIT
+    for bad in ({'limit': 'ten'}, {'limit': '0'}, {'cursor': '!!'}):
+        with pytest.raises(ValueError):
+            pagination.parse_page_args(bad)
+
+
+def test_pages_cover_every_document_once_in_order():
+    db = mongomock.MongoClient().db
+    make_firs(db.firs, 25)
+    ids = walk(lambda cursor: pagination.fetch_page(db.firs, {'user_id': 'u'}, 'submission_date', 4, cursor))
+    expected = [doc['_id'] for doc in db.firs.find().sort(pagination.sort_spec('submission_date'))]
+    assert ids == expected and len(ids) == 25
+
+
+def test_pages_are_stable_when_new_documents_arrive():
+    db = mongomock.MongoClient().db
+    make_firs(db.firs, 10)
+    first, token = pagination.fetch_page(db.firs, {}, 'submission_date', 5)
+    make_firs(db.firs, 4, start=100) # newer than everything
+    second, _ = pagination.fetch_page(db.firs, {}, 'submission_date', 5, pagination.decode_cursor(token))
+    assert not {d['_id'] for d in first} & {d['_id'] for d in second}
+    assert len(first) + len(second) == 10
+
+
+def test_default_projection_drops_heavy_fields():
+    db = mongomock.MongoClient().db
+    make_firs(db.firs, 2)
+    docs, _ = pagination.fetch_page(db.firs, {}, 'submission_date', 5, projection=pagination.list_projection(None))
+    assert all('original_text' not in d and 'ai_suggestions' not in d and 'status' in d for d in docs)
+
+    projection = pagination.list_projection('status, original_text')
+    docs, _ = pagination.fetch_page(db.firs, {}, 'submission_date', 5, projection=projection)
+    assert set(docs[0]) == {'_id', 'status', 'original_text', 'submission_date'}
+    with pytest.raises(ValueError):
+        pagination.list_projection('status,$where')
+
+
+def test_merged_pages_interleave_two_collections():
+    db = mongomock.MongoClient().db
+    make_firs(db.firs, 9)
+    make_firs(db.archives, 8, start=9)
+    db.archives.insert_one({'_id': 'old', 'user_id': 'u', 'submission_date': BASE - timedelta(days=1)})
+
+    def fetch(cursor):
+        pages = [pagination.find_page(c, {'user_id': 'u'}, 'submission_date', 5, cursor) for c in (db.firs, db.archives)]
+        assert all(len(page) <= 6 for page in pages)
+        return pagination.merge_pages('submission_date', 5, *pages)
+
+    ids = walk(fetch)
+    assert len(ids) == len(set(ids)) == 18
+    assert ids[0] == 'fir-016' and ids[-1] == 'old'
+
+
+def test_union_pipeline_limits_each_branch_before_the_union():
+    cursor = (BASE + timedelta(hours=1), 'fir-003')
+    pipeline = pagination.union_pipeline({'user_id': 'u'}, 'submission_date', 5, cursor, {'status': 1}, ['archives'])
+    branch = pipeline[:4]
+    union = pipeline[4]['$unionWith']
+    assert union['coll'] == 'archives' and union['pipeline'] == branch
+    assert branch[1] == {'$sort': {'submission_date': -1, '_id': -1}} and branch[2] == {'$limit': 6}
+    assert branch[3] == {'$project': {'status': 1, 'submission_date': 1}}
+    assert pipeline[5:] == [{'$sort': {'submission_date': -1, '_id': -1}}, {'$limit': 6}]
+
+    # mongomock has no $unionWith, but the branch itself must return the right page
+    db = mongomock.MongoClient().db
+    make_firs(db.firs, 10)
+    docs = list(db.firs.aggregate(branch))
+    assert [d['_id'] for d in docs] == ['fir-002', 'fir-001', 'fir-000']
+
+
+def test_union_page_falls_back_to_merging_on_old_servers():
+    from pymongo.errors import OperationFailure
+
+    db = mongomock.MongoClient().db
+    make_firs(db.firs, 3)
+    make_firs(db.archives, 3, start=3)
+    firs = db.firs
+
+    def aggregate(pipeline):
+        raise OperationFailure("Unrecognized pipeline stage name: '$unionWith'", code=40324)
+    firs.aggregate = aggregate
+
+    docs, token = pagination.fetch_union_page(firs, ['archives'], {'user_id': 'u'}, 'submission_date', 4)
+    assert [d['_id'] for d in docs] == ['fir-005', 'fir-004', 'fir-003', 'fir-002'] and token
+
+
+def test_pages_continue_through_documents_without_a_date():
+    db = mongomock.MongoClient().db
+    make_firs(db.firs, 3)
+    db.firs.insert_many([{'_id': f'undated-{i}', 'user_id': 'u'} for i in range(3)])
+    ids = walk(lambda cursor: pagination.fetch_page(db.firs, {'user_id': 'u'}, 'submission_date', 2, cursor))
+    assert ids == ['fir-002', 'fir-001', 'fir-000', 'undated-2', 'undated-1', 'undated-0']
+
+
+def test_requests_without_a_limit_get_one_bounded_page():
+    db = mongomock.MongoClient().db
+    make_firs(db.firs, 250)
+    limit, cursor = pagination.parse_page_args({})
+    docs, next_cursor = pagination.fetch_page(db.firs, {}, 'submission_date', limit, cursor)
+    assert len(docs) == pagination.DEFAULT_LIMIT and next_cursor
@@ -0,0 +1,75 @@
+import mongomock
+import pytest
+from flask import Flask, g, jsonify
+from flask_jwt_extended import JWTManager, create_access_token
+
+import principal
+
+
+class CountingCollection:
+    """Wraps a mongomock collection to count the find_one round trips."""
+
+    def __init__(self, collection):
+        self.collection = collection
+        self.lookups = 0
+
+    def find_one(self, *args, **kwargs):
+        self.lookups += 1
+        return self.collection.find_one(*args, **kwargs)
+
+
+@pytest.fixture
+def setup(monkeypatch):
+    db = mongomock.MongoClient().db
+    officer_id = db.police.insert_one({'username': 'officer', 'full_name': 'A', 'station_id': '100',
+                                       'password_hash': 'secret'}).inserted_id
+    police = CountingCollection(db.police)
+    fake_db = {'police': police, 'users': db.users}
+    monkeypatch.setattr(principal, 'get_db', lambda: fake_db)
+    monkeypatch.setattr(principal, '_cache', principal.LRUCache(16, ttl=60))
+
+    app = Flask(__name__)
+    app.config['JWT_SECRET_KEY'] = 'test-secret-key-with-enough-length'
+    JWTManager(app)
+
+    @app.route('/page')
+    @principal.principal_required('police', on_missing=lambda: ('login', 302))
+    def page():
+        return jsonify({k: str(v) for k, v in g.principal.items()})
+
+    with app.app_context():
+        token = create_access_token(identity=str(officer_id), additional_claims={'role': 'police', 'station_id': '200'})
+        citizen = create_access_token(identity=str(officer_id), additional_claims={'role': 'citizen'})
+    return app.test_client(), db, police, officer_id, token, citizen
+
+
+def test_principal_is_cached_and_claims_win(setup):
+    client, db, police, officer_id, token, _ = setup
+    headers = {'Authorization': f'Bearer {token}'}
+    for _ in range(3):
+        body = client.get('/page', headers=headers).get_json()
+    assert police.lookups == 1
+    assert body['full_name'] == 'A' and 'password_hash' not in body
+    assert body['station_id'] == '200' and body['role'] == 'police' # from the token
+
+    db.police.update_one({'_id': officer_id}, {'$set': {'full_name': 'B'}})
+    principal.invalidate(officer_id, 'police')
+    assert client.get('/page', headers=headers).get_json()['full_name'] == 'B'
+    assert police.lookups == 2
+
+
+def test_missing_user_and_wrong_role_take_the_fallback(setup):
+    client, db, police, officer_id, token, citizen = setup
+    assert client.get('/page', headers={'Authorization': f'Bearer {citizen}'}).status_code == 302
+    db.police.delete_one({'_id': officer_id})
+    principal.invalidate(officer_id)
+    assert client.get('/page', headers={'Authorization': f'Bearer {token}'}).status_code == 302
+    assert client.get('/page').status_code == 401
+
+
+def test_load_user_returns_copies(setup):
+    _, _, police, officer_id, _, _ = setup
+    user = principal.load_user({'police': police}, 'police', officer_id)
+    user['full_name'] = 'changed'
+    assert principal.load_user({'police': police}, 'police', officer_id)['full_name'] == 'A'
+    assert principal.load_user({'police': police}, 'police', 'not-an-object-id') is None
@@ -0,0 +1,51 @@
+import script_detect
+import translation
+from translation import IdentityProvider, Translator
+
+
+def test_english_needs_no_translation():
+    assert script_detect.translation_spans('Someone stole my phone near the station.') == \
+        [('Someone stole my phone near the station.', False)]
+
+
+def test_regional_scripts_need_translation():
+    for text in ('मेरा फोन चोरी हो गया', 'আমার ফোন চুরি হয়েছে', 'என் தொலைபேசி திருடப்பட்டது'):
+        assert script_detect.translation_spans(text) == [(text, True)]
+
+
+def test_romanized_hindi_needs_translation():
+    assert script_detect.translation_spans('mera phone chori ho gaya') == [('mera phone chori ho gaya', True)]
+
+
+def test_romanized_text_without_marker_words_follows_the_claimed_language():
+    text = 'bhai bola chor bhaag nikla'
+    assert script_detect.translation_spans(text, 'hi') == [(text, True)]
+    assert script_detect.translation_spans(text, 'en') == [(text, False)]
+    # "the" is English, not the Hindi "the" (were)
+    assert script_detect.latin_language('the phone') == 'en'
+
+
+def test_mixed_text_only_translates_regional_spans():
+    spans = script_detect.translation_spans('मेरा phone चोरी हो गया. I was at the bus stop near the market')
+    assert spans == [('मेरा phone चोरी हो गया. ', True), ('I was at the bus stop near the market', False)]
+
+
+def test_to_english_stitches_translated_spans(monkeypatch):
+    class Tagger(IdentityProvider):
+        def translate(self, text, target='en'):
+            self.calls += 1
+            return f'<{text}>'
+
+    provider = Tagger()
+    monkeypatch.setattr(translation, '_translator', Translator(provider, batch_window_ms=0))
+    before = script_detect.stats()
+
+    text, ok = translation.to_english('मेरा फोन चोरी हो गया. I was at the bus stop near the market', 'hi')
+    assert ok and text == '<मेरा फोन चोरी हो गया.> I was at the bus stop near the market'
+
+    assert translation.to_english('My bike was stolen from the parking lot', 'bn') == \
+        ('My bike was stolen from the parking lot', True)
+    assert provider.calls == 1
+    after = script_detect.stats()
+    assert after['translator_calls_avoided'] == before['translator_calls_avoided'] + 1
+    assert after['mixed'] == before['mixed'] + 1
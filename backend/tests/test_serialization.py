@@ -0,0 +1,69 @@
+import json
+from datetime import datetime
+
+import mongomock
+import numpy as np
+import pytest
+from bson import ObjectId
+from flask import Flask, jsonify
+
+import serialization
+
+DOC = {'_id': ObjectId('65a1b2c3d4e5f60718293a4b'), 'submission_date': datetime(2024, 1, 2, 3, 4, 5, 600000),
+       'ai_suggestions': [{'section': '303', 'distance': np.float32(0.5)}], 'translated_text': 'चोरी'}
+EXPECTED = {'_id': '65a1b2c3d4e5f60718293a4b', 'submission_date': '2024-01-02T03:04:05.600000',
+            'ai_suggestions': [{'section': '303', 'distance': 0.5}], 'translated_text': 'चोरी'}
+
+
+@pytest.fixture
+def app():
+    app = Flask(__name__)
+    app.json = serialization.JSONProvider(app)
+    return app
+
+
+@pytest.mark.parametrize('use_orjson', [True, False])
+def test_dumps_handles_bson_types(monkeypatch, use_orjson):
+    if not use_orjson:
+        monkeypatch.setattr(serialization, 'orjson', None)
+    assert json.loads(serialization.dumps(DOC)) == EXPECTED
+    with pytest.raises(TypeError):
+        serialization.dumps({'x': object()})
+
+
+def test_jsonify_uses_the_provider(app):
+    with app.app_context():
+        resp = jsonify(DOC)
+    assert resp.mimetype == 'application/json'
+    assert json.loads(resp.get_data()) == EXPECTED
+
+
+def test_streamed_array_and_ndjson_match_the_documents(app):
+    db = mongomock.MongoClient().db
+    db.archives.insert_many([{'_id': f'f{i}', 'n': i, 'at': datetime(2024, 1, 1)} for i in range(50)])
+
+    @app.route('/array')
+    def array():
+        return serialization.stream_response(db.archives.find().sort('n', 1))
+
+    @app.route('/ndjson')
+    def ndjson():
+        return serialization.stream_response(db.archives.find().sort('n', 1), ndjson=True)
+
+    @app.route('/empty')
+    def empty():
+        return serialization.stream_response(db.archives.find({'n': -1}), ndjson=True)
+
+    client = app.test_client()
+    docs = client.get('/array').get_json()
+    assert [doc['n'] for doc in docs] == list(range(50)) and docs[0]['at'] == '2024-01-01T00:00:00'
+    lines = client.get('/ndjson').get_data().splitlines()
+    assert [json.loads(line)['_id'] for line in lines] == [f'f{i}' for i in range(50)]
+    assert client.get('/empty').get_data() == b''
+
+
+def test_chunks_are_flushed_by_size():
+    chunks = list(serialization.iter_array(({'n': i} for i in range(100)), chunk_bytes=64))
+    assert len(chunks) > 1
+    assert json.loads(b''.join(chunks)) == [{'n': i} for i in range(100)]
+    assert b''.join(serialization.iter_array([])) == b'[]\n'
@@ -0,0 +1,67 @@
+from datetime import datetime
+
+import mongomock
+import pytest
+
+import jobs
+import station_stats
+
+
+@pytest.fixture
+def db():
+    return mongomock.MongoClient().db
+
+
+def submit(db, fir_id, station='s1', date=datetime(2024, 3, 5), status='pending'):
+    fir = {'_id': fir_id, 'station_id': station, 'status': status, 'submission_date': date}
+    db.firs.insert_one(fir)
+    station_stats.record_submitted(db, fir)
+
+
+def resolve(db, fir_id):
+    fir = db.firs.find_one({'_id': fir_id})
+    db.archives.insert_one(dict(fir, status='resolved'))
+    db.firs.delete_one({'_id': fir_id})
+    station_stats.record_transition(db, fir['station_id'], fir['status'], 'resolved', archived=True)
+
+
+def test_incremental_counters_match_a_rebuild(db):
+    submit(db, 'a')
+    submit(db, 'b', date=datetime(2024, 4, 1))
+    submit(db, 'c')
+    submit(db, 'd', station='s2', date=datetime(2023, 12, 31))
+    db.firs.update_one({'_id': 'b'}, {'$set': {'status': 'in_progress'}})
+    station_stats.record_transition(db, 's1', 'pending', 'in_progress')
+    resolve(db, 'c')
+
+    incremental = {d['_id']: d for d in db.station_stats.find()}
+    assert incremental['s1']['active'] == {'pending': 1, 'in_progress': 1}
+    assert station_stats.summary(incremental['s1']) == {'total': 3, 'resolved': 1, 'pending': 1, 'rejected': 0}
+
+    db.station_stats.update_one({'_id': 's1'}, {'$inc': {'active.pending': 40}}) # drift
+    assert station_stats.rebuild(db) == 2
+    rebuilt = db.station_stats.find_one({'_id': 's1'})
+    assert rebuilt['active'] == {'pending': 1, 'in_progress': 1}
+    assert rebuilt['archived'] == {'resolved': 1}
+
+
+def test_unsafe_status_values_are_bucketed(db):
+    station_stats.record_transition(db, 's1', 'pending', 'a.b$c')
+    assert db.station_stats.find_one({'_id': 's1'})['active'] == {'pending': -1, 'other': 1}
+
+
+def test_get_stats_builds_a_missing_station(db):
+    db.firs.insert_one({'_id': 'a', 'station_id': 's1', 'status': 'pending', 'submission_date': datetime(2024, 1, 1)})
+    assert station_stats.get_stats(db, 's1')['active'] == {'pending': 1}
+    assert station_stats.get_stats(db, 'empty')['active'] == {}
+
+
+def test_rebuild_job_runs_once_a_day(db):
+    assert jobs.schedule_station_stats_rebuild(db) is not None
+    assert jobs.schedule_station_stats_rebuild(db) is None
+    submit(db, 'a')
+    db.station_stats.delete_many({})
+    assert jobs.run_pending(db) == 1
+    assert db.station_stats.find_one({'_id': 's1'})['active'] == {'pending': 1}
+    # the next run is queued for tomorrow
+    assert db.jobs.count_documents({'type': jobs.STATION_STATS_JOB, 'status': jobs.JOB_QUEUED}) == 1
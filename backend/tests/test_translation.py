@@ -0,0 +1,101 @@
+import threading
+
+import mongomock
+
+from translation import CircuitBreaker, IdentityProvider, TranslationProvider, Translator, content_key
+
+
+class UpperProvider(TranslationProvider):
+    """Deterministic fake 'translation' that records every provider call."""
+    name = 'upper'
+    max_chars = 200
+
+    def __init__(self, fail=False):
+        self.calls = []
+        self.fail = fail
+
+    def translate(self, text, target='en'):
+        self.calls.append(text)
+        if self.fail:
+            raise ConnectionError('provider down')
+        return text.upper()
+
+
+def test_cache_and_store_mean_duplicates_are_translated_once():
+    provider = UpperProvider()
+    store = mongomock.MongoClient().db.translations
+    translator = Translator(provider, collection=store, batch_window_ms=0)
+
+    first = translator.translate('chori ho gayi')
+    assert (first.text, first.translated, first.source) == ('CHORI HO GAYI', True, 'provider')
+    assert translator.translate('  chori ho gayi ').source == 'cache'
+    # A new process (empty LRU) still finds it in Mongo, keyed by hash only
+    fresh = Translator(provider, collection=store, batch_window_ms=0)
+    assert fresh.translate('chori ho gayi').source == 'store'
+    assert len(provider.calls) == 1
+    doc = store.find_one({'_id': content_key('chori ho gayi')})
+    assert doc['translation'] == 'CHORI HO GAYI' and 'chori ho gayi' not in doc.values()
+
+
+def test_misses_are_batched_into_few_provider_calls():
+    provider = UpperProvider()
+    translator = Translator(provider, batch_window_ms=0)
+    texts = [f'text number {i}' for i in range(10)] + ['text number 0']
+    results = translator.translate_many(texts)
+    assert [r.text for r in results] == [t.upper() for t in texts]
+    assert translator.counters['provider_texts'] == 10
+    assert len(provider.calls) < 10
+
+
+def test_concurrent_misses_are_coalesced():
+    provider = UpperProvider()
+    translator = Translator(provider, batch_window_ms=100)
+    results = {}
+    start = threading.Barrier(5)
+
+    def worker(i):
+        start.wait()
+        results[i] = translator.translate(f'complaint {i}').text
+
+    threads = [threading.Thread(target=worker, args=(i,)) for i in range(5)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert results == {i: f'COMPLAINT {i}' for i in range(5)}
+    assert len(provider.calls) < 5
+
+
+def test_separator_mangled_falls_back_to_single_calls():
+    class Mangler(UpperProvider):
+        def translate(self, text, target='en'):
+            self.calls.append(text)
+            return text.replace('[[~]]', '').upper()
+
+    provider = Mangler()
+    results = Translator(provider, batch_window_ms=0).translate_many(['a one', 'b two'])
+    assert [r.text for r in results] == ['A ONE', 'B TWO']
+
+
+def test_circuit_breaker_falls_back_to_original_text():
+    provider = UpperProvider(fail=True)
+    translator = Translator(provider, batch_window_ms=0, breaker=CircuitBreaker(threshold=2, reset_timeout=60))
+    for i in range(2):
+        result = translator.translate(f'text {i}')
+        assert (result.text, result.translated, result.source) == (f'text {i}', False, 'fallback')
+    assert translator.breaker.state == 'open'
+    translator.translate('text 3')
+    assert len(provider.calls) == 2 # open circuit: provider not called
+
+    translator.breaker.opened_at -= 60 # reset timeout elapsed -> one trial call
+    provider.fail = False
+    assert translator.translate('text 4').translated
+    assert translator.breaker.state == 'closed'
+    # Fallbacks are never cached
+    assert translator.translate('text 3').text == 'TEXT 3'
+
+
+def test_identity_provider_is_a_local_stand_in():
+    provider = IdentityProvider()
+    assert Translator(provider, batch_window_ms=0).translate('unchanged').text == 'unchanged'
+    assert provider.calls == 1
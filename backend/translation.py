@@ -0,0 +1,360 @@
+"""
+Translation of FIR text to English.
+
+    Translator.translate(text)
+      -> in-process LRU (sha256 of the text)
+      -> Mongo `translations` collection (same key; the source text itself is not stored)
+      -> provider, behind a circuit breaker; on failure the original text is returned
+
+Concurrent misses are coalesced: texts arriving within TRANSLATION_BATCH_WINDOW_MS
+are joined into as few provider calls as the per-call character budget allows.
+Providers are pluggable (TRANSLATION_PROVIDER): 'google' (deep_translator) or
+'identity', a local stand-in that returns the text unchanged.
+"""
+import hashlib
+import queue
+import threading
+import time
+from datetime import datetime
+
+import script_detect
+from cache import LRUCache
+from config import Config
+
+# Joins texts into one provider request; a result that doesn't split back into
+# the same number of parts is retried text by text
+BATCH_SEPARATOR = '\n\n[[~]]\n\n'
+SEPARATOR_MARK = '[[~]]'
+
+
+class TranslationProvider:
+    name = 'base'
+    max_chars = 4500 # per provider call
+
+    def translate(self, text, target='en'):
+        raise NotImplementedError
+
+    def translate_batch(self, texts, target='en'):
+        """One provider call for several texts (joined with BATCH_SEPARATOR)."""
+        if len(texts) == 1:
+            return [self.translate(texts[0], target)]
+        joined = self.translate(BATCH_SEPARATOR.join(texts), target)
+        parts = [p.strip() for p in (joined or '').split(SEPARATOR_MARK)]
+        if len(parts) != len(texts):
+            return [self.translate(text, target) for text in texts]
+        return parts
+
+
+class GoogleProvider(TranslationProvider):
+    name = 'google'
+
+    def translate(self, text, target='en'):
+        from deep_translator import GoogleTranslator
+        return GoogleTranslator(source='auto', target=target).translate(text)
+
+
+class IdentityProvider(TranslationProvider):
+    """Offline stand-in: returns texts unchanged and counts the calls it received."""
+    name = 'identity'
+
+    def __init__(self):
+        self.calls = 0
+
+    def translate(self, text, target='en'):
+        self.calls += 1
+        return text
+
+
+PROVIDERS = {'google': GoogleProvider, 'identity': IdentityProvider}
+
+
+class CircuitBreaker:
+    """
+    Opens after `threshold` consecutive failures; while open, calls are
+    refused for `reset_timeout` seconds, then a single trial call is let
+    through (half-open) and its outcome closes or re-opens the circuit.
+    """
+
+    def __init__(self, threshold=3, reset_timeout=60):
+        self.threshold = max(int(threshold), 1)
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial_running = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return 'half_open'
+        return 'open'
+
+    def allow(self):
+        with self._lock:
+            state = self.state
+            if state == 'closed':
+                return True
+            if state == 'half_open' and not self._trial_running:
+                self._trial_running = True
+                return True
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_running = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial_running = False
+            if self.failures >= self.threshold or self.opened_at is not None:
+                self.opened_at = time.monotonic()
+
+
+class TranslationResult:
+    __slots__ = ('text', 'translated', 'source')
+
+    def __init__(self, text, translated, source):
+        self.text = text
+        self.translated = translated # False when the original text is returned as a fallback
+        self.source = source # 'cache', 'store', 'provider' or 'fallback'
+
+
+class _PendingText:
+    __slots__ = ('text', 'done', 'result', 'error')
+
+    def __init__(self, text):
+        self.text = text
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+def content_key(text, target='en'):
+    return hashlib.sha256(f'{target}\0{text}'.encode('utf-8')).hexdigest()
+
+
+class Translator:
+    def __init__(self, provider, collection=None, target='en', cache_size=2048,
+                 batch_window_ms=50, breaker=None):
+        self.provider = provider
+        self.collection = collection # Mongo collection, optional
+        self.target = target
+        self.cache = LRUCache(cache_size)
+        self.breaker = breaker or CircuitBreaker()
+        self._window = max(batch_window_ms, 0) / 1000.0
+        self._queue = queue.Queue()
+        self._thread = None
+        self._thread_lock = threading.Lock()
+        self.counters = {'requests': 0, 'cache_hits': 0, 'store_hits': 0, 'provider_calls': 0,
+                         'provider_texts': 0, 'fallbacks': 0}
+
+    def translate(self, text):
+        return self.translate_many([text])[0]
+
+    def translate_many(self, texts):
+        """TranslationResult per text, in order; duplicates are translated once."""
+        results = [None] * len(texts)
+        misses = {}
+        for i, text in enumerate(texts):
+            self.counters['requests'] += 1
+            text = (text or '').strip()
+            if not text:
+                results[i] = TranslationResult(text, True, 'cache')
+                continue
+            key = content_key(text, self.target)
+            cached = self.cache.get(key)
+            if cached is not None:
+                self.counters['cache_hits'] += 1
+                results[i] = TranslationResult(cached, True, 'cache')
+            else:
+                misses.setdefault(key, (text, []))[1].append(i)
+
+        if misses and self.collection is not None:
+            try:
+                for doc in self.collection.find({'_id': {'$in': list(misses)}}, {'translation': 1}):
+                    text, slots = misses.pop(doc['_id'])
+                    self.cache.set(doc['_id'], doc['translation'])
+                    self.counters['store_hits'] += len(slots)
+                    for i in slots:
+                        results[i] = TranslationResult(doc['translation'], True, 'store')
+            except Exception as e:
+                print(f"Translation store lookup failed: {e}")
+
+        pending = list(misses.values())
+        if len(pending) == 1 and self._window > 0:
+            # A lone text waits briefly to share a provider call with concurrent callers
+            translated = [self._submit(pending[0][0])]
+        elif pending:
+            translated = self._translate_batch([text for text, _ in pending])
+        else:
+            translated = []
+        for (text, slots), result in zip(pending, translated):
+            for i in slots:
+                results[i] = result
+        return results
+
+    def _submit(self, text):
+        self._ensure_worker()
+        pending = _PendingText(text)
+        self._queue.put(pending)
+        pending.done.wait()
+        if pending.error is not None:
+            raise pending.error
+        return pending.result
+
+    def _ensure_worker(self):
+        with self._thread_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._worker, name='translation-batcher', daemon=True)
+                self._thread.start()
+
+    def _collect(self):
+        # Fill one provider call's character budget, waiting up to the window for more texts
+        batch = [self._queue.get()]
+        chars = len(batch[0].text)
+        deadline = time.monotonic() + self._window
+        while chars < self.provider.max_chars:
+            remaining = deadline - time.monotonic()
+            try:
+                pending = self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait()
+            except queue.Empty:
+                break
+            batch.append(pending)
+            chars += len(pending.text) + len(BATCH_SEPARATOR)
+        return batch
+
+    def _worker(self):
+        while True:
+            batch = self._collect()
+            try:
+                for pending, result in zip(batch, self._translate_batch([p.text for p in batch])):
+                    pending.result = result
+            except Exception as e:
+                for pending in batch:
+                    pending.error = e
+            finally:
+                for pending in batch:
+                    pending.done.set()
+
+    def _chunks(self, texts):
+        chunk, chars = [], 0
+        for text in texts:
+            if chunk and chars + len(text) + len(BATCH_SEPARATOR) > self.provider.max_chars:
+                yield chunk
+                chunk, chars = [], 0
+            chunk.append(text)
+            chars += len(text) + len(BATCH_SEPARATOR)
+        if chunk:
+            yield chunk
+
+    def _translate_batch(self, texts):
+        # Identical texts submitted concurrently are sent (and paid for) once
+        unique = list(dict.fromkeys(texts))
+        by_text = dict(zip(unique, self._translate_unique(unique)))
+        return [by_text[text] for text in texts]
+
+    def _translate_unique(self, texts):
+        results = []
+        for chunk in self._chunks(texts):
+            if not self.breaker.allow():
+                self.counters['fallbacks'] += len(chunk)
+                results.extend(TranslationResult(text, False, 'fallback') for text in chunk)
+                continue
+            try:
+                self.counters['provider_calls'] += 1
+                self.counters['provider_texts'] += len(chunk)
+                translations = self.provider.translate_batch(chunk, self.target)
+                self.breaker.record_success()
+            except Exception as e:
+                print(f"Translation failed ({self.provider.name}): {e}")
+                self.breaker.record_failure()
+                self.counters['fallbacks'] += len(chunk)
+                results.extend(TranslationResult(text, False, 'fallback') for text in chunk)
+                continue
+            for text, translation in zip(chunk, translations):
+                translation = translation or text
+                self._remember(content_key(text, self.target), translation)
+                results.append(TranslationResult(translation, True, 'provider'))
+        return results
+
+    def _remember(self, key, translation):
+        self.cache.set(key, translation)
+        if self.collection is None:
+            return
+        try:
+            self.collection.update_one({'_id': key}, {'$set': {
+                'translation': translation,
+                'provider': self.provider.name,
+                'target': self.target,
+                'created_at': datetime.utcnow()
+            }}, upsert=True)
+        except Exception as e:
+            print(f"Translation store write failed: {e}")
+
+    def stats(self):
+        return dict(self.counters, breaker=self.breaker.state, provider=self.provider.name,
+                    cache=self.cache.stats())
+
+
+_translator = None
+_translator_lock = threading.Lock()
+
+
+def get_translator(db=None):
+    """Process-wide Translator configured from Config, persisting to db.translations."""
+    global _translator
+    with _translator_lock:
+        if _translator is None:
+            if Config.TRANSLATION_PROVIDER not in PROVIDERS:
+                raise ValueError(f"Unknown translation provider '{Config.TRANSLATION_PROVIDER}', "
+                                 f"expected one of {tuple(PROVIDERS)}")
+            provider = PROVIDERS[Config.TRANSLATION_PROVIDER]()
+            _translator = Translator(
+                provider,
+                collection=db.translations if db is not None else None,
+                cache_size=Config.TRANSLATION_CACHE_SIZE,
+                batch_window_ms=Config.TRANSLATION_BATCH_WINDOW_MS,
+                breaker=CircuitBreaker(Config.TRANSLATION_BREAKER_THRESHOLD, Config.TRANSLATION_BREAKER_RESET)
+            )
+        elif _translator.collection is None and db is not None:
+            _translator.collection = db.translations
+        return _translator
+
+
+def to_english(text, language='auto', db=None):
+    """
+    (English text, fully translated?) for an FIR. Script detection decides
+    what to send: English text is returned as is whatever `language` the
+    client claimed (text with no evidence either way follows `language`), and
+    in mixed text only the non-English spans are translated (in one batched
+    call) and stitched back in place.
+    """
+    spans = script_detect.translation_spans(text or '', language)
+    if script_detect.record(spans, language):
+        return text, True
+
+    pending = [span for span, needs in spans if needs]
+    results = iter(get_translator(db).translate_many(pending))
+    parts, translated = [], True
+    for span, needs in spans:
+        if not needs:
+            parts.append(span)
+            continue
+        result = next(results)
+        translated = translated and result.translated
+        # The translator strips its input; keep the span's surrounding whitespace
+        stripped = span.strip()
+        lead = span[:span.index(stripped)] if stripped else span
+        parts.append(lead + result.text + span[len(lead) + len(stripped):])
+    return ''.join(parts), translated
+
+
+def stats():
+    counters = _translator.stats() if _translator is not None else {}
+    counters['detection'] = script_detect.stats()
+    return counters
@@ -20,25 +20,74 @@ import {
 import { useAuth } from "../context/AuthContext";
 import { Notification, Station, FIR } from "../types";
 
+// The dropdown shows the newest notifications only (the list API is paged)
+const NOTIFICATIONS_LIMIT = 50;
+
 const CitizenPortal = () => {
   const [activeTab, setActiveTab] = useState("services");
   const [notifications, setNotifications] = useState<Notification[]>([]);
+  const [unreadCount, setUnreadCount] = useState(0);
   const [showNotifs, setShowNotifs] = useState(false);
   const { username } = useParams();
   const { token, role } = useAuth();
 
   useEffect(() => {
-    if (token && role === "citizen") {
-      fetchNotifications();
-      const interval = setInterval(fetchNotifications, 30000); // Poll every 30s
-      return () => clearInterval(interval);
-    }
+    if (!token || role !== "citizen") return;
+    fetchNotifications();
+
+    // New notifications and the unread count are pushed over SSE; if the
+    // stream is refused (server at its stream limit) fall back to polling
+    // the cheap unread counter
+    let pollTimer: ReturnType<typeof setInterval> | undefined;
+    let lastUnread = -1;
+    const pollUnread = async () => {
+      try {
+        const res = await axios.get("/api/fir/notifications/unread_count", {
+          headers: { Authorization: `Bearer ${token}` },
+        });
+        if (res.data.unread !== lastUnread) {
+          lastUnread = res.data.unread;
+          setUnreadCount(res.data.unread);
+          fetchNotifications();
+        }
+      } catch (e) {
+        console.error("Failed to fetch unread count");
+      }
+    };
+
+    const source = new EventSource(
+      `/api/fir/notifications/stream?jwt=${encodeURIComponent(token)}`,
+    );
+    source.addEventListener("notification", (event) => {
+      const notification: Notification = JSON.parse(
+        (event as MessageEvent).data,
+      );
+      setNotifications((prev) =>
+        prev.some((n) => n._id === notification._id)
+          ? prev
+          : [notification, ...prev],
+      );
+    });
+    source.addEventListener("unread", (event) => {
+      setUnreadCount(JSON.parse((event as MessageEvent).data).unread);
+    });
+    source.onerror = () => {
+      if (source.readyState === EventSource.CLOSED && !pollTimer) {
+        pollTimer = setInterval(pollUnread, 30000);
+      }
+    };
+
+    return () => {
+      source.close();
+      if (pollTimer) clearInterval(pollTimer);
+    };
   }, [token, role]);
 
   const fetchNotifications = async () => {
     try {
       const res = await axios.get("/api/fir/notifications", {
         headers: { Authorization: `Bearer ${token}` },
+        params: { limit: NOTIFICATIONS_LIMIT },
       });
       setNotifications(res.data);
     } catch (e) {
@@ -53,15 +102,28 @@ const CitizenPortal = () => {
         {},
         { headers: { Authorization: `Bearer ${token}` } },
       );
-      setNotifications(
-        notifications.map((n) => (n._id === id ? { ...n, is_read: true } : n)),
+      setNotifications((prev) =>
+        prev.map((n) => (n._id === id ? { ...n, is_read: true } : n)),
       );
+      setUnreadCount((count) => Math.max(count - 1, 0));
     } catch (e) {
       console.error("Failed to mark read");
     }
   };
 
-  const unreadCount = notifications.filter((n) => !n.is_read).length;
+  const markAllRead = async () => {
+    try {
+      await axios.put(
+        "/api/fir/notifications/read_all",
+        {},
+        { headers: { Authorization: `Bearer ${token}` } },
+      );
+      setNotifications((prev) => prev.map((n) => ({ ...n, is_read: true })));
+      setUnreadCount(0);
+    } catch (e) {
+      console.error("Failed to mark all read");
+    }
+  };
 
   return (
     <div className="flex flex-col min-h-screen bg-background">
@@ -98,9 +160,19 @@ const CitizenPortal = () => {
                   >
                     <div className="p-3 border-b font-bold flex justify-between">
                       <span>Notifications</span>
-                      <button onClick={() => setShowNotifs(false)}>
-                        <X size={16} />
-                      </button>
+                      <div className="flex items-center gap-3">
+                        {unreadCount > 0 && (
+                          <button
+                            onClick={markAllRead}
+                            className="text-xs font-normal text-primary hover:underline"
+                          >
+                            Mark all as read
+                          </button>
+                        )}
+                        <button onClick={() => setShowNotifs(false)}>
+                          <X size={16} />
+                        </button>
+                      </div>
                     </div>
                     <div className="max-h-64 overflow-y-auto">
                       {notifications.length === 0 ? (
@@ -502,22 +574,39 @@ const StationDropdown: React.FC<StationDropdownProps> = ({ stations, selected, o
   );
 };
 
+// List fields the history cards need; the full FIR is fetched for the PDF
+const HISTORY_FIELDS =
+  "original_text,location,station_id,status,submission_date";
+// History is paged; "Load more" follows X-Next-Cursor
+const HISTORY_PAGE_SIZE = 50;
+
 const HistoryTab = () => {
   const [firs, setFirs] = useState<FIR[]>([]);
   const [loading, setLoading] = useState(true);
+  const [nextCursor, setNextCursor] = useState<string | null>(null);
+  const [loadingMore, setLoadingMore] = useState(false);
   const [stations, setStations] = useState<Station[]>([]);
   const { token } = useAuth();
 
+  const fetchPage = (cursor?: string) =>
+    axios.get("/api/fir/", {
+      headers: { Authorization: `Bearer ${token}` },
+      params: {
+        fields: HISTORY_FIELDS,
+        limit: HISTORY_PAGE_SIZE,
+        ...(cursor ? { cursor } : {}),
+      },
+    });
+
   useEffect(() => {
     const fetchData = async () => {
       try {
         const [firRes, stationRes] = await Promise.all([
-          axios.get("/api/fir/", {
-            headers: { Authorization: `Bearer ${token}` },
-          }),
+          fetchPage(),
           axios.get("/api/auth/stations"),
         ]);
         setFirs(firRes.data);
+        setNextCursor(firRes.headers["x-next-cursor"] || null);
         setStations(stationRes.data);
       } catch (error) {
         console.error("Error fetching history:", error);
@@ -528,6 +617,31 @@ const HistoryTab = () => {
     if (token) fetchData();
   }, [token]);
 
+  const loadMore = async () => {
+    if (!nextCursor) return;
+    setLoadingMore(true);
+    try {
+      const res = await fetchPage(nextCursor);
+      setFirs((prev) => [...prev, ...res.data]);
+      setNextCursor(res.headers["x-next-cursor"] || null);
+    } catch (error) {
+      console.error("Error fetching history:", error);
+    } finally {
+      setLoadingMore(false);
+    }
+  };
+
+  const downloadReport = async (firId: string) => {
+    try {
+      const res = await axios.get(`/api/fir/${firId}`, {
+        headers: { Authorization: `Bearer ${token}` },
+      });
+      generateFIRPDF(res.data);
+    } catch (error) {
+      console.error("Error fetching FIR for report:", error);
+    }
+  };
+
   if (loading)
     return <div className="text-center py-8">Loading records...</div>;
 
@@ -582,7 +696,7 @@ const HistoryTab = () => {
                 {fir.status === "resolved" && (
                   <div className="mt-auto pt-4">
                     <button
-                      onClick={() => generateFIRPDF(fir)}
+                      onClick={() => downloadReport(fir._id)}
                       className="text-xs text-primary hover:underline flex items-center gap-1"
                     >
                       <Download size={14} /> Download Report
@@ -594,6 +708,17 @@ const HistoryTab = () => {
           );
         })
       )}
+      {nextCursor && (
+        <div className="text-center">
+          <button
+            onClick={loadMore}
+            disabled={loadingMore}
+            className="text-sm text-primary hover:underline disabled:opacity-50"
+          >
+            {loadingMore ? "Loading..." : "Load more"}
+          </button>
+        </div>
+      )}
     </div>
   );
 };
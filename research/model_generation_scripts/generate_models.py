@@ -2,17 +2,26 @@
 import pandas as pd
 import pickle
 import os
+import sys
 from sklearn.ensemble import RandomForestRegressor
-from sentence_transformers import SentenceTransformer
 
 # Paths
 BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '../../'))
 CRIME_CSV_PATH = os.path.join(BASE_DIR, 'research', 'crime_prediction', 'crime_kolkata.csv')
 BNS_CSV_PATH = os.path.join(BASE_DIR, 'research', 'fir_research', 'testing1.csv')
-ASSETS_DIR = os.path.join(BASE_DIR, 'backend', 'assets')
+BACKEND_DIR = os.path.join(BASE_DIR, 'backend')
+ASSETS_DIR = os.path.join(BACKEND_DIR, 'assets')
+BNS_ASSETS_DIR = os.path.join(ASSETS_DIR, 'bns')
 
 os.makedirs(ASSETS_DIR, exist_ok=True)
 
+# Asset writers live in the backend so the service and this script share one format
+sys.path.insert(0, BACKEND_DIR)
+from bns_assets import write_bns_assets, index_options_from_config
+from crime_cube import CrimeCube
+from config import Config
+from encoders import load_encoder
+
 def generate_crime_model():
     print("Generating Crime Prediction Model...")
     if not os.path.exists(CRIME_CSV_PATH):
@@ -43,6 +52,14 @@ def generate_crime_model():
         pickle.dump(model, f)
     print(f"Saved crime model to {output_path}")
 
+    # Precompute forecasts for every ward over the training years plus the
+    # configured horizon, so the service can answer by direct lookup
+    years = [int(X['Year'].min()), int(X['Year'].max()) + Config.CRIME_CUBE_HORIZON_YEARS]
+    cube = CrimeCube.build(model, X['Ward'].unique(), years)
+    cube.save(Config.CRIME_CUBE_PATH)
+    print(f"Saved crime forecast cube to {Config.CRIME_CUBE_PATH} "
+          f"({len(cube.wards)} wards x {cube.year_start}-{cube.year_end} x 12 months)")
+
 def generate_bns_assets():
     print("\nGenerating BNS Search Assets...")
     if not os.path.exists(BNS_CSV_PATH):
@@ -56,26 +73,22 @@ def generate_bns_assets():
         
     print(f"Loaded {len(df)} BNS sections.")
     
-    # Load model
-    print("Loading Sentence-BERT model (all-MiniLM-L6-v2)...")
-    model = SentenceTransformer('all-MiniLM-L6-v2')
+    # Load model (same encoder backend the service uses, so embeddings stay compatible)
+    print(f"Loading {Config.BNS_ENCODER_BACKEND} encoder ({Config.BNS_ENCODER_MODEL})...")
+    model = load_encoder(Config.BNS_ENCODER_BACKEND, Config.BNS_ENCODER_MODEL, onnx_dir=Config.BNS_ONNX_DIR)
     
     # Generate embeddings
     print("Generating embeddings...")
     descriptions = df['Description'].fillna('').tolist()
     embeddings = model.encode(descriptions)
     
-    # Save Data and Embeddings
-    # We save as a dict containing the DF and the embeddings numpy array
-    assets = {
-        'df': df,
-        'embeddings': embeddings
-    }
-    
-    output_path = os.path.join(ASSETS_DIR, 'bns_assets.pkl')
-    with open(output_path, 'wb') as f:
-        pickle.dump(assets, f)
-    print(f"Saved BNS assets to {output_path}")
+    # Save section table, raw float32 embeddings and the prebuilt FAISS index
+    # (type/metric from BNS_INDEX_* settings) in the mmap layout, see
+    # backend/bns_assets.py, so workers load them zero-copy
+    index_options = index_options_from_config(Config)
+    print(f"Building {index_options['index_type']}/{index_options['metric']} index...")
+    manifest = write_bns_assets(BNS_ASSETS_DIR, df, embeddings, **index_options)
+    print(f"Saved BNS assets to {BNS_ASSETS_DIR} (version {manifest['version']})")
 
 if __name__ == "__main__":
     generate_crime_model()
@@ -0,0 +1,77 @@
+"""
+Micro-benchmark: BNS result assembly per search hit.
+
+Compares the old path (DataFrame.iloc[idx].to_dict() + pd.notna scrub +
+section/description aliasing) with the precomputed record lookup that
+MLService now uses. Reads the legacy BNS pickle for the section table.
+
+    python scripts/benchmark_bns_results.py [path/to/bns_assets.pkl] [iterations]
+"""
+import os
+import sys
+import timeit
+
+import numpy as np
+import pandas as pd
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend')
+sys.path.insert(0, BACKEND_DIR)
+
+from bns_assets import SectionTable, load_legacy_pickle, section_records  # noqa: E402
+
+
+def assemble_dataframe(df, indices, distances):
+    results = []
+    for i, idx in enumerate(indices):
+        if idx < len(df):
+            result = df.iloc[idx].to_dict()
+            result = {k: v for k, v in result.items() if pd.notna(v)}
+            if 'Section' in result:
+                result['section'] = result['Section']
+            if 'Description' in result:
+                result['description'] = result['Description']
+            result['distance'] = float(distances[i])
+            result['rank'] = i + 1
+            results.append(result)
+    return results
+
+
+def assemble_records(records, indices, distances):
+    results = []
+    for i, idx in enumerate(indices):
+        if 0 <= idx < len(records):
+            result = dict(records[idx])
+            result['distance'] = float(distances[i])
+            result['rank'] = i + 1
+            results.append(result)
+    return results
+
+
+def main():
+    pkl_path = sys.argv[1] if len(sys.argv) > 1 else os.path.join(BACKEND_DIR, 'assets', 'bns_assets.pkl')
+    iterations = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+
+    df, _ = load_legacy_pickle(pkl_path)
+    records = section_records(SectionTable.from_dataframe(df))
+
+    rng = np.random.default_rng(0)
+    queries = [(rng.choice(len(df), 5, replace=False), rng.random(5).astype(np.float32))
+               for _ in range(64)]
+
+    def run(assemble, table):
+        for indices, distances in queries:
+            assemble(table, indices, distances)
+
+    print(f"{len(df)} sections, {len(queries)} queries x k=5, {iterations} iterations")
+    timings = {}
+    for name, assemble, table in (('dataframe', assemble_dataframe, df),
+                                  ('records', assemble_records, records)):
+        seconds = min(timeit.repeat(lambda: run(assemble, table), number=max(iterations // 64, 1), repeat=3))
+        per_hit = seconds / (max(iterations // 64, 1) * len(queries) * 5)
+        timings[name] = per_hit
+        print(f"  {name:<10} {per_hit * 1e6:8.2f} us/hit")
+    print(f"  speedup    {timings['dataframe'] / timings['records']:8.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,89 @@
+"""
+Micro-benchmark: JSON encoding of FIR list payloads.
+
+Compares the old path (per-document str(_id) / isoformat() loop, then
+jsonify with Flask's default provider) with serialization.py: the orjson
+provider (ObjectId and datetime encoded natively) and the streamed JSON
+array, on synthetic FIRs shaped like the real ones (complaint text,
+translation, five AI suggestions with full BNS descriptions).
+
+    python scripts/benchmark_serialization.py [n_firs] [iterations]
+"""
+import copy
+import os
+import sys
+import timeit
+from datetime import datetime, timedelta
+
+from bson import ObjectId
+from flask import Flask, jsonify
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend')
+sys.path.insert(0, BACKEND_DIR)
+
+import serialization  # noqa: E402
+
+COMPLAINT = ("On the night of the incident my two-wheeler was parked outside the house and was found "
+             "missing the next morning. Neighbours saw two persons near the gate around midnight. ") * 6
+DESCRIPTION = ("Whoever, intending to take dishonestly any movable property out of the possession of any "
+               "person without that person's consent, moves that property in order to such taking, is said "
+               "to commit theft. ") * 4
+
+
+def make_firs(n):
+    base = datetime(2024, 1, 1)
+    return [{
+        '_id': ObjectId(),
+        'user_id': str(ObjectId()),
+        'station_id': '100',
+        'status': 'pending',
+        'original_text': COMPLAINT,
+        'translated_text': COMPLAINT,
+        'submission_date': base + timedelta(minutes=i),
+        'last_updated': base + timedelta(minutes=i, seconds=30),
+        'ai_suggestions': [{'section': str(300 + k), 'description': DESCRIPTION, 'distance': 0.4 + k / 10,
+                            'rank': k + 1} for k in range(5)],
+    } for i in range(n)]
+
+
+def old_path(app, firs):
+    firs = copy.copy(firs)
+    for i, fir in enumerate(firs):
+        fir = firs[i] = dict(fir)
+        fir['_id'] = str(fir['_id'])
+        for field in ('submission_date', 'last_updated'):
+            if isinstance(fir.get(field), datetime):
+                fir[field] = fir[field].isoformat()
+    with app.app_context():
+        return jsonify(firs).get_data()
+
+
+def provider_path(app, firs):
+    with app.app_context():
+        return jsonify(firs).get_data()
+
+
+def streamed_path(firs):
+    return b''.join(serialization.iter_array(firs))
+
+
+def main():
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000
+    iterations = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    firs = make_firs(n)
+
+    default_app = Flask('default')
+    fast_app = Flask('fast')
+    fast_app.json = serialization.JSONProvider(fast_app)
+
+    size = len(provider_path(fast_app, firs))
+    print(f"{n} FIRs, {size / 1e6:.1f} MB of JSON, orjson {'on' if serialization.orjson else 'off'}")
+    for name, fn in [('jsonify + manual conversion', lambda: old_path(default_app, firs)),
+                     ('orjson provider', lambda: provider_path(fast_app, firs)),
+                     ('streamed array', lambda: streamed_path(firs))]:
+        best = min(timeit.repeat(fn, number=1, repeat=iterations))
+        print(f"  {name:<30} {best * 1000:8.1f} ms")
+
+
+if __name__ == '__main__':
+    main()